@@ -1,32 +1,71 @@
 from __future__ import annotations
-from typing import Dict, List
+from typing import Dict, Iterable, List, Sequence, Tuple
 from collections import defaultdict
+from array import array
+from bisect import bisect_left
+import importlib.util
 import json
+import os
+import sys
+
+
+HW03_DIRECTORY = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    "py4bda_b2c2024q4_Garifulla_Kenessary_HW03", "py4bda_b2c2024q4_Garifulla_Kenessary_HW03",
+)
+
+
+def _load_hw03_module(name: str):
+    """Import a module of the HW03 inverted index, whose helpers this library shares."""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(HW03_DIRECTORY, f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+intersect_postings = _load_hw03_module("task_Garifulla_Kenessary_inverted_index_intersection").intersect_postings
+
+
+def _new_postings() -> array:
+    """Create an empty compact posting list of unsigned 32-bit doc IDs."""
+    return array("I")
 
 
 class InvertedIndex:
     def __init__(self):
-        self.index = defaultdict(list)  # Map word to list of document IDs
+        self.index = defaultdict(_new_postings)  # Map interned word to sorted array of document IDs
 
     def add(self, doc_id: int, words: List[str]) -> None:
-        """Add words from a document to the inverted index."""
-        for word in words:
-            if doc_id not in self.index[word]:
-                self.index[word].append(doc_id)
+        """Add words from a document to the inverted index, keeping postings sorted.
+
+        Words are deduplicated once per document, so each posting list is
+        touched at most once; doc IDs arriving in increasing order are a
+        plain append, older ones fall back to a bisect insert.
+        """
+        for word in set(words):
+            doc_ids = self.index[sys.intern(word)]
+            if not doc_ids or doc_ids[-1] < doc_id:
+                doc_ids.append(doc_id)
+                continue
+            position = bisect_left(doc_ids, doc_id)
+            if doc_ids[position] != doc_id:
+                doc_ids.insert(position, doc_id)
+
+    def add_many(self, documents: Iterable[Tuple[int, List[str]]]) -> None:
+        """Add a batch of (doc_id, words) pairs in doc ID order."""
+        for doc_id, words in sorted(documents, key=lambda document: document[0]):
+            self.add(doc_id, words)
 
     def query(self, words: List[str]) -> List[int]:
-        """Return the list of relevant documents for the given query."""
+        """Return the sorted list of relevant documents for the given query."""
         if not words:
             return []
-        result_sets = [set(self.index[word]) for word in words if word in self.index]
-        if not result_sets:
-            return []
-        return list(set.intersection(*result_sets))
+        return intersect_postings([self.index[word] for word in words if word in self.index])
 
     def dump(self, filepath: str) -> None:
         """Save the inverted index to a file."""
         with open(filepath, "w") as f:
-            json.dump(self.index, f)
+            json.dump({word: doc_ids.tolist() for word, doc_ids in self.index.items()}, f)
 
     @classmethod
     def load(cls, filepath: str) -> InvertedIndex:
@@ -34,7 +73,7 @@ class InvertedIndex:
         with open(filepath, "r") as f:
             data = json.load(f)
         instance = cls()
-        instance.index = defaultdict(list, {k: v for k, v in data.items()})
+        instance.index = defaultdict(_new_postings, {sys.intern(k): array("I", sorted(v)) for k, v in data.items()})
         return instance
 
     def __eq__(self, other: object) -> bool:
@@ -48,10 +87,10 @@ class InvertedIndex:
 
 class ArrayStoragePolicy:
     @staticmethod
-    def dump(word_to_docs_mapping: Dict[str, List[int]], filepath: str) -> None:
+    def dump(word_to_docs_mapping: Dict[str, Sequence[int]], filepath: str) -> None:
         """Dump the inverted index to a file using an array-based storage."""
         with open(filepath, "w") as f:
-            json.dump(word_to_docs_mapping, f)
+            json.dump({word: list(doc_ids) for word, doc_ids in word_to_docs_mapping.items()}, f)
 
     @staticmethod
     def load(filepath: str) -> Dict[str, List[int]]:
@@ -76,11 +115,9 @@ def load_documents(filepath: str) -> Dict[str, str]:
 
 
 def build_inverted_index(documents: Dict[str, str]) -> InvertedIndex:
-    """Build an inverted index from the given documents."""
+    """Build an inverted index with integer doc IDs from the given documents."""
     inverted_index = InvertedIndex()
-    for doc_id, content in documents.items():
-        words = content.split()
-        inverted_index.add(str(doc_id), words)
+    inverted_index.add_many((int(doc_id), content.split()) for doc_id, content in documents.items())
     return inverted_index
 
 
@@ -74,9 +74,9 @@ def test_can_load_documents(tiny_dataset_fio):
 @pytest.mark.parametrize(
     "query, etalon_answer",
     [
-        pytest.param(["A_word"], ["123", "37"]),
-        pytest.param(["B_word"], ["2", "37"], id="B_word"),
-        pytest.param(["A_word", "B_word"], ["37"], id="both words"),
+        pytest.param(["A_word"], [37, 123]),
+        pytest.param(["B_word"], [2, 37], id="B_word"),
+        pytest.param(["A_word", "B_word"], [37], id="both words"),
         pytest.param(["word_does_not_exist"], [], id="word does not exist")
     ]
 )
@@ -84,7 +84,7 @@ def test_query_inverted_index_intersect_results(tiny_dataset_fio, query, etalon_
     documents = load_documents(tiny_dataset_fio)
     tiny_inverted_index = build_inverted_index(documents)
     answer = tiny_inverted_index.query(query)
-    assert sorted(answer) == sorted(etalon_answer), (
+    assert answer == etalon_answer, (
         f"Expected answer is {etalon_answer}, but you got here {answer}"
     )
 
@@ -128,6 +128,15 @@ def test_can_dump_and_load_inverted_index(tmpdir, wikipedia_inverted_index):
             "load should return the same inverted index"
             )
 
+def test_add_many_deduplicates_and_sorts_postings():
+    inverted_index = InvertedIndex()
+    inverted_index.add_many([(37, ["b", "a", "a"]), (2, ["a", "b", "b"]), (123, ["a"])])
+    inverted_index.add(5, ["b", "b"])
+    assert list(inverted_index.index["a"]) == [2, 37, 123]
+    assert list(inverted_index.index["b"]) == [2, 5, 37]
+    assert inverted_index.index["a"].typecode == "I"
+
+
 #Check by id implement magic methods
 @pytest.mark.parametrize(
         ("filepath",),
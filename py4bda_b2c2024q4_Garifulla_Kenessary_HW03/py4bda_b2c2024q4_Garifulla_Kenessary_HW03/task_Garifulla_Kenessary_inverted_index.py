@@ -1,108 +1,1451 @@
 import argparse
+import cProfile
+import gc
+import heapq
+import math
+import mmap
+import os
+import re
+import sys
+import tempfile
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from itertools import accumulate, chain, groupby, islice
+from multiprocessing import Pool
 import struct
 import json
-from typing import List, Dict
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Dict, Optional, Tuple, Union
+
+from task_Garifulla_Kenessary_inverted_index_analyzer import ENGLISH_STOPWORDS, Analyzer
+from task_Garifulla_Kenessary_inverted_index_documents import DocumentStore, document_store_path, write_document_store
+from task_Garifulla_Kenessary_inverted_index_intersection import _gallop, _intersect_pair, intersect_postings
+from task_Garifulla_Kenessary_inverted_index_profiler import GRAPHITE_PREFIX, StageProfiler
+
+if TYPE_CHECKING:
+    from task_Garifulla_Kenessary_inverted_index_segments import SegmentedIndex
+    from task_Garifulla_Kenessary_inverted_index_shards import ShardedIndex
+
+VARINT_MAGIC = b"IIDX"
+VARINT_VERSION = 6
+VARINT_HEADER = struct.Struct("<4sBQ")  # magic, version, metadata offset
+VARINT_OFFSET = struct.Struct("<Q")
+VARINT_FEATURES = {"frequencies", "positions"}
+DICTIONARY_BLOCK = 16  # terms per front-coded dictionary block
+POSTINGS_PACKED = 0  # postings encodings, the first byte of postings with more than DENSE_CHUNK doc ids
+POSTINGS_HYBRID = 1
+PACKED_MIN = 4  # packed lists of fewer values are stored as varints
+DEFLATE_MIN = 128  # and of fewer than this as uncompressed arrays
+PACKED_TYPECODES = {1: "B", 2: "H", 4: "I", 8: "Q"}  # array typecodes by width in bytes
+PACKED_LEVEL = 6  # zlib compression level of packed arrays
+CHUNK_BITS = 16  # hybrid postings split doc ids into chunks of 2 ** CHUNK_BITS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+BITMAP_BYTES = (1 << CHUNK_BITS) // 8
+DENSE_CHUNK = 4096  # chunks with more doc ids are bitmaps, smaller than the array of them
+BYTE_BITS = [[bit for bit in range(8) if byte >> bit & 1] for byte in range(256)]
+WILDCARD = re.compile(r"[*?]")
+BLOCK_RECORD = struct.Struct("<IQQ")  # word length, doc count, postings size
+STRUCT_COUNT = struct.Struct("<I")  # struct strategy: number of words, then <H fields
+
+SIZE_SUFFIXES = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+TERM_OVERHEAD = 120  # rough bytes per new dict entry with an empty list
+POSTING_OVERHEAD = 40  # rough bytes per boxed int plus its list slot
+
+
+
+def _write_varint(buffer: bytearray, value: int) -> None:
+    """Append an unsigned LEB128 varint to the buffer."""
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    """Read an unsigned LEB128 varint, return the value and the next position."""
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _common_prefix_length(first: bytes, second: bytes) -> int:
+    """Length of the longest common prefix of two byte strings."""
+    length = min(len(first), len(second))
+    for position in range(length):
+        if first[position] != second[position]:
+            return position
+    return length
+
+
+def _wildcard_prefix(pattern: str) -> str:
+    """Literal part of a wildcard pattern before its first * or ?."""
+    return WILDCARD.split(pattern, 1)[0]
+
+
+def _wildcard_matcher(pattern: str):
+    """Compile a pattern where * matches any run of characters and ? one character."""
+    parts = (".*" if char == "*" else "." if char == "?" else re.escape(char) for char in pattern)
+    return re.compile("".join(parts), re.DOTALL).fullmatch
+
+
+def _encode_postings(buffer: bytearray, doc_ids: List[int]) -> None:
+    """Append sorted doc ids to the buffer as varint-encoded gaps."""
+    previous = 0
+    for doc_id in doc_ids:
+        _write_varint(buffer, doc_id - previous)
+        previous = doc_id
+
+
+def _decode_postings(data: bytes, pos: int, count: int) -> Tuple[List[int], int]:
+    """Decode count gap-encoded doc ids starting at pos."""
+    doc_ids = []
+    append = doc_ids.append
+    current = 0
+    for _ in range(count):
+        gap = 0
+        shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            gap |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        current += gap
+        append(current)
+    return doc_ids, pos
+
+
+def _decode_varints(data: bytes, pos: int, count: int) -> Tuple[List[int], int]:
+    """Decode count plain varints starting at pos."""
+    values = []
+    append = values.append
+    for _ in range(count):
+        value = 0
+        shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        append(value)
+    return values, pos
+
+
+def _encode_packed(buffer: bytearray, values: List[int]) -> None:
+    """Append non-negative ints as a little-endian array of the narrowest width that fits them.
+
+    Layout: the width in bytes, then the array; from DEFLATE_MIN values on
+    the array is raw-deflated and prefixed by its compressed size as a
+    varint. Unlike varints it is decoded by C code in bulk, but it costs a
+    byte more, so lists shorter than PACKED_MIN are plain varints.
+    """
+    if len(values) < PACKED_MIN:
+        for value in values:
+            _write_varint(buffer, value)
+        return
+    largest = max(values)
+    width = next(width for width in PACKED_TYPECODES if largest < 1 << 8 * width)
+    packed = array(PACKED_TYPECODES[width], values)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    buffer.append(width)
+    if len(values) < DEFLATE_MIN:
+        buffer += packed.tobytes()
+        return
+    compressor = zlib.compressobj(PACKED_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+    compressed = compressor.compress(packed.tobytes()) + compressor.flush()
+    _write_varint(buffer, len(compressed))
+    buffer += compressed
+
+
+def _decode_packed(data: bytes, pos: int, count: int) -> Tuple[Union[array, List[int]], int]:
+    """Read count values written by _encode_packed, return them and the next position."""
+    if count < PACKED_MIN:
+        return _decode_varints(data, pos, count)
+    width = data[pos]
+    values = array(PACKED_TYPECODES[width])
+    if count < DEFLATE_MIN:
+        end = pos + 1 + count * width
+        values.frombytes(data[pos + 1:end])
+    else:
+        size, start = _read_varint(data, pos + 1)
+        end = start + size
+        values.frombytes(zlib.decompress(data[start:end], -zlib.MAX_WBITS))
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values, end
+
+
+def rank_bm25(postings: List[Tuple[List[int], List[int]]], doc_lengths: Dict[int, int], top_k: int = 10,
+              operator: str = "or", k1: float = 1.2, b: float = 0.75, document_count: Optional[int] = None,
+              average_length: Optional[float] = None,
+              document_frequencies: Optional[List[int]] = None) -> List[Tuple[int, float]]:
+    """Return the top_k (doc id, BM25 score) pairs for the query terms.
+
+    postings holds the (sorted doc ids, term frequencies) of every query
+    term. With operator "or" the evaluation is document-at-a-time MaxScore:
+    every term gets a score upper bound from its largest frequency and the
+    shortest document, and terms whose bounds together cannot beat the
+    current k-th best score stop producing candidates and are only probed
+    (by galloping) for documents found through the other terms. With "and"
+    only documents containing every term are scored.
+
+    document_count, average_length and document_frequencies (aligned with
+    postings) override the statistics taken from doc_lengths and postings,
+    so a shard can score its documents against the whole collection.
+    """
+    if not doc_lengths or top_k <= 0:
+        return []
+    if document_count is None:
+        document_count = len(doc_lengths)
+    if average_length is None:
+        average_length = sum(doc_lengths.values()) / len(doc_lengths) or 1.0
+    min_norm = k1 * (1 - b + b * min(doc_lengths.values()) / average_length)
+
+    terms = []
+    for number, (doc_ids, frequencies) in enumerate(postings):
+        if not doc_ids:
+            if operator == "and":
+                return []
+            continue
+        document_frequency = len(doc_ids) if document_frequencies is None else document_frequencies[number]
+        idf = math.log(1 + (document_count - document_frequency + 0.5) / (document_frequency + 0.5))
+        max_frequency = max(frequencies)
+        upper_bound = idf * max_frequency * (k1 + 1) / (max_frequency + min_norm)
+        terms.append((upper_bound, idf, doc_ids, frequencies))
+    if not terms:
+        return []
+    terms.sort(key=lambda term: term[0])
+
+    def score(idf: float, frequency: int, doc_id: int) -> float:
+        norm = k1 * (1 - b + b * doc_lengths[doc_id] / average_length)
+        return idf * frequency * (k1 + 1) / (frequency + norm)
+
+    heap = []
+    if operator == "and":
+        for doc_id in intersect_postings([doc_ids for _, _, doc_ids, _ in terms]):
+            total = 0.0
+            for _, idf, doc_ids, frequencies in terms:
+                total += score(idf, frequencies[bisect_left(doc_ids, doc_id)], doc_id)
+            item = (total, -doc_id)
+            if len(heap) < top_k:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+    else:
+        bound_prefix = []
+        running = 0.0
+        for upper_bound, _, _, _ in terms:
+            running += upper_bound
+            bound_prefix.append(running)
+        positions = [0] * len(terms)
+        first_essential = 0
+        threshold = 0.0
+        while True:
+            candidate = None
+            for i in range(first_essential, len(terms)):
+                doc_ids = terms[i][2]
+                if positions[i] < len(doc_ids) and (candidate is None or doc_ids[positions[i]] < candidate):
+                    candidate = doc_ids[positions[i]]
+            if candidate is None:
+                break
+            total = 0.0
+            for i in range(first_essential, len(terms)):
+                _, idf, doc_ids, frequencies = terms[i]
+                position = positions[i]
+                if position < len(doc_ids) and doc_ids[position] == candidate:
+                    total += score(idf, frequencies[position], candidate)
+                    positions[i] = position + 1
+            for i in range(first_essential - 1, -1, -1):
+                if total + bound_prefix[i] < threshold:
+                    break
+                _, idf, doc_ids, frequencies = terms[i]
+                position = _gallop(doc_ids, candidate, positions[i])
+                positions[i] = position
+                if position < len(doc_ids) and doc_ids[position] == candidate:
+                    total += score(idf, frequencies[position], candidate)
+            item = (total, -candidate)
+            if len(heap) < top_k:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+            if len(heap) == top_k:
+                threshold = heap[0][0]
+                while first_essential < len(terms) and bound_prefix[first_essential] < threshold:
+                    first_essential += 1
+    return [(-negative_doc_id, total) for total, negative_doc_id in sorted(heap, reverse=True)]
+
+
+def _decode_position_block(data: bytes, pos: int, size: int) -> List[int]:
+    """Decode a block of size bytes holding gap-encoded token positions."""
+    positions = []
+    current = 0
+    end = pos + size
+    while pos < end:
+        gap, pos = _read_varint(data, pos)
+        current += gap
+        positions.append(current)
+    return positions
+
+
+def _bitmap_lows(bitmap: bytes) -> List[int]:
+    """Return the positions of the set bits of a chunk bitmap, in order."""
+    return [index * 8 + bit for index, byte in enumerate(bitmap) if byte for bit in BYTE_BITS[byte]]
+
+
+def _bitmap_from_lows(lows: Iterable[int]) -> bytes:
+    bitmap = bytearray(BITMAP_BYTES)
+    for low in lows:
+        bitmap[low >> 3] |= 1 << (low & 7)
+    return bytes(bitmap)
+
+
+def _chunk_from_int(value: int) -> Union[array, bytes]:
+    """Turn an integer bitmap into the cheaper container for its cardinality."""
+    bitmap = value.to_bytes(BITMAP_BYTES, "little")
+    if bin(value).count("1") > DENSE_CHUNK:
+        return bitmap
+    return array("H", _bitmap_lows(bitmap))
+
+
+def _chunk_contains(chunk: Union[array, bytes], low: int) -> bool:
+    if isinstance(chunk, bytes):
+        return bool(chunk[low >> 3] >> (low & 7) & 1)
+    position = bisect_left(chunk, low)
+    return position < len(chunk) and chunk[position] == low
+
+
+class HybridPostings:
+    """Roaring-style set of doc ids for very frequent words.
+
+    Doc ids are split by their high bits into chunks of 2 ** CHUNK_BITS;
+    a chunk is a sorted array('H') of the low bits, or a bitmap when it
+    holds more than DENSE_CHUNK ids. Membership tests cost a bit probe or a
+    binary search in one chunk, so a short posting list is intersected with
+    a dense word without walking the dense one. Bitmap chunks are combined
+    with & and | on Python integers, a word at a time.
+    """
+
+    def __init__(self, chunks: Dict[int, Union[array, bytes]]):
+        self.chunks = chunks
+
+    @classmethod
+    def from_doc_ids(cls, doc_ids: Iterable[int]) -> "HybridPostings":
+        """Build from sorted doc ids."""
+        chunks = {}
+        for key, group in groupby(doc_ids, key=lambda doc_id: doc_id >> CHUNK_BITS):
+            lows = array("H", (doc_id & CHUNK_MASK for doc_id in group))
+            chunks[key] = _bitmap_from_lows(lows) if len(lows) > DENSE_CHUNK else lows
+        return cls(chunks)
+
+    @staticmethod
+    def is_worthwhile(doc_ids: List[int]) -> bool:
+        """True if the sorted doc ids have at least one chunk dense enough for a bitmap."""
+        if len(doc_ids) <= DENSE_CHUNK:
+            return False
+        return any(sum(1 for _ in group) > DENSE_CHUNK
+                   for _, group in groupby(doc_ids, key=lambda doc_id: doc_id >> CHUNK_BITS))
+
+    def encode(self, buffer: bytearray) -> None:
+        """Append the chunks: their number, then key gap, cardinality and container of each."""
+        _write_varint(buffer, len(self.chunks))
+        previous = 0
+        for key in sorted(self.chunks):
+            chunk = self.chunks[key]
+            _write_varint(buffer, key - previous)
+            previous = key
+            if isinstance(chunk, bytes):
+                _write_varint(buffer, bin(int.from_bytes(chunk, "little")).count("1"))
+                buffer += chunk
+            else:
+                _write_varint(buffer, len(chunk))
+                lows = array("H", chunk)
+                if sys.byteorder == "big":
+                    lows.byteswap()
+                buffer += lows.tobytes()
+
+    @classmethod
+    def decode(cls, data: bytes, pos: int) -> Tuple["HybridPostings", int]:
+        """Read chunks written by encode, return them and the next position."""
+        chunk_count, pos = _read_varint(data, pos)
+        chunks = {}
+        key = 0
+        for _ in range(chunk_count):
+            gap, pos = _read_varint(data, pos)
+            key += gap
+            cardinality, pos = _read_varint(data, pos)
+            if cardinality > DENSE_CHUNK:
+                chunks[key] = bytes(data[pos:pos + BITMAP_BYTES])
+                pos += BITMAP_BYTES
+            else:
+                lows = array("H")
+                lows.frombytes(data[pos:pos + 2 * cardinality])
+                if sys.byteorder == "big":
+                    lows.byteswap()
+                chunks[key] = lows
+                pos += 2 * cardinality
+        return cls(chunks), pos
+
+    def __len__(self) -> int:
+        return sum(bin(int.from_bytes(chunk, "little")).count("1") if isinstance(chunk, bytes) else len(chunk)
+                   for chunk in self.chunks.values())
+
+    def __contains__(self, doc_id: int) -> bool:
+        chunk = self.chunks.get(doc_id >> CHUNK_BITS)
+        return chunk is not None and _chunk_contains(chunk, doc_id & CHUNK_MASK)
+
+    def __iter__(self) -> Iterator[int]:
+        return chain.from_iterable(map((key << CHUNK_BITS).__add__, _bitmap_lows(chunk) if isinstance(chunk, bytes) else chunk)
+                                   for key, chunk in sorted(self.chunks.items()))
+
+    def filter(self, doc_ids: List[int]) -> List[int]:
+        """Keep the doc ids of a sorted list that are in the set, in time linear in the list."""
+        return [doc_id for doc_id in doc_ids if doc_id in self]
+
+    def __and__(self, other: "HybridPostings") -> "HybridPostings":
+        chunks = {}
+        for key in self.chunks.keys() & other.chunks.keys():
+            first, second = self.chunks[key], other.chunks[key]
+            if isinstance(first, bytes) and isinstance(second, bytes):
+                chunk = _chunk_from_int(int.from_bytes(first, "little") & int.from_bytes(second, "little"))
+            else:
+                if isinstance(first, bytes):
+                    first, second = second, first
+                chunk = array("H", (low for low in first if _chunk_contains(second, low)))
+            if len(chunk):
+                chunks[key] = chunk
+        return HybridPostings(chunks)
+
+    def __or__(self, other: "HybridPostings") -> "HybridPostings":
+        chunks = {}
+        for key in self.chunks.keys() | other.chunks.keys():
+            first, second = self.chunks.get(key), other.chunks.get(key)
+            if first is None or second is None:
+                chunks[key] = second if first is None else first
+                continue
+            values = [int.from_bytes(chunk if isinstance(chunk, bytes) else _bitmap_from_lows(chunk), "little")
+                      for chunk in (first, second)]
+            chunks[key] = _chunk_from_int(values[0] | values[1])
+        return HybridPostings(chunks)
+
+
+def write_varint_index(filepath: str, items: Iterable[Tuple], doc_lengths: Optional[Dict[int, int]] = None,
+                       positions: bool = False, analyzer: Optional[Analyzer] = None) -> None:
+    """Write (word, sorted doc ids) pairs to a varint index file.
+
+    Items must come sorted by the UTF-8 bytes of the word; they are consumed
+    one at a time, so the postings never have to be in memory all at once.
+    Layout: header, postings section, term dictionary, a fixed-width offset
+    table pointing at every dictionary block and a JSON metadata trailer
+    referenced by the header.
+
+    The dictionary is front-coded in blocks of DICTIONARY_BLOCK terms: a
+    block starts with the postings offset of its first term, and every term
+    stores the length of the prefix shared with the previous term of the
+    block, the rest of its bytes, its document count and its postings size.
+    The first term of a block is stored whole, so readers binary search the
+    blocks by their first term and scan a single block.
+
+    Doc ids are stored as gaps packed by _encode_packed, so loading a list
+    costs a few C calls instead of a Python loop per posting. Postings of
+    words in more than DENSE_CHUNK documents start with an encoding byte:
+    POSTINGS_PACKED, or POSTINGS_HYBRID for HybridPostings chunks, chosen
+    for words with at least one chunk dense enough to be a bitmap.
+
+    When doc_lengths is given the index gets the "frequencies" feature: items
+    are (word, doc ids, term frequencies) triples, the frequencies are
+    packed after the doc ids of every term and a packed document length
+    table follows the offset table. With positions (which needs doc_lengths)
+    items carry a fourth element, the token positions of every posting; they
+    are appended to the term as one length-prefixed, gap-encoded block per
+    posting so readers can skip the blocks of documents they do not need.
+
+    The configuration of the analyzer that produced the words (the default
+    Analyzer if not given) is kept in the metadata.
+    """
+    with_frequencies = doc_lengths is not None
+    with open(filepath, 'wb') as file:
+        file.write(VARINT_HEADER.pack(VARINT_MAGIC, VARINT_VERSION, 0))
+        dictionary = bytearray()
+        block_offsets = []
+        term_count = 0
+        previous_word = b""
+        position = VARINT_HEADER.size
+        for item in items:
+            word, doc_ids = item[0], item[1]
+            word_bytes = word.encode("utf-8")
+            buffer = bytearray()
+            if HybridPostings.is_worthwhile(doc_ids):
+                buffer.append(POSTINGS_HYBRID)
+                HybridPostings.from_doc_ids(doc_ids).encode(buffer)
+            else:
+                if len(doc_ids) > DENSE_CHUNK:
+                    buffer.append(POSTINGS_PACKED)
+                _encode_packed(buffer, [doc_id - previous for previous, doc_id in zip(chain((0,), doc_ids), doc_ids)])
+            if with_frequencies:
+                _encode_packed(buffer, item[2])
+            if positions:
+                for doc_positions in item[3]:
+                    block = bytearray()
+                    _encode_postings(block, doc_positions)
+                    _write_varint(buffer, len(block))
+                    buffer += block
+            file.write(buffer)
+            if term_count % DICTIONARY_BLOCK == 0:
+                block_offsets.append(len(dictionary))
+                _write_varint(dictionary, position)
+                previous_word = b""
+            shared = _common_prefix_length(previous_word, word_bytes)
+            _write_varint(dictionary, shared)
+            _write_varint(dictionary, len(word_bytes) - shared)
+            dictionary += word_bytes[shared:]
+            _write_varint(dictionary, len(doc_ids))
+            _write_varint(dictionary, len(buffer))
+            previous_word = word_bytes
+            term_count += 1
+            position += len(buffer)
+        dictionary_offset = position
+        file.write(dictionary)
+        offsets_offset = dictionary_offset + len(dictionary)
+        file.write(struct.pack(f"<{len(block_offsets)}Q", *(dictionary_offset + offset for offset in block_offsets)))
+        metadata_offset = offsets_offset + VARINT_OFFSET.size * len(block_offsets)
+        metadata = {"terms": term_count, "blocks": len(block_offsets), "block_size": DICTIONARY_BLOCK,
+                    "dictionary": dictionary_offset, "offsets": offsets_offset, "features": [],
+                    "analyzer": (analyzer or Analyzer()).to_config()}
+        if with_frequencies:
+            lengths = bytearray()
+            doc_ids = sorted(doc_lengths)
+            _encode_packed(lengths, [doc_id - previous for previous, doc_id in zip(chain((0,), doc_ids), doc_ids)])
+            _encode_packed(lengths, [doc_lengths[doc_id] for doc_id in doc_ids])
+            file.write(lengths)
+            metadata["features"].append("frequencies")
+            if positions:
+                metadata["features"].append("positions")
+            metadata["doc_lengths"] = metadata_offset
+            metadata["documents"] = len(doc_lengths)
+            metadata_offset += len(lengths)
+        file.write(json.dumps(metadata).encode("utf-8"))
+        file.seek(0)
+        file.write(VARINT_HEADER.pack(VARINT_MAGIC, VARINT_VERSION, metadata_offset))
+
+
+class MappedInvertedIndex:
+    """Read-only varint index that decodes postings only for requested words.
+
+    The file is memory-mapped, so opening it costs a header read and a
+    query touches just the first terms of the dictionary blocks visited by
+    binary search, one block and the postings of the queried words.
+    """
+
+    def __init__(self, filepath: str):
+        self._file = open(filepath, 'rb')
+        try:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{filepath} is not a varint inverted index")
+        data = self._data
+        if data[:len(VARINT_MAGIC)] != VARINT_MAGIC or len(data) < VARINT_HEADER.size:
+            self.close()
+            raise ValueError(f"{filepath} is not a varint inverted index")
+        _, version, metadata_offset = VARINT_HEADER.unpack_from(data)
+        if version != VARINT_VERSION:
+            self.close()
+            raise ValueError(f"Unsupported varint index version: {version}")
+        metadata = json.loads(data[metadata_offset:].decode("utf-8"))
+        unknown_features = set(metadata.get("features", [])) - VARINT_FEATURES
+        if unknown_features:
+            self.close()
+            raise ValueError(f"Unsupported varint index features: {sorted(unknown_features)}")
+        self._metadata = metadata
+        # indexes written before analyzers existed were split on whitespace only
+        self.analyzer = Analyzer.from_config(metadata["analyzer"]) if "analyzer" in metadata else Analyzer()
+        self._term_count = metadata["terms"]
+        self._block_count = metadata["blocks"]
+        self._block_size = metadata["block_size"]
+        self._offsets_offset = metadata["offsets"]
+        self.has_frequencies = "frequencies" in metadata.get("features", [])
+        self.has_positions = "positions" in metadata.get("features", [])
+        self._doc_lengths = None
+
+    def close(self) -> None:
+        """Release the memory map and the underlying file."""
+        self._data.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._term_count
+
+    def __contains__(self, word: str) -> bool:
+        return self._find(word) is not None
+
+    def _block_first_word(self, block: int) -> bytes:
+        """Read the first term of a dictionary block, which is stored whole."""
+        data = self._data
+        pos = VARINT_OFFSET.unpack_from(data, self._offsets_offset + block * VARINT_OFFSET.size)[0]
+        _, pos = _read_varint(data, pos)
+        _, pos = _read_varint(data, pos)
+        length, pos = _read_varint(data, pos)
+        return data[pos:pos + length]
+
+    def _block_entries(self, block: int) -> Iterator[Tuple[bytes, int, int, int]]:
+        """Decode the (word bytes, doc count, postings offset, postings size) entries of a block."""
+        data = self._data
+        pos = VARINT_OFFSET.unpack_from(data, self._offsets_offset + block * VARINT_OFFSET.size)[0]
+        postings_offset, pos = _read_varint(data, pos)
+        word_bytes = b""
+        for _ in range(min(self._block_size, self._term_count - block * self._block_size)):
+            shared, pos = _read_varint(data, pos)
+            length, pos = _read_varint(data, pos)
+            word_bytes = word_bytes[:shared] + data[pos:pos + length]
+            pos += length
+            doc_count, pos = _read_varint(data, pos)
+            postings_size, pos = _read_varint(data, pos)
+            yield word_bytes, doc_count, postings_offset, postings_size
+            postings_offset += postings_size
+
+    def _entries_from(self, target: bytes) -> Iterator[Tuple[bytes, int, int, int]]:
+        """Iterate over dictionary entries starting at the block that may hold target.
+
+        Binary search finds the last block whose first term is not greater
+        than target; entries before target in that block are yielded too.
+        """
+        low, high = 0, self._block_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._block_first_word(middle) <= target:
+                low = middle + 1
+            else:
+                high = middle
+        for block in range(max(low - 1, 0), self._block_count):
+            yield from self._block_entries(block)
+
+    def _find(self, word: str) -> Optional[Tuple[bytes, int, int, int]]:
+        """Look the word up in the term dictionary."""
+        target = word.encode("utf-8")
+        for entry in self._entries_from(target):
+            if entry[0] >= target:
+                return entry if entry[0] == target else None
+        return None
+
+    def _expand(self, pattern: str) -> Iterator[Tuple[bytes, int, int, int]]:
+        """Yield the dictionary entries of the words matching a wildcard pattern.
+
+        Only the range of terms sharing the literal prefix of the pattern is
+        scanned.
+        """
+        prefix = _wildcard_prefix(pattern).encode("utf-8")
+        matches = _wildcard_matcher(pattern)
+        for entry in self._entries_from(prefix):
+            if not entry[0].startswith(prefix):
+                if entry[0] > prefix:
+                    return
+                continue
+            if matches(entry[0].decode("utf-8")):
+                yield entry
+
+    def expand_terms(self, pattern: str) -> List[str]:
+        """Return the words matching a pattern with * and ? wildcards, in dictionary order."""
+        return [entry[0].decode("utf-8") for entry in self._expand(pattern)]
+
+    def wildcard_postings(self, pattern: str) -> List[int]:
+        """Return the sorted union of the doc ids of all words matching the pattern."""
+        return _union_postings([self._decode(entry) for entry in self._expand(pattern)])
+
+    @staticmethod
+    def _decode_doc_ids(data: bytes, doc_count: int) -> Tuple[List[int], int]:
+        """Decode the doc ids at the start of a term's postings, return them and the next position."""
+        if doc_count > DENSE_CHUNK and data[0] == POSTINGS_HYBRID:
+            hybrid_postings, pos = HybridPostings.decode(data, 1)
+            return list(hybrid_postings), pos
+        gaps, pos = _decode_packed(data, int(doc_count > DENSE_CHUNK), doc_count)
+        return list(accumulate(gaps)), pos
+
+    def _decode(self, entry: Tuple[bytes, int, int, int]) -> List[int]:
+        _, doc_count, postings_offset, postings_size = entry
+        return self._decode_doc_ids(self._data[postings_offset:postings_offset + postings_size], doc_count)[0]
+
+    def _decode_entry(self, entry: Tuple[bytes, int, int, int]) -> Tuple[List[int], Optional[List[int]], Optional[List[List[int]]]]:
+        """Decode the doc ids, term frequencies and position lists of a dictionary entry in one pass.
+
+        Frequencies and positions are None when the index does not store them.
+        """
+        _, doc_count, postings_offset, postings_size = entry
+        data = self._data[postings_offset:postings_offset + postings_size]
+        doc_ids, pos = self._decode_doc_ids(data, doc_count)
+        frequencies = positions = None
+        if self.has_frequencies:
+            frequencies, pos = _decode_packed(data, pos, doc_count)
+            frequencies = list(frequencies)
+        if self.has_positions:
+            # A block holds one varint per occurrence, so the size prefixes and
+            # gaps of all the blocks are decoded by a single call
+            values, _ = _decode_varints(data, pos, doc_count + sum(frequencies))
+            positions = []
+            start = 1
+            for frequency in frequencies:
+                positions.append(list(accumulate(values[start:start + frequency])))
+                start += frequency + 1
+        return doc_ids, frequencies, positions
+
+    def _hybrid(self, entry: Tuple[bytes, int, int, int]) -> Optional[HybridPostings]:
+        """Return the HybridPostings of a dictionary entry, or None if it is gap-encoded."""
+        _, doc_count, postings_offset, postings_size = entry
+        if doc_count <= DENSE_CHUNK or self._data[postings_offset] != POSTINGS_HYBRID:
+            return None
+        return HybridPostings.decode(self._data[postings_offset:postings_offset + postings_size], 1)[0]
+
+    def postings(self, word: str) -> List[int]:
+        """Return the sorted doc ids of the word, or an empty list."""
+        entry = self._find(word)
+        if entry is None:
+            return []
+        return self._decode(entry)
+
+    def postings_with_frequencies(self, word: str) -> Tuple[List[int], List[int]]:
+        """Return the sorted doc ids of the word with their term frequencies."""
+        entry = self._find(word)
+        if entry is None:
+            return [], []
+        _, doc_count, postings_offset, postings_size = entry
+        data = self._data[postings_offset:postings_offset + postings_size]
+        doc_ids, pos = self._decode_doc_ids(data, doc_count)
+        return doc_ids, list(_decode_packed(data, pos, doc_count)[0])
+
+    def document_frequency(self, word: str) -> int:
+        """Number of documents containing the word, read from the dictionary."""
+        entry = self._find(word)
+        return 0 if entry is None else entry[1]
+
+    def positions(self, word: str, doc_ids: List[int]) -> Dict[int, List[int]]:
+        """Return token positions of the word in the given sorted doc ids.
+
+        Position blocks of other documents are skipped by their length
+        prefix without being decoded.
+        """
+        if not self.has_positions:
+            raise ValueError("The index was built without positions")
+        entry = self._find(word)
+        if entry is None or not doc_ids:
+            return {}
+        _, doc_count, postings_offset, postings_size = entry
+        data = self._data[postings_offset:postings_offset + postings_size]
+        all_doc_ids, pos = self._decode_doc_ids(data, doc_count)
+        _, pos = _decode_packed(data, pos, doc_count)
+        result = {}
+        wanted = 0
+        for doc_id in all_doc_ids:
+            size, pos = _read_varint(data, pos)
+            while wanted < len(doc_ids) and doc_ids[wanted] < doc_id:
+                wanted += 1
+            if wanted == len(doc_ids):
+                break
+            if doc_ids[wanted] == doc_id:
+                result[doc_id] = _decode_position_block(data, pos, size)
+            pos += size
+        return result
+
+    @property
+    def doc_lengths(self) -> Dict[int, int]:
+        """Document lengths in words, decoded on first use."""
+        if self._doc_lengths is None:
+            if not self.has_frequencies:
+                raise ValueError("The index was built without term frequencies")
+            document_count = self._metadata["documents"]
+            gaps, pos = _decode_packed(self._data, self._metadata["doc_lengths"], document_count)
+            self._doc_lengths = dict(zip(accumulate(gaps), _decode_packed(self._data, pos, document_count)[0]))
+        return self._doc_lengths
+
+    def entries(self) -> Iterator[Tuple[str, List[int], Optional[List[int]], Optional[List[List[int]]]]]:
+        """Iterate over all (word, doc ids, term frequencies, position lists) in dictionary order.
+
+        The dictionary is walked once and every term decoded once; see
+        _decode_entry for the missing features.
+        """
+        for block in range(self._block_count):
+            for entry in self._block_entries(block):
+                yield (entry[0].decode("utf-8"), *self._decode_entry(entry))
+
+    def items(self) -> Iterator[Tuple[str, List[int]]]:
+        """Iterate over all (word, doc ids) pairs in dictionary order."""
+        for block in range(self._block_count):
+            for entry in self._block_entries(block):
+                yield entry[0].decode("utf-8"), self._decode(entry)
+
+    def query_ranked(self, words: List[str], top_k: int = 10, operator: str = "or") -> List[Tuple[int, float]]:
+        """Return the top_k (doc id, BM25 score) pairs for the words."""
+        doc_lengths = self.doc_lengths
+        terms = set(self.analyzer.analyze(" ".join(words)))
+        return rank_bm25([self.postings_with_frequencies(term) for term in terms], doc_lengths,
+                         top_k=top_k, operator=operator)
+
+    def query(self, words: List[str]) -> List[int]:
+        """Find documents containing all given words, sorted by doc id.
+
+        Dictionary entries already carry document frequencies, so postings
+        are decoded rarest first and decoding stops once nothing is left.
+        Words stored as HybridPostings are never decoded when a gap-encoded
+        word is present: the result is filtered by membership probes, so a
+        frequent word costs time proportional to the rare word's list. Only
+        hybrid words are combined chunk by chunk with bitmap ANDs.
+        """
+        entries = []
+        for term in self.analyzer.analyze(" ".join(words)):
+            entry = self._find(term)
+            if entry is None:
+                return []
+            entries.append(entry)
+        if not entries:
+            return []
+        entries.sort(key=lambda entry: entry[1])
+        result = None
+        hybrid = []
+        for entry in entries:
+            hybrid_postings = self._hybrid(entry)
+            if hybrid_postings is not None:
+                hybrid.append(hybrid_postings)
+            elif result is None:
+                result = self._decode(entry)
+            elif result:
+                result = _intersect_pair(result, self._decode(entry))
+        if result is None:
+            combined = hybrid[0]
+            for hybrid_postings in hybrid[1:]:
+                combined &= hybrid_postings
+            return list(combined)
+        for hybrid_postings in hybrid:
+            if not result:
+                break
+            result = hybrid_postings.filter(result)
+        return result
+
 
 class InvertedIndex:
     def __init__(self):
         self.index = {}
+        self.frequencies = None  # word -> term frequencies aligned with self.index[word]
+        self.doc_lengths = None  # doc id -> number of words
+        self.positions_index = None  # word -> token positions aligned with self.index[word]
+        self.analyzer = Analyzer()
+        self._sorted_words = None
+
+    def postings(self, word: str) -> List[int]:
+        """Return the sorted doc ids of the word, or an empty list."""
+        return self.index.get(word, [])
+
+    def expand_terms(self, pattern: str) -> List[str]:
+        """Return the words matching a pattern with * and ? wildcards, in sorted order.
+
+        The sorted word list is built on first use and rebuilt when the
+        number of words changes; only the range sharing the literal prefix
+        of the pattern is scanned.
+        """
+        if self._sorted_words is None or len(self._sorted_words) != len(self.index):
+            self._sorted_words = sorted(self.index)
+        prefix = _wildcard_prefix(pattern)
+        matches = _wildcard_matcher(pattern)
+        result = []
+        for word in islice(self._sorted_words, bisect_left(self._sorted_words, prefix), None):
+            if not word.startswith(prefix):
+                break
+            if matches(word):
+                result.append(word)
+        return result
+
+    def wildcard_postings(self, pattern: str) -> List[int]:
+        """Return the sorted union of the doc ids of all words matching the pattern."""
+        return _union_postings([self.index[word] for word in self.expand_terms(pattern)])
 
     def query(self, words: List[str]) -> List[int]:
-        """Find documents containing all given words."""
-        result_sets = [set(self.index.get(word, [])) for word in words]
-        if result_sets:
-            return list(set.intersection(*result_sets))
-        return []
+        """Find documents containing all given words, sorted by doc id."""
+        return intersect_postings([self.index.get(term, []) for term in self.analyzer.analyze(" ".join(words))])
+
+    def document_frequency(self, word: str) -> int:
+        """Number of documents containing the word."""
+        return len(self.index.get(word, []))
+
+    @property
+    def has_frequencies(self) -> bool:
+        return self.frequencies is not None
+
+    def positions(self, word: str, doc_ids: List[int]) -> Dict[int, List[int]]:
+        """Return token positions of the word in the given sorted doc ids."""
+        if self.positions_index is None:
+            raise ValueError("The index was built without positions")
+        postings = self.index.get(word, [])
+        result = {}
+        position = 0
+        for doc_id in doc_ids:
+            position = _gallop(postings, doc_id, position)
+            if position < len(postings) and postings[position] == doc_id:
+                result[doc_id] = self.positions_index[word][position]
+        return result
+
+    def query_ranked(self, words: List[str], top_k: int = 10, operator: str = "or") -> List[Tuple[int, float]]:
+        """Return the top_k (doc id, BM25 score) pairs for the words."""
+        if self.frequencies is None:
+            raise ValueError("The index was built without term frequencies")
+        terms = set(self.analyzer.analyze(" ".join(words)))
+        postings = [(self.index.get(term, []), self.frequencies.get(term, [])) for term in terms]
+        return rank_bm25(postings, self.doc_lengths, top_k=top_k, operator=operator)
 
     def dump(self, filepath: str, strategy: str = "struct") -> None:
         """Save the inverted index to a file using the specified strategy."""
+        if self.frequencies is not None and strategy != "varint":
+            raise ValueError("Term frequencies can only be stored with the varint strategy")
+        if self.analyzer != Analyzer() and strategy != "varint":
+            raise ValueError("A custom analyzer can only be stored with the varint strategy")
         if strategy == "json":
             with open(filepath, 'w', encoding='utf-8') as file:
-                json.dump(self.index, file)
+                # postings may be arrays or memoryviews of a zero-copy struct load
+                json.dump(self.index, file, sort_keys=True, default=list)
         elif strategy == "struct":
             with open(filepath, 'wb') as file:
+                words = sorted(self.index)
                 serialized_table = []
                 row_data = []
 
-                for word, doc_ids in self.index.items():
+                for word in words:
+                    doc_ids = self.index[word]
                     encoded_word = word.encode("utf-8")
                     serialized_table.append((len(encoded_word), len(doc_ids)))
-                    row_data.extend(doc_ids)
+                    row_data.extend(sorted(doc_ids))
 
                 table_size = len(serialized_table)
-                file.write(struct.pack("I", table_size))
+                file.write(struct.pack("<I", table_size))
 
-                for word, (length, doc_count) in zip(self.index.keys(), serialized_table):
+                for word, (length, doc_count) in zip(words, serialized_table):
                     word_bytes = word.encode("utf-8")
-                    file.write(struct.pack(f"H{length}sH", length, word_bytes, doc_count))
+                    file.write(struct.pack(f"<H{length}sH", length, word_bytes, doc_count))
 
-                file.write(struct.pack(f"{len(row_data)}H", *row_data))
+                file.write(struct.pack(f"<{len(row_data)}H", *row_data))
+        elif strategy == "varint":
+            words = sorted(self.index, key=lambda word: word.encode("utf-8"))
+            if self.frequencies is None:
+                write_varint_index(filepath, ((word, sorted(self.index[word])) for word in words), analyzer=self.analyzer)
+            elif self.positions_index is None:
+                items = ((word, *zip(*sorted(zip(self.index[word], self.frequencies[word])))) for word in words)
+                write_varint_index(filepath, items, doc_lengths=self.doc_lengths, analyzer=self.analyzer)
+            else:
+                items = ((word, *zip(*sorted(zip(self.index[word], self.frequencies[word], self.positions_index[word]))))
+                         for word in words)
+                write_varint_index(filepath, items, doc_lengths=self.doc_lengths, positions=True, analyzer=self.analyzer)
+        else:
+            raise ValueError(f"Unknown storage strategy: {strategy}")
 
     @classmethod
-    def load(cls, filepath: str, strategy: str = "struct"):
-        """Load the inverted index from a file using the specified strategy."""
+    def load(cls, filepath: str, strategy: str = "struct", zero_copy: bool = False):
+        """Load the inverted index from a file using the specified strategy.
+
+        The struct file is read in one go, all doc ids are materialized by a
+        single bulk conversion and the garbage collector is paused meanwhile,
+        since its passes over the many new posting lists would dominate the
+        load time; it is paused for the varint strategy as well. With
+        zero_copy the postings are read-only memoryviews into the file
+        contents (arrays on big-endian machines) instead of lists, which
+        saves creating an int object per posting.
+        """
+        if zero_copy and strategy != "struct":
+            raise ValueError("Zero-copy loading is only supported by the struct strategy")
         instance = cls()
         if strategy == "json":
             with open(filepath, 'r', encoding='utf-8') as file:
-                instance.index = json.load(file)
+                instance.index = {word: sorted(doc_ids) for word, doc_ids in json.load(file).items()}
         elif strategy == "struct":
             with open(filepath, 'rb') as file:
-                table_size = struct.unpack("I", file.read(struct.calcsize("I")))[0]
-                instance.index = {}
+                data = file.read()
+            gc_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                table_size = STRUCT_COUNT.unpack_from(data)[0]
+                table = []
+                pos = STRUCT_COUNT.size
                 for _ in range(table_size):
-                    length = struct.unpack("H", file.read(struct.calcsize("H")))[0]
-                    word_bytes = file.read(length)
-                    doc_count = struct.unpack("H", file.read(struct.calcsize("H")))[0]
-                    doc_ids = struct.unpack(f"{doc_count}H", file.read(doc_count * struct.calcsize("H")))
-                    instance.index[word_bytes.decode("utf-8")] = list(doc_ids)
+                    # little-endian <H word length, the word, <H doc count
+                    end = pos + 2 + (data[pos] | data[pos + 1] << 8)
+                    table.append((data[pos + 2:end].decode("utf-8"), data[end] | data[end + 1] << 8))
+                    pos = end + 2
+                if zero_copy and sys.byteorder == "little":
+                    all_doc_ids = memoryview(data)[pos:].cast("H")
+                else:
+                    all_doc_ids = array("H")
+                    all_doc_ids.frombytes(data[pos:])
+                    if sys.byteorder == "big":
+                        all_doc_ids.byteswap()
+                    if not zero_copy:
+                        all_doc_ids = all_doc_ids.tolist()
+                instance.index = {}
+                start = 0
+                for word, doc_count in table:
+                    instance.index[word] = all_doc_ids[start:start + doc_count]
+                    start += doc_count
+            finally:
+                if gc_enabled:
+                    gc.enable()
+        elif strategy == "varint":
+            gc_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                with MappedInvertedIndex(filepath) as mapped_index:
+                    instance.analyzer = mapped_index.analyzer
+                    if mapped_index.has_frequencies:
+                        instance.frequencies = {}
+                        instance.doc_lengths = mapped_index.doc_lengths
+                    if mapped_index.has_positions:
+                        instance.positions_index = {}
+                    for word, doc_ids, frequencies, positions in mapped_index.entries():
+                        instance.index[word] = doc_ids
+                        if frequencies is not None:
+                            instance.frequencies[word] = frequencies
+                        if positions is not None:
+                            instance.positions_index[word] = positions
+            finally:
+                if gc_enabled:
+                    gc.enable()
+        else:
+            raise ValueError(f"Unknown storage strategy: {strategy}")
         return instance
 
+def open_index(filepath: str, strategy: str = "struct",
+               workers: Optional[int] = None) -> Union[InvertedIndex, MappedInvertedIndex, "SegmentedIndex", "ShardedIndex"]:
+    """Open an index for querying.
+
+    A directory is a sharded index (queried by workers processes) or a
+    segmented one, varint files are memory-mapped and the other strategies
+    are loaded fully, struct ones without copying the postings.
+    """
+    if os.path.isdir(filepath):
+        # The segmented and sharded indexes build on this module, so they are imported on demand
+        from task_Garifulla_Kenessary_inverted_index_segments import SegmentedIndex, _read_manifest
+        from task_Garifulla_Kenessary_inverted_index_shards import ShardedIndex
+        if "shards" in _read_manifest(filepath):
+            return ShardedIndex(filepath, workers=workers)
+        return SegmentedIndex(filepath)
+    if strategy == "varint":
+        return MappedInvertedIndex(filepath)
+    return InvertedIndex.load(filepath, strategy=strategy, zero_copy=strategy == "struct")
+
+
+def iter_documents(filepath: str) -> Iterator[Tuple[int, str]]:
+    """Yield (doc id, content) pairs from a file one line at a time."""
+    with open(filepath, 'r', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            doc_id, content = line.split('\t', 1)
+            yield int(doc_id), content
+
 def load_documents(filepath: str) -> Dict[int, str]:
     """Load documents from a file."""
+    return dict(iter_documents(filepath))
+
+def _dataset_shards(filepath: str, shard_count: int) -> List[Tuple[str, int, int]]:
+    """Split the dataset file into byte ranges of roughly equal size."""
+    size = os.path.getsize(filepath)
+    step = max(1, -(-size // shard_count))
+    return [(filepath, start, min(start + step, size)) for start in range(0, size, step)]
+
+def _load_documents_shard(filepath: str, start: int, end: int) -> Dict[int, str]:
+    """Load the documents whose lines start inside the [start, end) byte range."""
     documents = {}
-    with open(filepath, 'r', encoding='utf-8') as file:
-        for line in file:
-            doc_id, content = line.strip().split('\t', 1)
+    with open(filepath, 'rb') as file:
+        if start:
+            file.seek(start - 1)
+            file.readline()
+        position = file.tell()
+        while position < end:
+            line = file.readline()
+            if not line:
+                break
+            position += len(line)
+            line = line.decode('utf-8').strip()
+            if not line:
+                continue
+            doc_id, content = line.split('\t', 1)
             documents[int(doc_id)] = content
     return documents
 
-def build_inverted_index(documents: Dict[int, str]) -> InvertedIndex:
-    """Build an inverted index from the documents."""
+def _build_shard(shard: Tuple[str, int, int, Optional[Analyzer]]) -> Dict[str, List[int]]:
+    """Build the partial index of one dataset shard in a worker process."""
+    filepath, start, end, analyzer = shard
+    return build_inverted_index(_load_documents_shard(filepath, start, end), analyzer=analyzer).index
+
+def build_inverted_index(documents: Dict[int, str], frequencies: bool = False, positions: bool = False,
+                         analyzer: Optional[Analyzer] = None) -> InvertedIndex:
+    """Build an inverted index with postings sorted by doc id.
+
+    Documents are split into terms by the analyzer (the default Analyzer if
+    not given). With frequencies the index also keeps per-posting term
+    frequencies and document lengths, which ranked queries need. positions
+    additionally keeps the token positions of every posting for phrase
+    queries and implies frequencies.
+    """
+    frequencies = frequencies or positions
+    inverted_index = InvertedIndex()
+    if analyzer is not None:
+        inverted_index.analyzer = analyzer
+    if frequencies:
+        inverted_index.frequencies = {}
+        inverted_index.doc_lengths = {}
+    if positions:
+        inverted_index.positions_index = {}
+    for doc_id, content in sorted(documents.items()):
+        words = inverted_index.analyzer.analyze(content)
+        for word in words:
+            doc_ids = inverted_index.index.setdefault(word, [])
+            if not doc_ids or doc_ids[-1] != doc_id:
+                doc_ids.append(doc_id)
+        if frequencies:
+            inverted_index.doc_lengths[doc_id] = len(words)
+            for word, count in Counter(words).items():
+                inverted_index.frequencies.setdefault(word, []).append(count)
+        if positions:
+            word_positions = {}
+            for position, word in enumerate(words):
+                word_positions.setdefault(word, []).append(position)
+            for word, doc_positions in word_positions.items():
+                inverted_index.positions_index.setdefault(word, []).append(doc_positions)
+    return inverted_index
+
+def parse_size(text: str) -> int:
+    """Parse a byte size such as 4096, 512K, 256M or 2G."""
+    text = text.strip().upper()
+    multiplier = SIZE_SUFFIXES.get(text[-1:], 1)
+    if text[-1:] in SIZE_SUFFIXES:
+        text = text[:-1]
+    return int(float(text) * multiplier)
+
+def _flush_block(block: Dict[str, List[int]], directory: str, number: int) -> str:
+    """Write an in-memory block sorted by word to a temporary block file."""
+    block_path = os.path.join(directory, f"block-{number:05d}")
+    with open(block_path, 'wb') as file:
+        for word_bytes, doc_ids in sorted((word.encode("utf-8"), doc_ids) for word, doc_ids in block.items()):
+            doc_ids.sort()
+            buffer = bytearray()
+            _encode_postings(buffer, doc_ids)
+            file.write(BLOCK_RECORD.pack(len(word_bytes), len(doc_ids), len(buffer)))
+            file.write(word_bytes)
+            file.write(buffer)
+    return block_path
+
+def _read_block(block_path: str) -> Iterator[Tuple[bytes, List[int]]]:
+    """Stream (word bytes, doc ids) records back from a block file."""
+    with open(block_path, 'rb') as file:
+        while True:
+            record = file.read(BLOCK_RECORD.size)
+            if not record:
+                return
+            length, doc_count, postings_size = BLOCK_RECORD.unpack(record)
+            word_bytes = file.read(length)
+            yield word_bytes, _decode_postings(file.read(postings_size), 0, doc_count)[0]
+
+def _merge_union(postings: List[List[int]]) -> List[int]:
+    """Union sorted posting lists into one sorted list without duplicates."""
+    if len(postings) == 1:
+        return postings[0]
+    doc_ids = []
+    for doc_id in heapq.merge(*postings):
+        if not doc_ids or doc_ids[-1] != doc_id:
+            doc_ids.append(doc_id)
+    return doc_ids
+
+def _union_postings(postings: List[List[int]]) -> List[int]:
+    """Union many sorted posting lists, e.g. of all words matching a wildcard.
+
+    With many lists one set union sorted once is much cheaper than a
+    k-way merge in pure Python.
+    """
+    if len(postings) <= 1:
+        return list(postings[0]) if postings else []
+    return sorted(set().union(*postings))
+
+def _merge_sorted_postings(streams: List[Iterator[Tuple[bytes, List[int]]]]) -> Iterator[Tuple[str, List[int]]]:
+    """K-way merge (word bytes, doc ids) streams sorted by word into (word, doc ids) pairs."""
+    records = heapq.merge(*streams, key=lambda record: record[0])
+    for word_bytes, group in groupby(records, key=lambda record: record[0]):
+        yield word_bytes.decode("utf-8"), _merge_union([doc_ids for _, doc_ids in group])
+
+def _merge_blocks(block_paths: List[str]) -> Iterator[Tuple[str, List[int]]]:
+    """K-way merge sorted block files into (word, doc ids) pairs in word order."""
+    return _merge_sorted_postings([_read_block(path) for path in block_paths])
+
+def build_inverted_index_external(filepath: str, output: str, strategy: str = "struct",
+                                  memory_limit: int = 256 * 1024 ** 2, temp_dir: Optional[str] = None,
+                                  analyzer: Optional[Analyzer] = None) -> int:
+    """Build an index of a dataset that does not fit in memory (SPIMI).
+
+    Documents are streamed line by line into an in-memory block; when the
+    estimated size of the block exceeds memory_limit it is sorted and
+    flushed to a temporary file. The blocks are then k-way merged: straight
+    into the output file for the varint strategy, through an in-memory
+    InvertedIndex for json and struct. Returns the number of blocks written.
+    """
+    analyzer = analyzer or Analyzer()
+    if analyzer != Analyzer() and strategy != "varint":
+        raise ValueError("A custom analyzer can only be stored with the varint strategy")
+    with tempfile.TemporaryDirectory(dir=temp_dir) as directory:
+        block_paths = []
+        block = {}
+        block_size = 0
+        for doc_id, content in iter_documents(filepath):
+            for word in analyzer.analyze(content):
+                doc_ids = block.get(word)
+                if doc_ids is None:
+                    block[word] = [doc_id]
+                    block_size += TERM_OVERHEAD + sys.getsizeof(word) + POSTING_OVERHEAD
+                elif doc_ids[-1] != doc_id:
+                    doc_ids.append(doc_id)
+                    block_size += POSTING_OVERHEAD
+            if block_size >= memory_limit:
+                block_paths.append(_flush_block(block, directory, len(block_paths)))
+                block = {}
+                block_size = 0
+        if block or not block_paths:
+            block_paths.append(_flush_block(block, directory, len(block_paths)))
+
+        if strategy == "varint":
+            write_varint_index(output, _merge_blocks(block_paths), analyzer=analyzer)
+        else:
+            inverted_index = InvertedIndex()
+            inverted_index.index = dict(_merge_blocks(block_paths))
+            inverted_index.dump(output, strategy=strategy)
+        return len(block_paths)
+
+def build_inverted_index_parallel(filepath: str, workers: int, analyzer: Optional[Analyzer] = None) -> InvertedIndex:
+    """Build an inverted index of the dataset file with a pool of worker processes.
+
+    Each worker indexes one byte range of the file (map), then the partial
+    postings are concatenated and re-sorted per word (reduce). Doc ids are
+    expected to be unique across the dataset, as in build_inverted_index.
+    """
+    with Pool(workers) as pool:
+        shards = [(*shard, analyzer) for shard in _dataset_shards(filepath, workers)]
+        partial_indexes = pool.map(_build_shard, shards)
     inverted_index = InvertedIndex()
-    for doc_id, content in documents.items():
-        for word in content.split():
-            if word not in inverted_index.index:
-                inverted_index.index[word] = []
-            if doc_id not in inverted_index.index[word]:
-                inverted_index.index[word].append(doc_id)
+    if analyzer is not None:
+        inverted_index.analyzer = analyzer
+    unsorted_words = set()
+    for partial_index in partial_indexes:
+        for word, doc_ids in partial_index.items():
+            merged_doc_ids = inverted_index.index.get(word)
+            if merged_doc_ids is None:
+                inverted_index.index[word] = doc_ids
+            else:
+                merged_doc_ids.extend(doc_ids)
+                unsorted_words.add(word)
+    for word in unsorted_words:
+        inverted_index.index[word].sort()
     return inverted_index
 
+def _term_count(inverted_index) -> int:
+    """Dictionary entries of an opened index, a word counted once per segment or shard."""
+    from task_Garifulla_Kenessary_inverted_index_segments import SegmentedIndex
+    from task_Garifulla_Kenessary_inverted_index_shards import ShardedIndex
+    if isinstance(inverted_index, ShardedIndex):
+        return sum(len(reader) for reader in inverted_index.readers)
+    if isinstance(inverted_index, SegmentedIndex):
+        return sum(len(segment) for segment in inverted_index.segments)
+    if isinstance(inverted_index, MappedInvertedIndex):
+        return len(inverted_index)
+    return len(inverted_index.index)
+
 def main():
+    # The query, segment and shard modules build on this one, so the CLI imports them on demand
+    from task_Garifulla_Kenessary_inverted_index_query import CachedQueryEngine
+    from task_Garifulla_Kenessary_inverted_index_segments import SegmentedIndex, add_segment, merge_segments
+    from task_Garifulla_Kenessary_inverted_index_shards import RemoteShardedIndex, ShardedIndex, build_sharded_index
+
     parser = argparse.ArgumentParser(description="Inverted Index CLI")
+    parser.set_defaults(profile=False, profile_dump=None, profile_graphite=None)
     subparsers = parser.add_subparsers(dest="command")
 
-    build_parser = subparsers.add_parser("build", help="Build an inverted index")
+    profile_parser = argparse.ArgumentParser(add_help=False)
+    profile_parser.add_argument("--profile", action="store_true", help="Print wall time, CPU time, items and peak RSS of every stage to stderr")
+    profile_parser.add_argument("--profile-dump", help="Also run under cProfile and save the stats to this file (implies --profile)")
+    profile_parser.add_argument("--profile-graphite", help="Also write the stage metrics in Graphite plaintext format to this file (implies --profile)")
+
+    build_parser = subparsers.add_parser("build", help="Build an inverted index", parents=[profile_parser])
     build_parser.add_argument("--dataset", default="sample.txt", help="Path to the dataset file (default: sample.txt)")
     build_parser.add_argument("--output", required=True, help="Path to save the inverted index")
-    build_parser.add_argument("--strategy", choices=["json", "struct"], default="struct", help="Storage strategy (default: struct)")
+    build_parser.add_argument("--strategy", choices=["json", "struct", "varint"], default="struct", help="Storage strategy (default: struct)")
+    build_parser.add_argument("--workers", type=int, default=1, help="Number of worker processes (default: 1)")
+    build_parser.add_argument("--memory-limit", type=parse_size, help="Stream the dataset and spill partial indexes to disk above this size, e.g. 512M")
+    build_parser.add_argument("--frequencies", action="store_true", help="Store term frequencies and document lengths for ranked queries (varint only)")
+    build_parser.add_argument("--positions", action="store_true", help="Also store token positions for phrase queries (varint only)")
+    build_parser.add_argument("--normalize", action="store_true", help="Unicode-normalize, lowercase and strip punctuation from words (varint only)")
+    build_parser.add_argument("--stopwords", action="store_true", help="Drop common English stopwords (varint only)")
+    build_parser.add_argument("--stemming", action="store_true", help="Reduce plural words to their singular form (varint only)")
+    build_parser.add_argument("--shards", type=int, help="Partition documents into this many varint shards; --output is then a directory")
+    build_parser.add_argument("--partition", choices=["hash", "range"], default="hash", help="How documents are assigned to shards (default: hash)")
+    build_parser.add_argument("--store-documents", action="store_true", help="Also write a compressed document store next to the index for --show-snippets")
 
-    query_parser = subparsers.add_parser("query", help="Query the inverted index")
-    query_parser.add_argument("--index", required=True, help="Path to the inverted index file")
+    query_parser = subparsers.add_parser("query", help="Query the inverted index", parents=[profile_parser])
+    query_parser.add_argument("--index", help="Path to the inverted index file or segmented/sharded index directory")
+    query_parser.add_argument("--shard-url", action="append", help="Base URL of a serve process holding one shard; repeat for every shard")
+    query_parser.add_argument("--workers", type=int, help="Worker processes for a sharded index (default: one per shard, up to the CPU count)")
     query_parser.add_argument("--query", nargs="+", action="append", help="Query words")
+    query_parser.add_argument("--query-file", help="File with one whitespace-separated query per line, '-' for stdin")
+    query_parser.add_argument("--strategy", choices=["json", "struct", "varint"], default="struct", help="Storage strategy of the index (default: struct)")
+    query_parser.add_argument("--cache-size", type=int, default=1024, help="Number of posting lists kept in the query cache (default: 1024)")
+    query_parser.add_argument("--rank", choices=["bm25"], help="Rank results instead of returning all matching doc ids")
+    query_parser.add_argument("--top-k", type=int, default=10, help="Number of ranked results per query (default: 10)")
+    query_parser.add_argument("--operator", choices=["and", "or"], default="or", help="How ranked queries combine words (default: or)")
+    query_parser.add_argument("--show-snippets", action="store_true", help="Print a snippet line for each of the first --top-k results (needs a build with --store-documents)")
+    query_parser.add_argument("--syntax", choices=["words", "expression"], default="words",
+                              help="Treat queries as plain words or as expressions with \"phrases\", prefix* and ? wildcards, AND, OR, NOT and parentheses (default: words)")
+
+    add_parser = subparsers.add_parser("add", help="Add documents to a segmented index as a new segment")
+    add_parser.add_argument("--index", required=True, help="Path to the segmented index directory")
+    add_parser.add_argument("--dataset", required=True, help="Path to the file with the new documents")
+    add_parser.add_argument("--merge-factor", type=int, default=10, help="Segments per tier before they are merged (default: 10)")
+    add_parser.add_argument("--no-merge", action="store_true", help="Do not run the tiered merge policy after adding")
+
+    merge_parser = subparsers.add_parser("merge", help="Compact the segments of a segmented index")
+    merge_parser.add_argument("--index", required=True, help="Path to the segmented index directory")
+    merge_parser.add_argument("--merge-factor", type=int, default=10, help="Segments per tier before they are merged (default: 10)")
+    merge_parser.add_argument("--force", action="store_true", help="Merge all segments into one")
+
+    serve_parser = subparsers.add_parser("serve", help="Serve queries over HTTP from a preloaded index")
+    serve_parser.add_argument("--index", required=True, help="Path to the inverted index file or segmented index directory")
+    serve_parser.add_argument("--strategy", choices=["json", "struct", "varint"], default="struct", help="Storage strategy of the index (default: struct)")
+    serve_parser.add_argument("--cache-size", type=int, default=1024, help="Number of posting lists kept in the query cache (default: 1024)")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="Host to listen on (default: 127.0.0.1)")
+    serve_parser.add_argument("--port", type=int, default=5000, help="Port to listen on (default: 5000)")
 
     args = parser.parse_args()
 
-    if args.command == "build":
-        documents = load_documents(args.dataset)
-        inverted_index = build_inverted_index(documents)
-        inverted_index.dump(args.output, strategy=args.strategy)
-        print(f"Inverted index built and saved to {args.output}")
-
-    elif args.command == "query":
-        inverted_index = InvertedIndex.load(args.index, strategy="struct")
-        for query_words in args.query:
-            result = inverted_index.query(query_words)
-            print(",".join(map(str, result)))
+    profiler = StageProfiler(enabled=args.profile or args.profile_dump is not None or args.profile_graphite is not None)
+    code_profiler = cProfile.Profile() if args.profile_dump else None
+    if code_profiler is not None:
+        code_profiler.enable()
+    document_store = None
+    try:
+        if args.command == "build":
+            # Shards are built in memory per worker, the single-index parallel build keeps doc ids only
+            if (args.frequencies or args.positions) and (args.strategy != "varint" or args.memory_limit is not None
+                                                         or (args.workers > 1 and args.shards is None)):
+                build_parser.error("--frequencies and --positions require --strategy varint and an in-memory build, "
+                                   "serial unless --shards is given")
+            if (args.normalize or args.stopwords or args.stemming) and args.strategy != "varint":
+                build_parser.error("--normalize, --stopwords and --stemming require --strategy varint")
+            analyzer = (Analyzer.normalizing if args.normalize else Analyzer)(
+                stopwords=ENGLISH_STOPWORDS if args.stopwords else (), stemming=args.stemming)
+            if args.shards is not None:
+                if args.strategy != "varint" or args.memory_limit is not None:
+                    build_parser.error("--shards requires --strategy varint and an in-memory build")
+                with profiler.stage("build_shards"):
+                    build_sharded_index(args.dataset, args.output, args.shards, partition=args.partition, workers=args.workers,
+                                        frequencies=args.frequencies, positions=args.positions, analyzer=analyzer)
+            elif args.memory_limit is not None:
+                with profiler.stage("build_external"):
+                    build_inverted_index_external(args.dataset, args.output, strategy=args.strategy, memory_limit=args.memory_limit,
+                                                  analyzer=analyzer)
+            else:
+                if args.workers > 1:
+                    with profiler.stage("build_parallel") as record:
+                        inverted_index = build_inverted_index_parallel(args.dataset, args.workers, analyzer=analyzer)
+                        record["items"] = len(inverted_index.index)
+                else:
+                    with profiler.stage("read") as record:
+                        documents = load_documents(args.dataset)
+                        record["items"] = len(documents)
+                    with profiler.stage("index") as record:
+                        inverted_index = build_inverted_index(documents, frequencies=args.frequencies, positions=args.positions,
+                                                              analyzer=analyzer)
+                        record["items"] = len(documents)
+                with profiler.stage("serialize") as record:
+                    inverted_index.dump(args.output, strategy=args.strategy)
+                    record["items"] = len(inverted_index.index)
+            if args.store_documents:
+                with profiler.stage("store_documents") as record:
+                    record["items"] = write_document_store(document_store_path(args.output), iter_documents(args.dataset))
+            print(f"Inverted index built and saved to {args.output}")
+
+        elif args.command == "query":
+            if not args.query and not args.query_file:
+                query_parser.error("one of --query or --query-file is required")
+            if not args.index and not args.shard_url:
+                query_parser.error("one of --index or --shard-url is required")
+            if args.shard_url and (args.rank or args.syntax != "words"):
+                query_parser.error("--shard-url only answers plain word queries")
+            with profiler.stage("load") as record:
+                if args.shard_url:
+                    try:
+                        engine = RemoteShardedIndex(args.shard_url)
+                    except ValueError as error:
+                        query_parser.error(str(error))
+                else:
+                    inverted_index = open_index(args.index, strategy=args.strategy, workers=args.workers)
+                    if isinstance(inverted_index, ShardedIndex):
+                        engine = inverted_index
+                    else:
+                        engine = CachedQueryEngine(inverted_index, postings_cache_size=args.cache_size, result_cache_size=4 * args.cache_size)
+                    record["items"] = _term_count(inverted_index)
+                    if args.rank == "bm25" and args.syntax == "words" and not inverted_index.has_frequencies:
+                        if isinstance(inverted_index, SegmentedIndex):
+                            query_parser.error("--rank bm25 is not supported by segmented indexes; build a varint index or shards with --frequencies")
+                        query_parser.error(f"{args.index} has no term frequencies for --rank bm25; rebuild it with --frequencies (varint only)")
+            options = {"rank": args.rank, "top_k": args.top_k, "operator": args.operator, "syntax": args.syntax}
+            if args.show_snippets:
+                if not args.index or not os.path.exists(document_store_path(args.index)):
+                    query_parser.error("--show-snippets needs an index built with --store-documents")
+                options["documents"] = document_store = DocumentStore(document_store_path(args.index))
+            with profiler.stage("query") as record:
+                for query_words in args.query or []:
+                    try:
+                        print(engine.answer(query_words, **options))
+                    except ValueError as error:
+                        query_parser.error(f"invalid query {' '.join(query_words)!r}: {error}")
+                record["items"] = len(args.query or [])
+                if args.query_file == "-":
+                    record["items"] += engine.run_batch(sys.stdin, sys.stdout, **options)
+                elif args.query_file:
+                    with open(args.query_file, 'r', encoding='utf-8') as file:
+                        record["items"] += engine.run_batch(file, sys.stdout, **options)
+
+        elif args.command == "add":
+            name = add_segment(args.index, load_documents(args.dataset))
+            print(f"Documents added to {args.index} as {name}")
+            if not args.no_merge:
+                merge_segments(args.index, merge_factor=args.merge_factor)
+
+        elif args.command == "merge":
+            merges = merge_segments(args.index, merge_factor=args.merge_factor, force=args.force)
+            print(f"Performed {merges} merge(s) in {args.index}")
+
+        elif args.command == "serve":
+            # Flask is only needed for serving, so the web service is imported on demand
+            from task_Garifulla_Kenessary_inverted_index_web_service import app, setup_index
+            setup_index(args.index, strategy=args.strategy, cache_size=args.cache_size)
+            app.run(host=args.host, port=args.port, threaded=True)
+    finally:
+        if document_store is not None:
+            document_store.close()
+        if code_profiler is not None:
+            code_profiler.disable()
+            code_profiler.dump_stats(args.profile_dump)
+        if profiler.enabled:
+            print(profiler.report(), file=sys.stderr)
+        if args.profile_graphite:
+            with open(args.profile_graphite, 'w', encoding='utf-8') as file:
+                file.writelines(line + "\n" for line in profiler.graphite_lines(f"{GRAPHITE_PREFIX}.{args.command}"))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,89 @@
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+EDGE_PUNCTUATION = re.compile(r"^[\W_]+|[\W_]+$")
+ENGLISH_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or that the this to was were will with".split()
+)
+
+
+def _stem(word: str) -> str:
+    """Light plural stemming (Harman's S-stemmer): ponies -> pony, roses -> rose, cats -> cat."""
+    if len(word) <= 3 or not word.endswith("s"):
+        return word
+    if word.endswith("ies") and not word.endswith(("eies", "aies")):
+        return word[:-3] + "y"
+    if word.endswith("es") and not word.endswith(("aes", "ees", "oes")):
+        return word[:-1]
+    if not word.endswith(("us", "ss")):
+        return word[:-1]
+    return word
+
+
+class Analyzer:
+    """Turns text into index terms, the same way at build and query time.
+
+    Whitespace-separated tokens are optionally Unicode-normalized,
+    lowercased and stripped of leading and trailing punctuation, dropped if
+    they are stopwords and optionally stemmed; tokens left empty are
+    skipped. Normalized tokens are memoized in an LRU cache, since most
+    tokens of a corpus are repeats. The default Analyzer only splits on
+    whitespace, as json and struct indexes do not store a configuration;
+    varint indexes store it so readers analyze queries exactly like the
+    build did.
+    """
+
+    def __init__(self, lowercase: bool = False, strip_punctuation: bool = False, unicode_form: Optional[str] = None,
+                 stopwords: Iterable[str] = (), stemming: bool = False, cache_size: int = 65536):
+        self.lowercase = lowercase
+        self.strip_punctuation = strip_punctuation
+        self.unicode_form = unicode_form
+        self.stopwords = frozenset(stopwords)
+        self.stemming = stemming
+        self.cache_size = cache_size
+        self.normalize = lru_cache(maxsize=cache_size)(self._normalize)
+
+    def to_config(self) -> Dict:
+        """Return the settings that affect the produced terms, as JSON-friendly values."""
+        return {"lowercase": self.lowercase, "strip_punctuation": self.strip_punctuation,
+                "unicode_form": self.unicode_form, "stopwords": sorted(self.stopwords), "stemming": self.stemming}
+
+    @classmethod
+    def from_config(cls, config: Dict) -> "Analyzer":
+        return cls(**config)
+
+    @classmethod
+    def normalizing(cls, **options) -> "Analyzer":
+        """Analyzer that NFKC-normalizes, lowercases and strips edge punctuation, with any other options."""
+        return cls(lowercase=True, strip_punctuation=True, unicode_form="NFKC", **options)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Analyzer) and self.to_config() == other.to_config()
+
+    def __reduce__(self):
+        # the memo is rebuilt instead of being pickled for worker processes
+        return Analyzer.from_config, (self.to_config(),)
+
+    def _normalize(self, token: str) -> str:
+        if self.unicode_form:
+            token = unicodedata.normalize(self.unicode_form, token)
+        if self.lowercase:
+            token = token.lower()
+        if self.strip_punctuation:
+            token = EDGE_PUNCTUATION.sub("", token)
+        if token in self.stopwords:
+            return ""
+        return _stem(token) if self.stemming else token
+
+    def analyze(self, text: str) -> List[str]:
+        """Split text into terms."""
+        normalize = self.normalize
+        return [term for term in map(normalize, text.split()) if term]
+
+    def normalize_pattern(self, pattern: str) -> str:
+        """Normalize a wildcard pattern; punctuation, stopwords and stemming do not apply to it."""
+        if self.unicode_form:
+            pattern = unicodedata.normalize(self.unicode_form, pattern)
+        return pattern.lower() if self.lowercase else pattern
@@ -0,0 +1,235 @@
+import argparse
+import gc
+import importlib.util
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from itertools import accumulate
+from typing import Callable, Dict, List, Optional
+
+from task_Garifulla_Kenessary_inverted_index import (
+    InvertedIndex, MappedInvertedIndex, build_inverted_index, build_inverted_index_external, load_documents,
+)
+
+HW01_LIBRARY = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir,
+    "py4bda_b2c2024q4_Garifulla_Kenessary_HW01", "task_Garifulla_Kenessary_inverted_index_lib.py",
+)
+STRUCT_MAX_DOC_ID = 65535
+
+CONFIGS = {
+    "tiny": {"documents": 500, "vocabulary": 2000, "length": 20, "queries": 50},
+    "laptop": {"documents": 20000, "vocabulary": 50000, "length": 50, "queries": 1000},
+    # Too big for the in-memory stages: built with the external (SPIMI) build only,
+    # once and without a tracemalloc run unless asked for. Takes about 8 minutes,
+    # under 200M of RSS and 310M of disk for the corpus and the index
+    "large": {"documents": 1000000, "vocabulary": 1000000, "length": 50, "queries": 10000,
+              "streaming": True, "memory_limit": 128 * 1024 ** 2, "repeats": 1, "memory": False},
+}
+DEFAULT_REPEATS = 3
+
+
+def generate_corpus(filepath: str, documents: int, vocabulary: int, length: int,
+                    zipf_exponent: float = 1.1, seed: int = 42) -> None:
+    """Write a synthetic dataset with Zipf-distributed words.
+
+    The same arguments always produce the same file. Document lengths vary
+    uniformly between half and one and a half times length.
+    """
+    rng = random.Random(seed)
+    words = [f"w{rank}" for rank in range(vocabulary)]
+    cum_weights = list(accumulate(1.0 / (rank + 1) ** zipf_exponent for rank in range(vocabulary)))
+    with open(filepath, 'w', encoding='utf-8') as file:
+        for doc_id in range(1, documents + 1):
+            size = rng.randint(max(1, length // 2), length + length // 2)
+            file.write(f"{doc_id}\t{' '.join(rng.choices(words, cum_weights=cum_weights, k=size))}\n")
+
+
+def generate_queries(count: int, vocabulary: int, words_per_query: int = 2,
+                     zipf_exponent: float = 1.1, seed: int = 7) -> List[List[str]]:
+    """Draw deterministic queries from the same Zipf distribution as the corpus."""
+    rng = random.Random(seed)
+    words = [f"w{rank}" for rank in range(vocabulary)]
+    cum_weights = list(accumulate(1.0 / (rank + 1) ** zipf_exponent for rank in range(vocabulary)))
+    return [rng.choices(words, cum_weights=cum_weights, k=words_per_query) for _ in range(count)]
+
+
+def _load_array_storage_policy():
+    """Import ArrayStoragePolicy from the HW01 library if it is next to this homework."""
+    if not os.path.exists(HW01_LIBRARY):
+        return None
+    spec = importlib.util.spec_from_file_location("task_Garifulla_Kenessary_inverted_index_lib", HW01_LIBRARY)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.ArrayStoragePolicy
+
+
+def _run_queries(inverted_index, queries: List[List[str]]) -> None:
+    """Answer every query, dropping each result before the next one.
+
+    Frequent Zipfian words match most documents, so keeping all results
+    would grow with queries times documents and swamp the measurement.
+    """
+    for words in queries:
+        inverted_index.query(words)
+
+
+def measure(stage: Callable[[], object], repeats: int = 3, memory: bool = True) -> Dict:
+    """Time a stage (best of repeats) and, optionally, its peak traced allocation.
+
+    Memory is measured in a separate run, so tracemalloc does not slow down
+    the timed runs.
+    """
+    best = None
+    for _ in range(repeats):
+        gc.collect()
+        started = time.perf_counter()
+        stage()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    result = {"seconds": best}
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            stage()
+            result["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def run_benchmark(config: Dict, workdir: str, repeats: Optional[int] = None, memory: Optional[bool] = None) -> Dict:
+    """Run every stage on a generated corpus and return the results document.
+
+    repeats and memory default to the "repeats" and "memory" of the config,
+    then to DEFAULT_REPEATS runs with memory measured.
+    """
+    if repeats is None:
+        repeats = config.get("repeats", DEFAULT_REPEATS)
+    if memory is None:
+        memory = config.get("memory", True)
+    dataset_path = os.path.join(workdir, "dataset.txt")
+    stages = {}
+    stages["generate"] = measure(
+        lambda: generate_corpus(dataset_path, config["documents"], config["vocabulary"], config["length"]),
+        repeats=1, memory=False,
+    )
+    if config.get("streaming"):
+        index_path = os.path.join(workdir, "index.varint")
+        stages["build_external"] = measure(
+            lambda: build_inverted_index_external(dataset_path, index_path, strategy="varint", memory_limit=config["memory_limit"]),
+            repeats, memory,
+        )
+        stages["build_external"]["bytes"] = os.path.getsize(index_path)
+    else:
+        _run_in_memory_stages(dataset_path, workdir, stages, config, repeats, memory)
+
+    queries = generate_queries(config["queries"], config["vocabulary"])
+    with MappedInvertedIndex(os.path.join(workdir, "index.varint")) as mapped_index:
+        stages["query_mapped"] = measure(lambda: _run_queries(mapped_index, queries), repeats, memory)
+        stages["query_mapped"]["items"] = len(queries)
+
+    return {
+        "config": config,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "stages": stages,
+    }
+
+
+def _run_in_memory_stages(dataset_path: str, workdir: str, stages: Dict, config: Dict, repeats: int, memory: bool) -> None:
+    """Measure loading, building, every storage strategy and in-memory queries."""
+    stages["load_documents"] = measure(lambda: load_documents(dataset_path), repeats, memory)
+    documents = load_documents(dataset_path)
+    stages["build"] = measure(lambda: build_inverted_index(documents), repeats, memory)
+    inverted_index = build_inverted_index(documents)
+    del documents
+    stages["build"]["items"] = sum(len(doc_ids) for doc_ids in inverted_index.index.values())
+
+    strategies = ["json", "varint"]
+    if config["documents"] <= STRUCT_MAX_DOC_ID:
+        strategies.append("struct")
+    else:
+        stages["dump_struct"] = stages["load_struct"] = {"skipped": "doc ids do not fit the struct format"}
+    for strategy in strategies:
+        index_path = os.path.join(workdir, f"index.{strategy}")
+        stages[f"dump_{strategy}"] = measure(lambda: inverted_index.dump(index_path, strategy=strategy), repeats, memory)
+        stages[f"dump_{strategy}"]["bytes"] = os.path.getsize(index_path)
+        stages[f"load_{strategy}"] = measure(lambda: InvertedIndex.load(index_path, strategy=strategy), repeats, memory)
+
+    array_storage_policy = _load_array_storage_policy()
+    if array_storage_policy is None:
+        stages["dump_array_policy"] = stages["load_array_policy"] = {"skipped": "HW01 library not found"}
+    else:
+        index_path = os.path.join(workdir, "index.array")
+        stages["dump_array_policy"] = measure(lambda: array_storage_policy.dump(inverted_index.index, index_path), repeats, memory)
+        stages["dump_array_policy"]["bytes"] = os.path.getsize(index_path)
+        stages["load_array_policy"] = measure(lambda: array_storage_policy.load(index_path), repeats, memory)
+
+    queries = generate_queries(config["queries"], config["vocabulary"])
+    stages["query"] = measure(lambda: _run_queries(inverted_index, queries), repeats, memory)
+    stages["query"]["items"] = len(queries)
+
+
+def compare_results(results: Dict, baseline: Dict, tolerance: float = 0.2) -> List[str]:
+    """Return a message for every stage that got slower or hungrier than the baseline allows."""
+    regressions = []
+    for name, stage in results["stages"].items():
+        etalon = baseline.get("stages", {}).get(name)
+        if etalon is None:
+            continue
+        for metric in ("seconds", "peak_bytes", "bytes"):
+            if metric in stage and etalon.get(metric):
+                ratio = stage[metric] / etalon[metric]
+                if ratio > 1 + tolerance:
+                    regressions.append(f"{name}.{metric}: {stage[metric]:.6g} vs baseline {etalon[metric]:.6g} ({ratio:.2f}x)")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Inverted index benchmark on synthetic Zipfian corpora")
+    parser.add_argument("--config", choices=sorted(CONFIGS), default="laptop", help="Corpus size preset (default: laptop); large takes about 8 minutes and 310M of disk")
+    parser.add_argument("--documents", type=int, help="Override the number of documents of the preset")
+    parser.add_argument("--repeats", type=int, help=f"Timed runs per stage, the best one is kept (default: {DEFAULT_REPEATS}, 1 for the large preset)")
+    memory_group = parser.add_mutually_exclusive_group()
+    memory_group.add_argument("--memory", dest="memory", action="store_const", const=True,
+                              help="Measure peak memory with an extra tracemalloc run per stage (default, except for the large preset)")
+    memory_group.add_argument("--no-memory", dest="memory", action="store_const", const=False, help="Skip the tracemalloc runs")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON results")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown before flagging (default: 0.2)")
+    parser.add_argument("--workdir", help="Directory for the generated corpus and index files (default: a temporary one)")
+    args = parser.parse_args(argv)
+
+    config = dict(CONFIGS[args.config], name=args.config)
+    if args.documents:
+        config["documents"] = args.documents
+
+    if args.workdir:
+        os.makedirs(args.workdir, exist_ok=True)
+        results = run_benchmark(config, args.workdir, repeats=args.repeats, memory=args.memory)
+    else:
+        with tempfile.TemporaryDirectory() as workdir:
+            results = run_benchmark(config, workdir, repeats=args.repeats, memory=args.memory)
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2)
+    for name, stage in results["stages"].items():
+        print(f"{name:20s} {json.dumps(stage)}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            regressions = compare_results(results, json.load(file), tolerance=args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+import argparse
+import json
+import os
+import sys
+from itertools import chain
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from task_Garifulla_Kenessary_inverted_index import Analyzer, InvertedIndex
+
+CSR_POSTINGS = "postings.npy"
+CSR_OFFSETS = "offsets.npy"
+CSR_TERMS = "terms.json"
+UINT32_MAX = 2 ** 32 - 1
+
+
+class CSRInvertedIndex:
+    """Inverted index stored as one contiguous postings array in CSR layout.
+
+    The doc ids of the term in row r are postings[offsets[r]:offsets[r + 1]],
+    sorted; terms maps every word to its row. A posting costs 4 bytes (8 for
+    doc ids above 2**32 - 1) instead of a Python int in a list, and loaded
+    arrays are memory-mapped, so opening an index reads only the term list.
+    """
+
+    def __init__(self, terms: Dict[str, int], offsets: np.ndarray, postings: np.ndarray,
+                 analyzer: Optional[Analyzer] = None):
+        self.terms = terms
+        self.offsets = offsets
+        self.postings = postings
+        self.analyzer = analyzer or Analyzer()
+
+    @classmethod
+    def from_index(cls, index: Dict[str, Iterable[int]], analyzer: Optional[Analyzer] = None) -> "CSRInvertedIndex":
+        """Pack a word -> sorted doc ids mapping, rows in sorted word order."""
+        words = sorted(index)
+        lengths = np.fromiter((len(index[word]) for word in words), dtype=np.int64, count=len(words))
+        offsets = np.zeros(len(words) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        postings = np.fromiter(chain.from_iterable(index[word] for word in words), dtype=np.uint64, count=offsets[-1])
+        if not len(postings) or postings.max() <= UINT32_MAX:
+            postings = postings.astype(np.uint32)
+        return cls({word: row for row, word in enumerate(words)}, offsets, postings, analyzer)
+
+    @classmethod
+    def from_inverted_index(cls, inverted_index: InvertedIndex) -> "CSRInvertedIndex":
+        """Pack a loaded InvertedIndex, keeping its analyzer."""
+        return cls.from_index(inverted_index.index, inverted_index.analyzer)
+
+    def dump(self, directory: str) -> None:
+        """Save the index as postings.npy, offsets.npy and terms.json in a directory."""
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, CSR_POSTINGS), self.postings)
+        np.save(os.path.join(directory, CSR_OFFSETS), self.offsets)
+        words = sorted(self.terms, key=self.terms.__getitem__)
+        with open(os.path.join(directory, CSR_TERMS), 'w', encoding='utf-8') as file:
+            json.dump({"terms": words, "analyzer": self.analyzer.to_config()}, file)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "CSRInvertedIndex":
+        """Load an index saved by dump, memory-mapping the arrays unless mmap is False."""
+        mmap_mode = "r" if mmap else None
+        postings = np.load(os.path.join(directory, CSR_POSTINGS), mmap_mode=mmap_mode)
+        offsets = np.load(os.path.join(directory, CSR_OFFSETS), mmap_mode=mmap_mode)
+        with open(os.path.join(directory, CSR_TERMS), 'r', encoding='utf-8') as file:
+            metadata = json.load(file)
+        terms = {word: row for row, word in enumerate(metadata["terms"])}
+        return cls(terms, offsets, postings, Analyzer.from_config(metadata["analyzer"]))
+
+    def postings_of(self, word: str) -> np.ndarray:
+        """Return the sorted doc ids of an analyzed word as an array view, empty if it is unknown."""
+        row = self.terms.get(word)
+        if row is None:
+            return self.postings[:0]
+        return self.postings[self.offsets[row]:self.offsets[row + 1]]
+
+    def query(self, words: List[str]) -> List[int]:
+        """Find documents containing all given words, sorted by doc id."""
+        return self.query_batch([words])[0].tolist()
+
+    def _query_rows(self, queries: List[List[str]]) -> np.ndarray:
+        """Matrix of the rows of the analyzed words of every query, shortest posting list first.
+
+        Rows past the end of a query are -1; a query with no words or an
+        unknown word gets -1 in its first column too, as it matches nothing.
+        """
+        lengths = np.diff(self.offsets)
+        per_query = []
+        for words in queries:
+            rows = {self.terms.get(term) for term in self.analyzer.analyze(" ".join(words))}
+            per_query.append([] if None in rows else sorted(rows, key=lambda row: lengths[row]))
+        matrix = np.full((len(queries), max(map(len, per_query), default=0) or 1), -1, dtype=np.int64)
+        for number, rows in enumerate(per_query):
+            matrix[number, :len(rows)] = rows
+        return matrix
+
+    def _contains(self, rows: np.ndarray, doc_ids: np.ndarray) -> np.ndarray:
+        """Whether doc_ids[i] occurs in the posting list of rows[i], for all i at once.
+
+        Probes are grouped by row and every group is located with one
+        np.searchsorted on the row's slice of postings, so only the rows
+        probed are read from a memory-mapped index and no array is built
+        over all postings.
+        """
+        found = np.zeros(len(rows), dtype=bool)
+        order = np.argsort(rows, kind="stable")
+        unique_rows, starts = np.unique(rows[order], return_index=True)
+        bounds = np.append(starts, len(order)).tolist()
+        for row, start, stop in zip(unique_rows.tolist(), bounds, bounds[1:]):
+            selected = order[start:stop]
+            row_postings = self.postings[self.offsets[row]:self.offsets[row + 1]]
+            probes = doc_ids[selected]
+            positions = np.searchsorted(row_postings, probes)
+            hits = positions < len(row_postings)
+            hits[hits] = row_postings[positions[hits]] == probes[hits]
+            found[selected] = hits
+        return found
+
+    def query_batch(self, queries: List[List[str]]) -> List[np.ndarray]:
+        """Answer many AND queries at once, returning sorted doc id arrays.
+
+        The shortest posting list of every query is gathered into one
+        candidate array tagged with the query number. Then, for the k-th
+        word of all queries together, the candidates are probed with a
+        binary search per distinct CSR row and the misses dropped, so the
+        interpreter loops over words and rows, not over postings.
+        """
+        query_rows = self._query_rows(queries)
+        active = np.flatnonzero(query_rows[:, 0] >= 0)
+        first_rows = query_rows[active, 0]
+        starts = self.offsets[first_rows]
+        counts = self.offsets[first_rows + 1] - starts
+        query_ids = np.repeat(active, counts)
+        positions = np.arange(counts.sum(), dtype=np.int64) + np.repeat(starts - np.cumsum(counts) + counts, counts)
+        candidates = self.postings[positions]
+
+        for k in range(1, query_rows.shape[1]):
+            rows = query_rows[query_ids, k]
+            probe = rows >= 0
+            keep = ~probe
+            keep[probe] = self._contains(rows[probe], candidates[probe])
+            candidates, query_ids = candidates[keep], query_ids[keep]
+
+        bounds = np.searchsorted(query_ids, np.arange(len(queries) + 1))
+        return [candidates[bounds[number]:bounds[number + 1]] for number in range(len(queries))]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="NumPy CSR inverted index for batch analytics")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    convert_parser = subparsers.add_parser("convert", help="Convert an index file to a CSR index directory")
+    convert_parser.add_argument("--index", required=True, help="Path to the inverted index file")
+    convert_parser.add_argument("--strategy", choices=["json", "struct", "varint"], default="struct", help="Storage strategy of the index (default: struct)")
+    convert_parser.add_argument("--output", required=True, help="Directory to save the CSR index to")
+
+    query_parser = subparsers.add_parser("query", help="Answer a batch of AND queries")
+    query_parser.add_argument("--index", required=True, help="Path to the CSR index directory")
+    query_parser.add_argument("--query-file", default="-", help="File with one whitespace-separated query per line, '-' for stdin (default)")
+    query_parser.add_argument("--batch-size", type=int, default=65536, help="Queries answered per vectorized batch (default: 65536)")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "convert":
+        CSRInvertedIndex.from_inverted_index(InvertedIndex.load(args.index, strategy=args.strategy)).dump(args.output)
+        print(f"CSR index saved to {args.output}")
+
+    elif args.command == "query":
+        csr_index = CSRInvertedIndex.load(args.index)
+        file = sys.stdin if args.query_file == "-" else open(args.query_file, 'r', encoding='utf-8')
+        try:
+            batch = []
+            for line in file:
+                batch.append(line.split())
+                if len(batch) == args.batch_size:
+                    _write_answers(csr_index.query_batch(batch))
+                    batch = []
+            _write_answers(csr_index.query_batch(batch))
+        finally:
+            if file is not sys.stdin:
+                file.close()
+    return 0
+
+
+def _write_answers(results: List[np.ndarray]) -> None:
+    sys.stdout.writelines(",".join(map(str, doc_ids.tolist())) + "\n" for doc_ids in results)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
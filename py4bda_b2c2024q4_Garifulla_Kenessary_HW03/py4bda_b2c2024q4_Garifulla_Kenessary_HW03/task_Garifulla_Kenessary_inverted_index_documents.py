@@ -0,0 +1,165 @@
+import mmap
+import os
+import struct
+import zlib
+from array import array
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from task_Garifulla_Kenessary_inverted_index_analyzer import Analyzer
+
+DOCUMENT_STORE_MAGIC = b"IDOC"
+DOCUMENT_STORE_VERSION = 1
+DOCUMENT_STORE_HEADER = struct.Struct("<4sBQQQ")  # magic, version, block table offset, blocks, documents
+DOCUMENT_RECORD = struct.Struct("<QIII")  # doc id, block, offset and length in the uncompressed block
+DOCUMENT_BLOCK_SIZE = 64 * 1024  # uncompressed bytes per zlib block
+DOCUMENT_STORE_NAME = "documents.docs"
+BLOCK_OFFSET = struct.Struct("<Q")  # entry of the block table
+SNIPPET_WORDS = 12
+
+
+def write_document_store(filepath: str, documents: Iterable[Tuple[int, str]],
+                         block_size: int = DOCUMENT_BLOCK_SIZE) -> int:
+    """Write (doc id, content) pairs to a block-compressed document store, return their number.
+
+    Document bodies are concatenated into blocks of about block_size bytes,
+    each compressed with zlib on its own. Layout: header, compressed blocks,
+    the offsets of all blocks plus the end of the last one and a table of
+    fixed-width (doc id, block, offset, length) records sorted by doc id.
+    Documents are streamed, only the record table is kept in memory.
+    """
+    doc_ids, blocks, offsets, lengths = array("Q"), array("I"), array("I"), array("I")
+    block_offsets = []
+    with open(filepath, 'wb') as file:
+        file.write(DOCUMENT_STORE_HEADER.pack(DOCUMENT_STORE_MAGIC, DOCUMENT_STORE_VERSION, 0, 0, 0))
+        block = bytearray()
+        for doc_id, content in documents:
+            body = content.encode("utf-8")
+            if block and len(block) + len(body) > block_size:
+                block_offsets.append(file.tell())
+                file.write(zlib.compress(block))
+                block.clear()
+            doc_ids.append(doc_id)
+            blocks.append(len(block_offsets))
+            offsets.append(len(block))
+            lengths.append(len(body))
+            block += body
+        if block:
+            block_offsets.append(file.tell())
+            file.write(zlib.compress(block))
+        block_table_offset = file.tell()
+        block_offsets.append(block_table_offset)
+        file.write(struct.pack(f"<{len(block_offsets)}Q", *block_offsets))
+        order = range(len(doc_ids))
+        if any(doc_ids[number] >= doc_ids[number + 1] for number in range(len(doc_ids) - 1)):
+            order = sorted(order, key=doc_ids.__getitem__)
+        records = bytearray()
+        for number in order:
+            records += DOCUMENT_RECORD.pack(doc_ids[number], blocks[number], offsets[number], lengths[number])
+        file.write(records)
+        file.seek(0)
+        file.write(DOCUMENT_STORE_HEADER.pack(DOCUMENT_STORE_MAGIC, DOCUMENT_STORE_VERSION, block_table_offset,
+                                              len(block_offsets) - 1, len(doc_ids)))
+    return len(doc_ids)
+
+
+def document_store_path(index_path: str) -> str:
+    """Path of the document store that belongs to an index file or directory."""
+    if os.path.isdir(index_path):
+        return os.path.join(index_path, DOCUMENT_STORE_NAME)
+    return index_path + ".docs"
+
+
+class DocumentStore:
+    """Read-only, memory-mapped document store written by write_document_store.
+
+    A lookup binary searches the record table in place and decompresses
+    only the block holding the document; recently used blocks are cached,
+    so fetching a page of results touches a handful of blocks whatever the
+    size of the corpus.
+    """
+
+    def __init__(self, filepath: str, block_cache_size: int = 16):
+        self._file = open(filepath, 'rb')
+        try:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{filepath} is not a document store")
+        if len(self._data) < DOCUMENT_STORE_HEADER.size or self._data[:len(DOCUMENT_STORE_MAGIC)] != DOCUMENT_STORE_MAGIC:
+            self.close()
+            raise ValueError(f"{filepath} is not a document store")
+        _, version, self._block_table_offset, self._block_count, self._document_count = \
+            DOCUMENT_STORE_HEADER.unpack_from(self._data)
+        if version != DOCUMENT_STORE_VERSION:
+            self.close()
+            raise ValueError(f"Unsupported document store version: {version}")
+        self._records_offset = self._block_table_offset + BLOCK_OFFSET.size * (self._block_count + 1)
+        self._block = lru_cache(maxsize=block_cache_size)(self._decompress_block)
+
+    def close(self) -> None:
+        """Release the memory map and the underlying file."""
+        self._data.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._document_count
+
+    def _record(self, position: int) -> Tuple[int, int, int, int]:
+        return DOCUMENT_RECORD.unpack_from(self._data, self._records_offset + position * DOCUMENT_RECORD.size)
+
+    def _find(self, doc_id: int) -> Optional[Tuple[int, int, int, int]]:
+        low, high = 0, self._document_count
+        while low < high:
+            middle = (low + high) // 2
+            record = self._record(middle)
+            if record[0] < doc_id:
+                low = middle + 1
+            elif record[0] > doc_id:
+                high = middle
+            else:
+                return record
+        return None
+
+    def _decompress_block(self, number: int) -> bytes:
+        start, end = struct.unpack_from("<2Q", self._data, self._block_table_offset + number * BLOCK_OFFSET.size)
+        return zlib.decompress(self._data[start:end])
+
+    def get(self, doc_id: int) -> Optional[str]:
+        """Return the content of a document, or None if it is not stored."""
+        record = self._find(doc_id)
+        if record is None:
+            return None
+        _, block, offset, length = record
+        return self._block(block)[offset:offset + length].decode("utf-8")
+
+    def get_many(self, doc_ids: Iterable[int]) -> Dict[int, str]:
+        """Return the contents of the stored documents among doc_ids, decompressing every block once."""
+        records = sorted((record for record in map(self._find, doc_ids) if record is not None),
+                         key=lambda record: (record[1], record[2]))
+        return {doc_id: self._block(block)[offset:offset + length].decode("utf-8")
+                for doc_id, block, offset, length in records}
+
+
+def make_snippet(text: str, terms: Iterable[str], analyzer: Analyzer, words: int = SNIPPET_WORDS) -> str:
+    """Cut a window of words around the first word of text that analyzes to one of terms."""
+    terms = set(terms)
+    tokens = text.split()
+    hit = next((position for position, token in enumerate(tokens) if analyzer.normalize(token) in terms), 0)
+    start = max(0, hit - words // 3)
+    end = min(len(tokens), start + words)
+    return ("... " if start else "") + " ".join(tokens[start:end]) + (" ..." if end < len(tokens) else "")
+
+
+def _snippet_lines(documents: DocumentStore, doc_ids: List[int], words: List[str], analyzer: Analyzer) -> str:
+    """Render one "doc id<TAB>snippet" line per document, each preceded by a newline."""
+    contents = documents.get_many(doc_ids)
+    terms = analyzer.analyze(" ".join(words))
+    return "".join(f"\n{doc_id}\t{make_snippet(contents[doc_id], terms, analyzer)}" for doc_id in doc_ids
+                   if doc_id in contents)
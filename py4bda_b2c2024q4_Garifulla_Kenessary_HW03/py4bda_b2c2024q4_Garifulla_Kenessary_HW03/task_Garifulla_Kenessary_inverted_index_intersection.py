@@ -0,0 +1,45 @@
+from bisect import bisect_left
+from typing import List
+
+
+def _gallop(doc_ids: List[int], target: int, low: int) -> int:
+    """Find the first position at or after low whose doc id is >= target.
+
+    Probes low, low + 1, low + 3, low + 7, ... and then binary searches the
+    last window, so skipping far ahead in a long list stays logarithmic.
+    """
+    size = len(doc_ids)
+    step = 1
+    high = low
+    while high < size and doc_ids[high] < target:
+        low = high + 1
+        high += step
+        step *= 2
+    return bisect_left(doc_ids, target, low, min(high, size))
+
+
+def _intersect_pair(smaller: List[int], larger: List[int]) -> List[int]:
+    """Intersect two sorted lists by galloping through the larger one."""
+    result = []
+    position = 0
+    size = len(larger)
+    for doc_id in smaller:
+        position = _gallop(larger, doc_id, position)
+        if position == size:
+            break
+        if larger[position] == doc_id:
+            result.append(doc_id)
+    return result
+
+
+def intersect_postings(postings: List[List[int]]) -> List[int]:
+    """Intersect sorted posting lists, starting from the shortest one."""
+    if not postings:
+        return []
+    ordered = sorted(postings, key=len)
+    result = list(ordered[0])
+    for doc_ids in ordered[1:]:
+        if not result:
+            break
+        result = _intersect_pair(result, doc_ids)
+    return result
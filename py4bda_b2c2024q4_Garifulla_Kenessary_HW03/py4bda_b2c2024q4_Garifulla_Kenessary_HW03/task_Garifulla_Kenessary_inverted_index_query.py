@@ -0,0 +1,305 @@
+import re
+import sys
+from functools import lru_cache
+from typing import TYPE_CHECKING, Iterable, List, Optional, TextIO, Tuple, Union
+
+from task_Garifulla_Kenessary_inverted_index import WILDCARD, InvertedIndex, MappedInvertedIndex, _merge_union
+from task_Garifulla_Kenessary_inverted_index_analyzer import Analyzer
+from task_Garifulla_Kenessary_inverted_index_documents import DocumentStore, _snippet_lines
+from task_Garifulla_Kenessary_inverted_index_intersection import _intersect_pair, intersect_postings
+
+if TYPE_CHECKING:
+    from task_Garifulla_Kenessary_inverted_index_segments import SegmentedIndex
+
+QUERY_TOKEN = re.compile(r'"([^"]*)"|(\()|(\))|([^\s()"]+)')
+
+
+def parse_query(text: str) -> Tuple:
+    """Parse a query expression into a tree of tuples.
+
+    Grammar: words are ANDed implicitly, "quoted words" form a phrase and
+    the upper-case operators AND, OR, NOT and parentheses combine them,
+    with NOT binding tighter than AND and AND tighter than OR. A word with
+    * or ? (e.g. learn*) matches any word fitting the pattern. Nodes are
+    ("term", word), ("wildcard", pattern), ("phrase", words), ("not", node),
+    ("and", nodes) and ("or", nodes).
+    """
+    tokens = []
+    for phrase, opening, closing, word in QUERY_TOKEN.findall(text):
+        if opening or closing:
+            tokens.append((opening or closing, None))
+        elif word in ("AND", "OR", "NOT"):
+            tokens.append((word, None))
+        elif word:
+            tokens.append(("term", word))
+        else:
+            tokens.append(("phrase", phrase.split()))
+    position = 0
+
+    def peek() -> Optional[str]:
+        return tokens[position][0] if position < len(tokens) else None
+
+    def parse_or() -> Tuple:
+        nonlocal position
+        children = [parse_and()]
+        while peek() == "OR":
+            position += 1
+            children.append(parse_and())
+        return children[0] if len(children) == 1 else ("or", children)
+
+    def parse_and() -> Tuple:
+        nonlocal position
+        children = [parse_unary()]
+        while peek() not in (None, "OR", ")"):
+            if peek() == "AND":
+                position += 1
+            children.append(parse_unary())
+        return children[0] if len(children) == 1 else ("and", children)
+
+    def parse_unary() -> Tuple:
+        nonlocal position
+        kind = peek()
+        if kind is None:
+            raise ValueError(f"Unexpected end of query: {text!r}")
+        if kind == "NOT":
+            position += 1
+            return ("not", parse_unary())
+        if kind == "(":
+            position += 1
+            node = parse_or()
+            if peek() != ")":
+                raise ValueError(f"Missing closing parenthesis in query: {text!r}")
+            position += 1
+            return node
+        if kind in ("term", "phrase"):
+            value = tokens[position][1]
+            position += 1
+            if kind == "phrase" and not value:
+                raise ValueError(f"Empty phrase in query: {text!r}")
+            if kind == "phrase" and len(value) == 1:
+                return ("term", value[0])
+            if kind == "term" and WILDCARD.search(value):
+                return ("wildcard", value)
+            return (kind, value)
+        raise ValueError(f"Unexpected {kind!r} in query: {text!r}")
+
+    node = parse_or()
+    if position != len(tokens):
+        raise ValueError(f"Unexpected {peek()!r} in query: {text!r}")
+    return node
+
+
+def _estimate_cost(inverted_index, node: Tuple) -> int:
+    """Upper bound on the number of documents a query node can match."""
+    kind = node[0]
+    if kind == "term":
+        return inverted_index.document_frequency(node[1])
+    if kind == "phrase":
+        return min(inverted_index.document_frequency(word) for word in node[1])
+    if kind == "wildcard":
+        return sum(inverted_index.document_frequency(word) for word in inverted_index.expand_terms(node[1]))
+    if kind == "and":
+        costs = [_estimate_cost(inverted_index, child) for child in node[1] if child[0] != "not"]
+        return min(costs) if costs else 0
+    if kind == "or":
+        return sum(_estimate_cost(inverted_index, child) for child in node[1])
+    return 0
+
+
+def _evaluate_phrase(inverted_index, words: List[str], candidates: Optional[List[int]]) -> List[int]:
+    """Match a phrase, reading positions only for documents still in the running.
+
+    Documents must first contain every word. Then the words are visited
+    rarest first and each document keeps the set of phrase start positions
+    consistent with the words seen so far; a document is dropped as soon
+    as that set is empty, so later words never read its positions.
+    """
+    postings = [inverted_index.postings(word) for word in set(words)]
+    if candidates is not None:
+        postings.append(candidates)
+    doc_ids = intersect_postings(postings)
+    starts = {}
+    for offset, word in sorted(enumerate(words), key=lambda item: inverted_index.document_frequency(item[1])):
+        if not doc_ids:
+            break
+        word_positions = inverted_index.positions(word, doc_ids)
+        survivors = []
+        for doc_id in doc_ids:
+            shifted = {position - offset for position in word_positions.get(doc_id, ())}
+            if doc_id in starts:
+                shifted &= starts[doc_id]
+            if shifted:
+                starts[doc_id] = shifted
+                survivors.append(doc_id)
+        doc_ids = survivors
+    return doc_ids
+
+
+def _evaluate(inverted_index, node: Tuple, candidates: Optional[List[int]] = None) -> List[int]:
+    """Evaluate a query node, optionally restricted to sorted candidate doc ids."""
+    kind = node[0]
+    if kind == "term":
+        doc_ids = inverted_index.postings(node[1])
+        return doc_ids if candidates is None else _intersect_pair(candidates, doc_ids)
+    if kind == "wildcard":
+        doc_ids = inverted_index.wildcard_postings(node[1])
+        return doc_ids if candidates is None else _intersect_pair(candidates, doc_ids)
+    if kind == "phrase":
+        return _evaluate_phrase(inverted_index, node[1], candidates)
+    if kind == "or":
+        return _merge_union([_evaluate(inverted_index, child, candidates) for child in node[1]])
+    if kind == "not":
+        raise ValueError("NOT must be combined with at least one positive term")
+    positive = sorted((child for child in node[1] if child[0] != "not"),
+                      key=lambda child: _estimate_cost(inverted_index, child))
+    negative = [child[1] for child in node[1] if child[0] == "not"]
+    if not positive:
+        raise ValueError("NOT must be combined with at least one positive term")
+    result = candidates
+    for child in positive:
+        result = _evaluate(inverted_index, child, result)
+        if not result:
+            return []
+    for child in negative:
+        excluded = set(_evaluate(inverted_index, child, result))
+        result = [doc_id for doc_id in result if doc_id not in excluded]
+        if not result:
+            return []
+    return list(result)
+
+
+def _analyze_node(analyzer: Analyzer, node: Tuple) -> Optional[Tuple]:
+    """Turn the words of a query node into index terms, dropping what analyzes to nothing."""
+    kind = node[0]
+    if kind == "term":
+        term = analyzer.normalize(node[1])
+        return ("term", term) if term else None
+    if kind == "wildcard":
+        return ("wildcard", analyzer.normalize_pattern(node[1]))
+    if kind == "phrase":
+        terms = analyzer.analyze(" ".join(node[1]))
+        if len(terms) <= 1:
+            return ("term", terms[0]) if terms else None
+        return ("phrase", terms)
+    if kind == "not":
+        child = _analyze_node(analyzer, node[1])
+        return None if child is None else ("not", child)
+    children = [child for child in (_analyze_node(analyzer, child) for child in node[1]) if child is not None]
+    if len(children) <= 1:
+        return children[0] if children else None
+    return (kind, children)
+
+
+def _check_negations(node: Tuple) -> None:
+    """Raise ValueError where a NOT is not combined with a positive operand of the same AND."""
+    kind = node[0]
+    if kind == "not":
+        raise ValueError("NOT must be combined with at least one positive term")
+    if kind == "or":
+        for child in node[1]:
+            _check_negations(child)
+    elif kind == "and":
+        if all(child[0] == "not" for child in node[1]):
+            raise ValueError("NOT must be combined with at least one positive term")
+        for child in node[1]:
+            _check_negations(child[1] if child[0] == "not" else child)
+
+
+def compile_query(analyzer: Analyzer, text: str) -> Optional[Tuple]:
+    """Parse and analyze a query expression, None if it analyzes to nothing.
+
+    Raises ValueError for malformed expressions, so they can be rejected
+    before any posting list is read.
+    """
+    node = _analyze_node(analyzer, parse_query(text))
+    if node is not None:
+        _check_negations(node)
+    return node
+
+
+def search(inverted_index, text: str) -> List[int]:
+    """Evaluate a query expression (see parse_query), return sorted doc ids.
+
+    Query words go through the analyzer of the index first. AND nodes
+    evaluate their cheapest operands first, each restricted to the
+    documents that survived so far, so phrase positions are only read for
+    documents that already match everything else.
+    """
+    return _search_node(inverted_index, compile_query(inverted_index.analyzer, text))
+
+
+def _search_node(inverted_index, node: Optional[Tuple]) -> List[int]:
+    return [] if node is None else list(_evaluate(inverted_index, node))
+
+
+class CachedQueryEngine:
+    """Answer AND queries against an index, memoizing postings and results.
+
+    Decoded posting lists are kept in one LRU cache and full results in
+    another, keyed on the set of query words, so repeated and overlapping
+    queries skip both decoding and intersection. Returned lists are shared
+    with the cache and must not be modified.
+    """
+
+    def __init__(self, inverted_index: Union[InvertedIndex, MappedInvertedIndex, "SegmentedIndex"],
+                 postings_cache_size: int = 1024, result_cache_size: int = 4096):
+        self.inverted_index = inverted_index
+        self.postings = lru_cache(maxsize=postings_cache_size)(inverted_index.postings)
+        self._results = lru_cache(maxsize=result_cache_size)(self._query_word_set)
+
+    def _query_word_set(self, words: frozenset) -> List[int]:
+        if not words:
+            return []
+        postings = []
+        for word in words:
+            doc_ids = self.postings(word)
+            if not doc_ids:
+                return []
+            postings.append(doc_ids)
+        return intersect_postings(postings)
+
+    def query(self, words: List[str]) -> List[int]:
+        """Find documents containing all given words, sorted by doc id."""
+        return self._results(frozenset(self.inverted_index.analyzer.analyze(" ".join(words))))
+
+    def answer(self, words: List[str], rank: Optional[str] = None, top_k: int = 10, operator: str = "or",
+               syntax: str = "words", documents: Optional["DocumentStore"] = None) -> str:
+        """Answer a query as one output line: doc ids, or doc:score pairs when ranked.
+
+        With a document store, a "doc id<TAB>snippet" line follows for each
+        of the first top_k results.
+        """
+        if syntax == "expression":
+            doc_ids = search(self.inverted_index, " ".join(words))
+            line = ",".join(map(str, doc_ids))
+        elif rank == "bm25":
+            ranked = self.inverted_index.query_ranked(words, top_k=top_k, operator=operator)
+            doc_ids = [doc_id for doc_id, _ in ranked]
+            line = ",".join(f"{doc_id}:{score:.4f}" for doc_id, score in ranked)
+        else:
+            doc_ids = self.query(words)
+            line = ",".join(map(str, doc_ids))
+        if documents is not None:
+            line += _snippet_lines(documents, doc_ids[:top_k], words, self.inverted_index.analyzer)
+        return line
+
+    def run_batch(self, queries: Iterable[str], output: TextIO, **options) -> int:
+        """Answer whitespace-separated queries line by line, return their number.
+
+        A malformed query is answered with an empty line and reported on
+        stderr; the rest of the batch is still answered.
+        """
+        count = 0
+        for line in queries:
+            count += 1
+            try:
+                answer = self.answer(line.split(), **options)
+            except ValueError as error:
+                _report_query_error(count, error)
+                answer = ""
+            output.write(answer + "\n")
+        return count
+
+
+def _report_query_error(number: int, error: ValueError) -> None:
+    print(f"Query {number}: {error}", file=sys.stderr)
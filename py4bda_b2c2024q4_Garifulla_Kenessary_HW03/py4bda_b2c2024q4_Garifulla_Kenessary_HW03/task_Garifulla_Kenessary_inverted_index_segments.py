@@ -0,0 +1,159 @@
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+from task_Garifulla_Kenessary_inverted_index import (
+    MappedInvertedIndex, _merge_sorted_postings, _merge_union, build_inverted_index, write_varint_index,
+)
+from task_Garifulla_Kenessary_inverted_index_analyzer import Analyzer
+
+MANIFEST_NAME = "manifest.json"
+
+
+def _read_manifest(directory: str) -> Dict:
+    """Read the segment manifest of a segmented index directory."""
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return {"segments": [], "next_segment": 0}
+    with open(manifest_path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def _write_manifest(directory: str, manifest: Dict) -> None:
+    """Atomically replace the segment manifest."""
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    with open(manifest_path + ".tmp", 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+
+def _new_segment_name(manifest: Dict) -> str:
+    name = f"segment-{manifest['next_segment']:06d}.idx"
+    manifest["next_segment"] += 1
+    return name
+
+
+class SegmentedIndex:
+    """Index stored as a directory of immutable varint segments.
+
+    Every segment is opened with MappedInvertedIndex; queries are answered
+    per segment and the sorted results are unioned. All segments share the
+    analyzer recorded in the manifest.
+    """
+
+    has_frequencies = False
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.manifest = _read_manifest(directory)
+        self.analyzer = Analyzer.from_config(self.manifest["analyzer"]) if "analyzer" in self.manifest else Analyzer()
+        self.segments = [MappedInvertedIndex(os.path.join(directory, segment["name"]))
+                         for segment in self.manifest["segments"]]
+
+    def close(self) -> None:
+        """Close all segment files."""
+        for segment in self.segments:
+            segment.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def postings(self, word: str) -> List[int]:
+        """Return the sorted doc ids of the word across all segments."""
+        return _merge_union([segment.postings(word) for segment in self.segments] or [[]])
+
+    def query(self, words: List[str]) -> List[int]:
+        """Find documents containing all given words, sorted by doc id."""
+        return _merge_union([segment.query(words) for segment in self.segments] or [[]])
+
+    def expand_terms(self, pattern: str) -> List[str]:
+        """Return the words matching a wildcard pattern in any segment."""
+        return sorted(set().union(*(segment.expand_terms(pattern) for segment in self.segments)),
+                      key=lambda word: word.encode("utf-8"))
+
+    def wildcard_postings(self, pattern: str) -> List[int]:
+        """Return the sorted union of the doc ids of all words matching the pattern."""
+        return _merge_union([segment.wildcard_postings(pattern) for segment in self.segments] or [[]])
+
+    def document_frequency(self, word: str) -> int:
+        """Number of documents containing the word across all segments."""
+        return sum(segment.document_frequency(word) for segment in self.segments)
+
+    def positions(self, word: str, doc_ids: List[int]) -> Dict[int, List[int]]:
+        """Return token positions of the word in the given sorted doc ids."""
+        result = {}
+        for segment in self.segments:
+            result.update(segment.positions(word, doc_ids))
+        return result
+
+    def query_ranked(self, words: List[str], top_k: int = 10, operator: str = "or") -> List[Tuple[int, float]]:
+        raise ValueError("Segmented indexes do not store term frequencies")
+
+
+def add_segment(directory: str, documents: Dict[int, str], analyzer: Optional[Analyzer] = None) -> str:
+    """Index the documents into a new segment of the directory, return its name.
+
+    The analyzer is fixed by the first segment and recorded in the manifest;
+    later segments must use the same one.
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest = _read_manifest(directory)
+    if "analyzer" not in manifest:
+        manifest["analyzer"] = (analyzer or Analyzer()).to_config()
+    elif analyzer is not None and analyzer.to_config() != manifest["analyzer"]:
+        raise ValueError(f"{directory} was built with a different analyzer")
+    name = _new_segment_name(manifest)
+    segment_index = build_inverted_index(documents, analyzer=Analyzer.from_config(manifest["analyzer"]))
+    segment_index.dump(os.path.join(directory, name), strategy="varint")
+    manifest["segments"].append({"name": name, "documents": len(documents)})
+    _write_manifest(directory, manifest)
+    return name
+
+
+def _segment_tier(documents: int, merge_factor: int) -> int:
+    """Tier of a segment: segments within a factor of merge_factor in size share one."""
+    tier = 0
+    while documents >= merge_factor:
+        documents //= merge_factor
+        tier += 1
+    return tier
+
+
+def merge_segments(directory: str, merge_factor: int = 10, force: bool = False) -> int:
+    """Compact segments with a tiered merge policy, return the number of merges.
+
+    Whenever merge_factor segments share a tier, merge_factor of them are
+    merged into a single segment of a higher tier, which may cascade. With
+    force every segment is merged into one.
+    """
+    manifest = _read_manifest(directory)
+    merges = 0
+    while True:
+        segments = manifest["segments"]
+        if force:
+            candidates = segments if len(segments) > 1 else []
+        else:
+            tiers = {}
+            for segment in segments:
+                tiers.setdefault(_segment_tier(segment["documents"], merge_factor), []).append(segment)
+            candidates = next((tier_segments[:merge_factor] for _, tier_segments in sorted(tiers.items())
+                               if len(tier_segments) >= merge_factor), [])
+        if not candidates:
+            return merges
+        name = _new_segment_name(manifest)
+        readers = [MappedInvertedIndex(os.path.join(directory, segment["name"])) for segment in candidates]
+        try:
+            streams = [((word.encode("utf-8"), doc_ids) for word, doc_ids in reader.items()) for reader in readers]
+            write_varint_index(os.path.join(directory, name), _merge_sorted_postings(streams), analyzer=readers[0].analyzer)
+        finally:
+            for reader in readers:
+                reader.close()
+        merged = {"name": name, "documents": sum(segment["documents"] for segment in candidates)}
+        manifest["segments"] = [segment for segment in segments if segment not in candidates] + [merged]
+        _write_manifest(directory, manifest)
+        for segment in candidates:
+            os.remove(os.path.join(directory, segment["name"]))
+        merges += 1
@@ -0,0 +1,301 @@
+import heapq
+import json
+import os
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
+from multiprocessing import Pool
+from typing import Dict, Iterable, List, Optional, TextIO, Tuple, Union
+
+from task_Garifulla_Kenessary_inverted_index import (
+    MappedInvertedIndex, _merge_union, build_inverted_index, load_documents, rank_bm25,
+)
+from task_Garifulla_Kenessary_inverted_index_analyzer import Analyzer
+from task_Garifulla_Kenessary_inverted_index_documents import DocumentStore, _snippet_lines
+from task_Garifulla_Kenessary_inverted_index_query import _report_query_error, _search_node, compile_query
+from task_Garifulla_Kenessary_inverted_index_segments import _read_manifest, _write_manifest
+
+BATCH_SIZE = 1024  # queries scattered to the shards at once by run_batch
+
+
+def _build_shard_file(task: Tuple[Dict[int, str], str, bool, bool, Optional[Analyzer]]) -> Optional[int]:
+    """Index the documents of one shard into a varint file, return their total length if stored."""
+    documents, path, frequencies, positions, analyzer = task
+    inverted_index = build_inverted_index(documents, frequencies=frequencies, positions=positions, analyzer=analyzer)
+    inverted_index.dump(path, strategy="varint")
+    return sum(inverted_index.doc_lengths.values()) if frequencies or positions else None
+
+
+def build_sharded_index(filepath: str, directory: str, shard_count: int, partition: str = "hash", workers: int = 1,
+                        frequencies: bool = False, positions: bool = False, analyzer: Optional[Analyzer] = None) -> Dict:
+    """Split the dataset by doc id into shard_count varint shards plus a manifest, return the manifest.
+
+    partition "hash" sends a document to shard doc_id % shard_count, "range"
+    gives every shard one contiguous run of doc ids of about the same size.
+    Shards are built by a pool of workers processes.
+    """
+    if partition not in ("hash", "range"):
+        raise ValueError(f"Unknown partition scheme: {partition}")
+    documents = load_documents(filepath)
+    shard_documents = [{} for _ in range(shard_count)]
+    for rank, doc_id in enumerate(sorted(documents)):
+        shard = doc_id % shard_count if partition == "hash" else rank * shard_count // len(documents)
+        shard_documents[shard][doc_id] = documents[doc_id]
+    del documents
+
+    os.makedirs(directory, exist_ok=True)
+    names = [f"shard-{number:04d}.idx" for number in range(shard_count)]
+    tasks = [(shard, os.path.join(directory, name), frequencies, positions, analyzer)
+             for shard, name in zip(shard_documents, names)]
+    if workers > 1:
+        with Pool(workers) as pool:
+            lengths = pool.map(_build_shard_file, tasks, chunksize=1)
+    else:
+        lengths = [_build_shard_file(task) for task in tasks]
+
+    manifest = {"partition": partition, "analyzer": (analyzer or Analyzer()).to_config(), "shards": []}
+    for name, shard, length in zip(names, shard_documents, lengths):
+        entry = {"name": name, "documents": len(shard), "first": min(shard, default=None), "last": max(shard, default=None)}
+        if length is not None:
+            entry["length"] = length
+        manifest["shards"].append(entry)
+    _write_manifest(directory, manifest)
+    return manifest
+
+
+# Shard readers opened by a worker process, reused by all its scatter tasks
+_shard_readers = {}
+
+
+def _answer_shard(reader: MappedInvertedIndex, kind: str, queries: List, options: Dict) -> List:
+    """Answer a batch of queries against one shard."""
+    if kind == "search":
+        return [_search_node(reader, node) for node in queries]
+    if kind == "rank":
+        doc_lengths = reader.doc_lengths if reader.has_frequencies else {}
+        return [rank_bm25([reader.postings_with_frequencies(term) for term in terms], doc_lengths,
+                          top_k=options["top_k"], operator=options["operator"],
+                          document_count=options["document_count"], average_length=options["average_length"],
+                          document_frequencies=document_frequencies)
+                for terms, document_frequencies in queries]
+    return [reader.query(words) for words in queries]
+
+
+def _scatter_task(task: Tuple[str, str, List, Dict]) -> List:
+    path, kind, queries, options = task
+    reader = _shard_readers.get(path)
+    if reader is None:
+        reader = _shard_readers[path] = MappedInvertedIndex(path)
+    return _answer_shard(reader, kind, queries, options)
+
+
+class ShardedIndex:
+    """Index partitioned by doc id into varint shards, queried scatter-gather.
+
+    Every batch of queries is sent to all shards at once, one task per shard
+    in a pool of worker processes that keep their shards open, and the
+    per-shard answers are merged: doc id lists by union (concatenation for
+    range partitioning), ranked lists by score. Ranked queries are scored
+    with collection-wide statistics so the scores match an unsharded index.
+    With workers=1 the shards are queried in the calling process.
+    """
+
+    def __init__(self, directory: str, workers: Optional[int] = None):
+        self.directory = directory
+        self.manifest = _read_manifest(directory)
+        self.partition = self.manifest["partition"]
+        self.analyzer = Analyzer.from_config(self.manifest["analyzer"])
+        self.paths = [os.path.join(directory, shard["name"]) for shard in self.manifest["shards"]]
+        self.readers = [MappedInvertedIndex(path) for path in self.paths]
+        self.has_frequencies = all("length" in shard for shard in self.manifest["shards"])
+        if workers is None:
+            workers = min(len(self.paths), os.cpu_count() or 1)
+        self._pool = Pool(workers) if workers > 1 else None
+
+    def close(self) -> None:
+        """Stop the worker processes and close the shard files."""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+        for reader in self.readers:
+            reader.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _scatter(self, kind: str, queries: List, options: Dict) -> List[List]:
+        """Answer the queries on every shard, return the answers of each shard."""
+        if self._pool is None:
+            return [_answer_shard(reader, kind, queries, options) for reader in self.readers]
+        return self._pool.map(_scatter_task, [(path, kind, queries, options) for path in self.paths], chunksize=1)
+
+    def _ranked_batch(self, queries: List[List[str]], top_k: int, operator: str) -> List[List[Tuple[int, float]]]:
+        shards = self.manifest["shards"]
+        if not self.has_frequencies:
+            raise ValueError("The index was built without term frequencies")
+        document_count = sum(shard["documents"] for shard in shards)
+        options = {"top_k": top_k, "operator": operator, "document_count": document_count,
+                   "average_length": sum(shard["length"] for shard in shards) / document_count or 1.0}
+        term_queries = []
+        for words in queries:
+            terms = sorted(set(self.analyzer.analyze(" ".join(words))))
+            term_queries.append((terms, [sum(reader.document_frequency(term) for reader in self.readers) for term in terms]))
+        answers = self._scatter("rank", term_queries, options)
+        return [heapq.nlargest(top_k, chain.from_iterable(ranked), key=lambda pair: (pair[1], -pair[0]))
+                for ranked in zip(*answers)]
+
+    def query_batch(self, queries: List, rank: Optional[str] = None, top_k: int = 10, operator: str = "or",
+                    syntax: str = "words") -> List[List]:
+        """Answer many queries with one scatter-gather round.
+
+        Queries are word lists, or expression strings with syntax
+        "expression"; ranked answers are (doc id, score) lists.
+        """
+        if syntax == "expression":
+            return self._search_batch([compile_query(self.analyzer, text) for text in queries])
+        if rank == "bm25":
+            return self._ranked_batch(queries, top_k, operator)
+        return self._gather(self._scatter("query", queries, {}))
+
+    def _search_batch(self, nodes: List[Optional[Tuple]]) -> List[List[int]]:
+        """Evaluate compiled query expressions (see compile_query) on all shards."""
+        return self._gather(self._scatter("search", nodes, {}))
+
+    def _gather(self, answers: List[List]) -> List[List[int]]:
+        """Merge the doc id lists answered by every shard into one list per query."""
+        if self.partition == "range":
+            return [list(chain.from_iterable(doc_ids)) for doc_ids in zip(*answers)]
+        return [_merge_union(list(doc_ids)) for doc_ids in zip(*answers)]
+
+    def query(self, words: List[str]) -> List[int]:
+        """Find documents containing all given words, sorted by doc id."""
+        return self.query_batch([words])[0]
+
+    def query_ranked(self, words: List[str], top_k: int = 10, operator: str = "or") -> List[Tuple[int, float]]:
+        """Return the top_k (doc id, BM25 score) pairs for the words."""
+        return self._ranked_batch([words], top_k, operator)[0]
+
+    def answer(self, words: List[str], rank: Optional[str] = None, top_k: int = 10, operator: str = "or",
+               syntax: str = "words", documents: Optional[DocumentStore] = None) -> str:
+        """Answer a query as one output line, followed by snippet lines with a document store."""
+        line = self._format_batch([words], rank, top_k, operator, syntax, documents)[0]
+        if isinstance(line, ValueError):
+            raise line
+        return line
+
+    def _format_batch(self, batch: List[List[str]], rank: Optional[str] = None, top_k: int = 10, operator: str = "or",
+                      syntax: str = "words", documents: Optional[DocumentStore] = None) -> List[Union[str, ValueError]]:
+        """Answer lines of a batch; a malformed expression gets its ValueError in place of a line."""
+        errors = {}
+        if syntax == "expression":
+            nodes = []
+            for number, words in enumerate(batch):
+                try:
+                    nodes.append(compile_query(self.analyzer, " ".join(words)))
+                except ValueError as error:
+                    errors[number] = error
+                    nodes.append(None)
+            results = self._search_batch(nodes)
+        else:
+            results = self.query_batch(batch, rank=rank, top_k=top_k, operator=operator)
+        if rank == "bm25" and syntax != "expression":
+            lines = [",".join(f"{doc_id}:{score:.4f}" for doc_id, score in ranked) for ranked in results]
+            results = [[doc_id for doc_id, _ in ranked] for ranked in results]
+        else:
+            lines = [",".join(map(str, doc_ids)) for doc_ids in results]
+        if documents is not None:
+            lines = [line + _snippet_lines(documents, doc_ids[:top_k], words, self.analyzer)
+                     for line, doc_ids, words in zip(lines, results, batch)]
+        return [errors.get(number, line) for number, line in enumerate(lines)]
+
+    def run_batch(self, queries: Iterable[str], output: TextIO, **options) -> int:
+        """Answer whitespace-separated queries line by line, BATCH_SIZE lines per scatter; return their number.
+
+        A malformed query is answered with an empty line and reported on
+        stderr; the rest of the batch is still answered.
+        """
+        count = 0
+        lines = iter(queries)
+        while True:
+            batch = [line.split() for line in islice(lines, BATCH_SIZE)]
+            if not batch:
+                return count
+            for answer in self._format_batch(batch, **options):
+                count += 1
+                if isinstance(answer, ValueError):
+                    _report_query_error(count, answer)
+                    answer = ""
+                output.write(answer + "\n")
+
+
+def shard_metadata(filepath: str, inverted_index) -> Dict:
+    """Describe an index served from filepath for RemoteShardedIndex.
+
+    Holds the analyzer config and, when the file is listed in the manifest
+    of a sharded index directory, the partition scheme, the shard number
+    and the number of shards.
+    """
+    metadata = {"analyzer": inverted_index.analyzer.to_config()}
+    manifest = _read_manifest(os.path.dirname(os.path.abspath(filepath)))
+    names = [shard["name"] for shard in manifest.get("shards", [])]
+    if os.path.basename(filepath) in names:
+        metadata.update(partition=manifest["partition"], shard=names.index(os.path.basename(filepath)), shards=len(names))
+    return metadata
+
+
+class RemoteShardedIndex(ShardedIndex):
+    """Sharded index whose shards are served by separate serve processes.
+
+    The analyzer and partitioning are read from the /api/index endpoint of
+    every server (see shard_metadata); servers that disagree, or a shard
+    missing or given twice, raise ValueError. Batches are posted to the
+    /api/query/batch endpoint of every server concurrently, in shard order.
+    The servers answer plain AND queries only.
+    """
+
+    def __init__(self, urls: List[str], timeout: float = 60.0):
+        self.urls = [url.rstrip("/") for url in urls]
+        self.timeout = timeout
+        with ThreadPoolExecutor(len(self.urls)) as executor:
+            metadata = list(executor.map(self._get_metadata, self.urls))
+        analyzers = [Analyzer.from_config(server["analyzer"]) for server in metadata]
+        if any(analyzer != analyzers[0] for analyzer in analyzers):
+            raise ValueError("The shard servers use different analyzers")
+        self.analyzer = analyzers[0]
+        partitions = {server.get("partition") for server in metadata}
+        if len(partitions) > 1:
+            raise ValueError("The shard servers do not belong to the same sharded index")
+        # Standalone indexes are merged by union like hash shards
+        self.partition = partitions.pop() or "hash"
+        if "shard" in metadata[0]:
+            shards = [server["shard"] for server in metadata]
+            if sorted(shards) != list(range(metadata[0]["shards"])):
+                raise ValueError(f"Expected one server for each of the {metadata[0]['shards']} shards, got shards {sorted(shards)}")
+            self.urls = [url for _, url in sorted(zip(shards, self.urls))]
+        self.has_frequencies = False
+
+    def close(self) -> None:
+        pass
+
+    def _get_metadata(self, url: str) -> Dict:
+        with urllib.request.urlopen(url + "/api/index", timeout=self.timeout) as response:
+            return json.load(response)
+
+    def _post(self, url: str, queries: List[List[str]]) -> List[List[int]]:
+        request = urllib.request.Request(url + "/api/query/batch", data=json.dumps({"queries": queries}).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.load(response)["results"]
+
+    def _scatter(self, kind: str, queries: List, options: Dict) -> List[List]:
+        if kind != "query":
+            raise ValueError("Remote shards only answer plain word queries")
+        with ThreadPoolExecutor(len(self.urls)) as executor:
+            return list(executor.map(lambda url: self._post(url, queries), self.urls))
+
+    def _ranked_batch(self, queries: List[List[str]], top_k: int, operator: str) -> List[List[Tuple[int, float]]]:
+        raise ValueError("Remote shards only answer plain word queries")
@@ -0,0 +1,63 @@
+from flask import Flask, request, jsonify
+
+from task_Garifulla_Kenessary_inverted_index import open_index
+from task_Garifulla_Kenessary_inverted_index_query import CachedQueryEngine
+from task_Garifulla_Kenessary_inverted_index_shards import ShardedIndex, shard_metadata
+
+app = Flask(__name__)
+
+# Query engine over the index, loaded once per process by setup_index
+app.engine = None
+# Analyzer and shard of the index for RemoteShardedIndex, see shard_metadata
+app.metadata = None
+
+
+def setup_index(filepath: str, strategy: str = "struct", cache_size: int = 1024) -> None:
+    """Open the index and keep it warm for all subsequent requests.
+
+    A sharded index answers queries itself, scattering them over its shards.
+    """
+    inverted_index = open_index(filepath, strategy=strategy)
+    if isinstance(inverted_index, ShardedIndex):
+        app.engine = inverted_index
+    else:
+        app.engine = CachedQueryEngine(inverted_index, postings_cache_size=cache_size, result_cache_size=4 * cache_size)
+    app.metadata = shard_metadata(filepath, inverted_index)
+
+
+@app.route("/api/index", methods=["GET"])
+def index_metadata():
+    if app.metadata is None:
+        return "Inverted index is not loaded", 503
+    return jsonify(app.metadata)
+
+
+@app.route("/api/query", methods=["GET"])
+def query():
+    if app.engine is None:
+        return "Inverted index is not loaded", 503
+    words = request.args.get("query", "").split()
+    return jsonify({"query": words, "documents": app.engine.query(words)})
+
+
+@app.route("/api/query/batch", methods=["POST"])
+def query_batch():
+    if app.engine is None:
+        return "Inverted index is not loaded", 503
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get("queries"), list):
+        return "Expected JSON object with a list of queries", 400
+    queries = [query_words.split() if isinstance(query_words, str) else list(query_words)
+               for query_words in payload["queries"]]
+    if isinstance(app.engine, ShardedIndex):
+        return jsonify({"results": app.engine.query_batch(queries)})
+    return jsonify({"results": [app.engine.query(words) for words in queries]})
+
+
+@app.errorhandler(404)
+def page_not_found(error):
+    return "This route is not found", 404
+
+
+if __name__ == "__main__":
+    app.run(debug=True)
@@ -1,6 +1,14 @@
 import pytest
+import fnmatch
+import math
+import random
 import subprocess
-from task_Garifulla_Kenessary_inverted_index import InvertedIndex, load_documents, build_inverted_index
+from task_Garifulla_Kenessary_inverted_index import (
+    InvertedIndex, MappedInvertedIndex, load_documents, build_inverted_index, build_inverted_index_parallel,
+    build_inverted_index_external, parse_size, HybridPostings, Analyzer, ENGLISH_STOPWORDS, open_index,
+)
+from task_Garifulla_Kenessary_inverted_index_query import search
+from task_Garifulla_Kenessary_inverted_index_segments import SegmentedIndex, add_segment
 
 def test_inverted_index_dump_is_not_zero(tmp_path):
     documents = load_documents("sample.txt")
@@ -59,3 +67,351 @@ def test_inverted_index_build_compression_quality(tmp_path):
     compression_size = dump_path.stat().st_size / (1024 * 1024)  # Размер в МБ
     assert compression_size <= 12
 
+
+def test_inverted_index_varint_roundtrip_large_doc_ids(tmp_path):
+    documents = {1: "alpha beta", 70000: "alpha gamma", 2**40: "alpha beta gamma"}
+    inverted_index = build_inverted_index(documents)
+    dump_path = tmp_path / "index.varint"
+    inverted_index.dump(dump_path, strategy="varint")
+
+    loaded_index = InvertedIndex.load(dump_path, strategy="varint")
+    assert loaded_index.index == inverted_index.index
+    assert sorted(loaded_index.query(["alpha", "gamma"])) == [70000, 2**40]
+
+def test_inverted_index_varint_is_smaller_than_struct(tmp_path):
+    documents = {doc_id: " ".join(f"word{doc_id % step}" for step in range(2, 40)) for doc_id in range(1, 3000)}
+    inverted_index = build_inverted_index(documents)
+    struct_path = tmp_path / "index.struct"
+    varint_path = tmp_path / "index.varint"
+    inverted_index.dump(struct_path, strategy="struct")
+    inverted_index.dump(varint_path, strategy="varint")
+    assert varint_path.stat().st_size < struct_path.stat().st_size
+
+def test_inverted_index_varint_rejects_foreign_file(tmp_path):
+    dump_path = tmp_path / "index.struct"
+    build_inverted_index({1: "some words"}).dump(dump_path, strategy="struct")
+    with pytest.raises(ValueError):
+        InvertedIndex.load(dump_path, strategy="varint")
+
+def test_mapped_inverted_index_decodes_only_queried_words(tmp_path):
+    documents = load_documents("sample.txt")
+    inverted_index = build_inverted_index(documents)
+    dump_path = tmp_path / "index.varint"
+    inverted_index.dump(dump_path, strategy="varint")
+
+    with MappedInvertedIndex(dump_path) as mapped_index:
+        assert len(mapped_index) == len(inverted_index.index)
+        assert "learning" in mapped_index
+        assert "word_does_not_exist" not in mapped_index
+        assert mapped_index.postings("learning") == sorted(inverted_index.index["learning"])
+        assert sorted(mapped_index.query(["machine", "learning"])) == sorted(inverted_index.query(["machine", "learning"]))
+        assert mapped_index.query(["machine", "word_does_not_exist"]) == []
+
+def test_mapped_inverted_index_query_cli(tmp_path):
+    index_path = tmp_path / "index.varint"
+    subprocess.run([
+        "python3", "task_Garifulla_Kenessary_inverted_index.py",
+        "build", "--dataset", "sample.txt", "--output", str(index_path), "--strategy", "varint"
+    ], check=True)
+
+    result = subprocess.run([
+        "python3", "task_Garifulla_Kenessary_inverted_index.py",
+        "query", "--index", str(index_path), "--strategy", "varint", "--query", "machine", "learning"
+    ], capture_output=True, text=True, check=True)
+    assert sorted(result.stdout.strip().split(",")) == ["3", "7"]
+
+def test_inverted_index_query_is_sorted():
+    documents = {37: "b_word a_word", 2: "b_word", 123: "a_word b_word", 5: "a_word b_word"}
+    inverted_index = build_inverted_index(documents)
+    assert inverted_index.query(["a_word", "b_word"]) == [5, 37, 123]
+    assert inverted_index.query(["b_word", "word_does_not_exist"]) == []
+
+@pytest.mark.parametrize("strategy", ["json", "struct", "varint"])
+def test_parallel_build_is_byte_identical(tmp_path, strategy):
+    dataset_path = tmp_path / "dataset.txt"
+    lines = [f"{doc_id}\tword{doc_id % 7} shared word{doc_id % 3} шаг{doc_id % 5}" for doc_id in range(500, 0, -1)]
+    dataset_path.write_text("\n".join(lines) + "\n\n", encoding="utf-8")
+
+    serial_path = tmp_path / "serial.index"
+    parallel_path = tmp_path / "parallel.index"
+    build_inverted_index(load_documents(dataset_path)).dump(serial_path, strategy=strategy)
+    build_inverted_index_parallel(dataset_path, 3).dump(parallel_path, strategy=strategy)
+    assert parallel_path.read_bytes() == serial_path.read_bytes()
+
+@pytest.mark.parametrize("strategy", ["json", "struct", "varint"])
+def test_external_build_matches_in_memory_build(tmp_path, strategy):
+    dataset_path = tmp_path / "dataset.txt"
+    lines = [f"{doc_id}\tword{doc_id % 11} shared word{doc_id % 4} слово{doc_id % 6}" for doc_id in range(300, 0, -1)]
+    dataset_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    serial_path = tmp_path / "serial.index"
+    external_path = tmp_path / "external.index"
+    build_inverted_index(load_documents(dataset_path)).dump(serial_path, strategy=strategy)
+    block_count = build_inverted_index_external(dataset_path, external_path, strategy=strategy, memory_limit=4096)
+    assert block_count > 1
+    assert external_path.read_bytes() == serial_path.read_bytes()
+
+@pytest.mark.parametrize(
+    "text, etalon_size",
+    [("4096", 4096), ("512K", 512 * 1024), ("1.5m", 1536 * 1024), ("2G", 2 * 1024 ** 3)]
+)
+def test_parse_size(text, etalon_size):
+    assert parse_size(text) == etalon_size
+
+def test_batch_query_cli_from_stdin(tmp_path):
+    index_path = tmp_path / "index.varint"
+    subprocess.run([
+        "python3", "task_Garifulla_Kenessary_inverted_index.py",
+        "build", "--dataset", "sample.txt", "--output", str(index_path), "--strategy", "varint"
+    ], check=True)
+
+    result = subprocess.run([
+        "python3", "task_Garifulla_Kenessary_inverted_index.py",
+        "query", "--index", str(index_path), "--strategy", "varint", "--query-file", "-"
+    ], input="machine learning\nword_does_not_exist\nlearning machine\n", capture_output=True, text=True, check=True)
+    assert result.stdout.splitlines() == ["3,7", "", "3,7"]
+
+def _exhaustive_bm25(documents, words, operator, k1=1.2, b=0.75):
+    lengths = {doc_id: len(content.split()) for doc_id, content in documents.items()}
+    average_length = sum(lengths.values()) / len(lengths)
+    scores = {}
+    for doc_id, content in documents.items():
+        tokens = content.split()
+        present = [word for word in set(words) if word in tokens]
+        if not present or (operator == "and" and len(present) < len(set(words))):
+            continue
+        total = 0.0
+        for word in present:
+            df = sum(1 for other in documents.values() if word in other.split())
+            idf = math.log(1 + (len(documents) - df + 0.5) / (df + 0.5))
+            tf = tokens.count(word)
+            total += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * lengths[doc_id] / average_length))
+        scores[doc_id] = total
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+@pytest.mark.parametrize("operator", ["or", "and"])
+def test_ranked_query_matches_exhaustive_bm25(tmp_path, operator):
+    rng = random.Random(7)
+    vocabulary = [f"w{rank}" for rank in range(60)]
+    documents = {
+        doc_id: " ".join(rng.choices(vocabulary, weights=[1 / (rank + 1) for rank in range(60)], k=rng.randint(3, 30)))
+        for doc_id in range(1, 400)
+    }
+    inverted_index = build_inverted_index(documents, frequencies=True)
+    dump_path = tmp_path / "index.varint"
+    inverted_index.dump(dump_path, strategy="varint")
+
+    with MappedInvertedIndex(dump_path) as mapped_index:
+        for words in (["w0", "w5", "w30"], ["w1", "w2"], ["w59", "missing"]):
+            etalon = _exhaustive_bm25(documents, words, operator)[:5]
+            for ranked in (inverted_index.query_ranked(words, top_k=5, operator=operator),
+                           mapped_index.query_ranked(words, top_k=5, operator=operator)):
+                assert [doc_id for doc_id, _ in ranked] == [doc_id for doc_id, _ in etalon]
+                assert [score for _, score in ranked] == pytest.approx([score for _, score in etalon])
+
+def test_ranked_query_cli(tmp_path):
+    index_path = tmp_path / "index.varint"
+    subprocess.run([
+        "python3", "task_Garifulla_Kenessary_inverted_index.py",
+        "build", "--dataset", "sample.txt", "--output", str(index_path), "--strategy", "varint", "--frequencies"
+    ], check=True)
+
+    result = subprocess.run([
+        "python3", "task_Garifulla_Kenessary_inverted_index.py",
+        "query", "--index", str(index_path), "--strategy", "varint", "--query", "machine", "learning",
+        "--rank", "bm25", "--top-k", "3"
+    ], capture_output=True, text=True, check=True)
+    ranked = [pair.split(":") for pair in result.stdout.strip().split(",")]
+    assert len(ranked) == 3
+    assert {"3", "7"} <= {doc_id for doc_id, _ in ranked}
+
+def test_ranked_query_cli_needs_frequencies(tmp_path):
+    index_path = tmp_path / "index.varint"
+    build_inverted_index(load_documents("sample.txt")).dump(index_path, strategy="varint")
+    add_segment(tmp_path / "segments", {1: "machine learning"})
+    for index_args in (["--index", str(index_path), "--strategy", "varint"], ["--index", str(tmp_path / "segments")]):
+        result = subprocess.run([
+            "python3", "task_Garifulla_Kenessary_inverted_index.py",
+            "query", *index_args, "--query", "machine", "--rank", "bm25"
+        ], capture_output=True, text=True)
+        assert result.returncode == 2 and "--frequencies" in result.stderr and "Traceback" not in result.stderr
+
+def test_wildcard_expansion_across_dictionary_blocks(tmp_path):
+    rng = random.Random(13)
+    documents = {
+        doc_id: " ".join("".join(rng.choice("abcé") for _ in range(rng.randint(1, 5))) for _ in range(8))
+        for doc_id in range(1, 301)
+    }
+    inverted_index = build_inverted_index(documents)
+    dump_path = tmp_path / "index.varint"
+    inverted_index.dump(dump_path, strategy="varint")
+    with MappedInvertedIndex(dump_path) as mapped_index:
+        assert dict(mapped_index.items()) == inverted_index.index
+        assert "zzz" not in mapped_index and "" not in mapped_index
+        for pattern in ["a*", "ab*", "*c", "a?c*", "é*", "*", "?", "zz*", "abc"]:
+            etalon_words = sorted(word for word in inverted_index.index if fnmatch.fnmatchcase(word, pattern))
+            etalon_doc_ids = sorted({doc_id for word in etalon_words for doc_id in inverted_index.index[word]})
+            assert inverted_index.expand_terms(pattern) == etalon_words
+            assert mapped_index.expand_terms(pattern) == etalon_words
+            assert inverted_index.wildcard_postings(pattern) == etalon_doc_ids
+            assert mapped_index.wildcard_postings(pattern) == etalon_doc_ids
+
+def test_front_coded_dictionary_is_compact(tmp_path):
+    words = [f"prefix{number:06d}" for number in range(5000)]
+    inverted_index = build_inverted_index({1: " ".join(words)})
+    dump_path = tmp_path / "index.varint"
+    inverted_index.dump(dump_path, strategy="varint")
+    # whole words alone would take 60000 bytes
+    assert dump_path.stat().st_size < 40000
+    with MappedInvertedIndex(dump_path) as mapped_index:
+        assert mapped_index.postings("prefix004999") == [1]
+        assert mapped_index.expand_terms("prefix00001*") == [f"prefix00001{digit}" for digit in range(10)]
+
+def test_hybrid_postings_set_operations():
+    rng = random.Random(5)
+    dense = sorted(rng.sample(range(1, 140000), 60000))
+    sparse = sorted(rng.sample(range(1, 140000), 3000))
+    dense_postings, sparse_postings = HybridPostings.from_doc_ids(dense), HybridPostings.from_doc_ids(sparse)
+    assert HybridPostings.is_worthwhile(dense) and not HybridPostings.is_worthwhile(sparse)
+    assert list(dense_postings) == dense and len(dense_postings) == len(dense)
+    buffer = bytearray()
+    dense_postings.encode(buffer)
+    decoded, pos = HybridPostings.decode(bytes(buffer), 0)
+    assert list(decoded) == dense and pos == len(buffer)
+    assert list(dense_postings & decoded) == dense
+    assert list(dense_postings & sparse_postings) == sorted(set(dense) & set(sparse))
+    assert list(dense_postings | sparse_postings) == sorted(set(dense) | set(sparse))
+    assert dense_postings.filter(sparse) == sorted(set(dense) & set(sparse))
+
+def test_varint_index_packs_long_postings(tmp_path):
+    rng = random.Random(3)
+    doc_ids = sorted(rng.sample(range(1, 1 << 40), 300))
+    documents = {doc_id: "common " * rng.randint(1, 300) for doc_id in doc_ids}
+    for number, doc_id in enumerate(doc_ids):
+        documents[doc_id] += " ".join(word for word, every in [("rare", 150), ("few", 50), ("half", 2)] if number % every == 0)
+    inverted_index = build_inverted_index(documents, frequencies=True)
+    dump_path = tmp_path / "index.varint"
+    inverted_index.dump(dump_path, strategy="varint")
+    loaded = InvertedIndex.load(dump_path, strategy="varint")
+    assert loaded.index == inverted_index.index and loaded.frequencies == inverted_index.frequencies
+    assert loaded.doc_lengths == inverted_index.doc_lengths
+    with MappedInvertedIndex(dump_path) as mapped_index:
+        for word in ["common", "half", "few", "rare"]:
+            assert mapped_index.postings_with_frequencies(word) == (inverted_index.index[word], inverted_index.frequencies[word])
+
+def test_mapped_index_with_dense_words(tmp_path):
+    rng = random.Random(9)
+    documents = {}
+    for doc_id in range(1, 12001):
+        words = ["the"] if rng.random() < 0.9 else []
+        words += ["and"] if rng.random() < 0.6 else []
+        words += ["rare"] if rng.random() < 0.001 else []
+        documents[doc_id] = " ".join(words) or "empty"
+    inverted_index = build_inverted_index(documents, frequencies=True, positions=True)
+    dump_path = tmp_path / "index.varint"
+    inverted_index.dump(dump_path, strategy="varint")
+    with MappedInvertedIndex(dump_path) as mapped_index:
+        for words in (["the"], ["rare", "the"], ["the", "and"], ["and", "rare", "the"], ["empty", "the"]):
+            assert mapped_index.query(words) == inverted_index.query(words)
+        assert mapped_index.postings_with_frequencies("the") == (inverted_index.index["the"], inverted_index.frequencies["the"])
+        assert mapped_index.positions("and", [1, 2, 3]) == inverted_index.positions("and", [1, 2, 3])
+    loaded_index = InvertedIndex.load(dump_path, strategy="varint")
+    assert loaded_index.index == inverted_index.index
+    assert loaded_index.frequencies == inverted_index.frequencies
+    assert loaded_index.positions_index == inverted_index.positions_index
+    assert loaded_index.doc_lengths == inverted_index.doc_lengths
+
+def test_default_analyzer_keeps_headerless_indexes_unchanged(tmp_path):
+    assert Analyzer().analyze("Machine  learning. ﬁne") == ["Machine", "learning.", "ﬁne"]
+    inverted_index = build_inverted_index({1: "Machine learning.", 2: "machine learning"})
+    assert sorted(inverted_index.index) == ["Machine", "learning", "learning.", "machine"]
+    for strategy in ("json", "struct", "varint"):
+        dump_path = tmp_path / f"index.{strategy}"
+        inverted_index.dump(dump_path, strategy=strategy)
+        loaded_index = open_index(dump_path, strategy=strategy)
+        assert loaded_index.query(["Machine"]) == [1]
+        assert loaded_index.query(["learning."]) == [1]
+
+def test_analyzer_is_stored_in_varint_index(tmp_path):
+    analyzer = Analyzer.normalizing(stopwords=ENGLISH_STOPWORDS, stemming=True)
+    inverted_index = build_inverted_index(load_documents("sample.txt"), positions=True, analyzer=analyzer)
+    assert "the" not in inverted_index.index and "network" in inverted_index.index
+    with pytest.raises(ValueError):
+        inverted_index.dump(tmp_path / "index.json", strategy="json")
+
+    dump_path = tmp_path / "index.varint"
+    inverted_index.dump(dump_path, strategy="varint")
+    with MappedInvertedIndex(dump_path) as mapped_index:
+        assert mapped_index.analyzer == analyzer
+        assert mapped_index.query(["Neural", "Networks"]) == inverted_index.query(["neural", "network"]) == [5, 6]
+        assert search(mapped_index, '"Artificial Neural Networks."') == [6]
+        assert search(mapped_index, "the AND networks") == [5, 6]
+    assert InvertedIndex.load(dump_path, strategy="varint").analyzer == analyzer
+
+def test_parallel_and_segmented_builds_use_the_analyzer(tmp_path):
+    analyzer = Analyzer.normalizing(stemming=True)
+    etalon_index = build_inverted_index(load_documents("sample.txt"), analyzer=analyzer)
+    assert build_inverted_index_parallel("sample.txt", workers=2, analyzer=analyzer).index == etalon_index.index
+
+    add_segment(tmp_path, {1: "Neural networks."}, analyzer=analyzer)
+    add_segment(tmp_path, {2: "A network of networks"})
+    with pytest.raises(ValueError):
+        add_segment(tmp_path, {3: "networks"}, analyzer=Analyzer())
+    with SegmentedIndex(tmp_path) as segmented_index:
+        assert segmented_index.analyzer == analyzer
+        assert segmented_index.query(["NETWORKS"]) == [1, 2]
+
+def test_struct_load_zero_copy(tmp_path):
+    inverted_index = build_inverted_index(load_documents("sample.txt"))
+    struct_path = tmp_path / "index.struct"
+    inverted_index.dump(struct_path, strategy="struct")
+
+    loaded_index = InvertedIndex.load(struct_path, strategy="struct")
+    zero_copy_index = InvertedIndex.load(struct_path, strategy="struct", zero_copy=True)
+    assert loaded_index.index == inverted_index.index
+    assert {word: list(doc_ids) for word, doc_ids in zero_copy_index.index.items()} == inverted_index.index
+    assert zero_copy_index.query(["machine", "learning"]) == inverted_index.query(["machine", "learning"])
+    assert search(zero_copy_index, "learning NOT deep") == search(inverted_index, "learning NOT deep")
+
+    json_path = tmp_path / "index.json"
+    zero_copy_index.dump(json_path, strategy="json")
+    assert InvertedIndex.load(json_path, strategy="json").index == inverted_index.index
+    with pytest.raises(ValueError):
+        InvertedIndex.load(json_path, strategy="json", zero_copy=True)
+
+def test_show_snippets_cli(tmp_path):
+    index_path = tmp_path / "index.varint"
+    subprocess.run([
+        "python3", "task_Garifulla_Kenessary_inverted_index.py",
+        "build", "--dataset", "sample.txt", "--output", str(index_path), "--strategy", "varint", "--store-documents", "--normalize"
+    ], check=True)
+    result = subprocess.run([
+        "python3", "task_Garifulla_Kenessary_inverted_index.py",
+        "query", "--index", str(index_path), "--strategy", "varint", "--query", "neural", "--show-snippets"
+    ], capture_output=True, text=True, check=True)
+    assert result.stdout.splitlines() == [
+        "5,6",
+        "5\tNeural networks are used in deep learning.",
+        "6\tArtificial neural networks mimic the human brain.",
+    ]
+
+def test_profile_cli(tmp_path):
+    index_path = tmp_path / "index.varint"
+    graphite_path = tmp_path / "metrics.txt"
+    result = subprocess.run([
+        "python3", "task_Garifulla_Kenessary_inverted_index.py",
+        "build", "--dataset", "sample.txt", "--output", str(index_path), "--strategy", "varint",
+        "--profile-graphite", str(graphite_path), "--profile-dump", str(tmp_path / "build.prof")
+    ], capture_output=True, text=True, check=True)
+    assert [line.split()[0] for line in result.stderr.splitlines()] == ["read", "index", "serialize"]
+    assert "inverted_index.build.read.items 20 " in graphite_path.read_text()
+    assert (tmp_path / "build.prof").stat().st_size > 0
+
+    result = subprocess.run([
+        "python3", "task_Garifulla_Kenessary_inverted_index.py",
+        "query", "--index", str(index_path), "--strategy", "varint", "--query", "machine", "learning", "--profile"
+    ], capture_output=True, text=True, check=True)
+    assert result.stdout.splitlines() == ["3,7"]
+    assert [line.split()[0] for line in result.stderr.splitlines()] == ["load", "query"]
+    load_items = int(result.stderr.splitlines()[0].split("items ")[1].split()[0])
+    assert load_items == len(build_inverted_index(load_documents("sample.txt")).index)
@@ -0,0 +1,21 @@
+import pytest
+from task_Garifulla_Kenessary_inverted_index_analyzer import Analyzer, ENGLISH_STOPWORDS
+
+@pytest.mark.parametrize(
+    "text, etalon_terms",
+    [
+        pytest.param("Artificial intelligence.", ["artificial", "intelligence"], id="case and punctuation"),
+        pytest.param("(deep) learning, \"utf-8\"", ["deep", "learning", "utf-8"], id="inner punctuation kept"),
+        pytest.param("ﬁne ＤＡＴＡ", ["fine", "data"], id="unicode normalization"),
+        pytest.param("... -- !", [], id="only punctuation"),
+    ]
+)
+def test_normalizing_analyzer(text, etalon_terms):
+    assert Analyzer.normalizing().analyze(text) == etalon_terms
+
+def test_analyzer_stopwords_stemming_and_memo():
+    analyzer = Analyzer.normalizing(stopwords=ENGLISH_STOPWORDS, stemming=True)
+    assert analyzer.analyze("The networks AND the ponies are classes of buses") == ["network", "pony", "classe", "buse"]
+    analyzer.analyze("networks " * 100)
+    assert analyzer.normalize.cache_info().hits >= 99
+    assert Analyzer.from_config(analyzer.to_config()) == analyzer != Analyzer()
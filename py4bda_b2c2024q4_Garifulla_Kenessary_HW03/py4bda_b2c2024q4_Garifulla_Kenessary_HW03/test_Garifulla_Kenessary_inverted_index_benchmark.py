@@ -0,0 +1,43 @@
+import json
+from collections import Counter
+from task_Garifulla_Kenessary_inverted_index_benchmark import (
+    CONFIGS, generate_corpus, generate_queries, run_benchmark, compare_results, main,
+)
+
+def test_generate_corpus_is_deterministic(tmp_path):
+    first, second = tmp_path / "first.txt", tmp_path / "second.txt"
+    generate_corpus(first, documents=50, vocabulary=100, length=10)
+    generate_corpus(second, documents=50, vocabulary=100, length=10)
+    assert first.read_text(encoding="utf-8") == second.read_text(encoding="utf-8")
+    assert generate_queries(5, 100) == generate_queries(5, 100)
+
+def test_generate_corpus_is_zipf_skewed(tmp_path):
+    dataset_path = tmp_path / "dataset.txt"
+    generate_corpus(dataset_path, documents=200, vocabulary=1000, length=20)
+    lines = dataset_path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 200
+    counts = Counter(word for line in lines for word in line.split("\t", 1)[1].split())
+    assert counts.most_common(1)[0][0] == "w0"
+    assert counts["w0"] > 10 * counts.get("w100", 1)
+
+def test_run_benchmark_streaming_config(tmp_path):
+    config = dict(CONFIGS["large"], documents=100, vocabulary=200, queries=10, memory_limit=4096)
+    results = run_benchmark(config, str(tmp_path))
+    assert "build_external" in results["stages"]
+    assert "build" not in results["stages"]
+    # the large preset builds once, with no tracemalloc run
+    assert "peak_bytes" not in results["stages"]["build_external"]
+    assert results["stages"]["query_mapped"]["items"] == 10
+
+def test_benchmark_cli_writes_results_and_flags_regressions(tmp_path):
+    output = tmp_path / "results.json"
+    assert main(["--config", "tiny", "--documents", "100", "--repeats", "1", "--no-memory",
+                 "--output", str(output), "--workdir", str(tmp_path / "work")]) == 0
+    results = json.loads(output.read_text(encoding="utf-8"))
+    assert {"build", "dump_varint", "load_json", "query", "query_mapped"} <= set(results["stages"])
+    assert compare_results(results, results) == []
+
+    slower = json.loads(json.dumps(results))
+    slower["stages"]["build"]["seconds"] *= 2
+    regressions = compare_results(slower, results, tolerance=0.2)
+    assert len(regressions) == 1 and regressions[0].startswith("build.seconds")
@@ -0,0 +1,49 @@
+import random
+import subprocess
+from task_Garifulla_Kenessary_inverted_index import (
+    load_documents, build_inverted_index, Analyzer, ENGLISH_STOPWORDS,
+)
+from task_Garifulla_Kenessary_inverted_index_csr import CSRInvertedIndex
+
+def test_csr_index_matches_inverted_index(tmp_path):
+    rng = random.Random(5)
+    documents = {doc_id: " ".join(f"w{rng.randrange(30)}" for _ in range(rng.randint(1, 15))) for doc_id in range(1, 400)}
+    inverted_index = build_inverted_index(documents)
+    queries = [[f"w{rng.randrange(32)}" for _ in range(rng.randint(0, 4))] for _ in range(300)]
+
+    csr_index = CSRInvertedIndex.from_inverted_index(inverted_index)
+    csr_index.dump(tmp_path / "csr")
+    loaded_index = CSRInvertedIndex.load(tmp_path / "csr")
+    assert loaded_index.postings.dtype.itemsize == 4
+    for index in (csr_index, loaded_index):
+        assert [doc_ids.tolist() for doc_ids in index.query_batch(queries)] == [inverted_index.query(words) for words in queries]
+    assert loaded_index.query(["w1", "w2"]) == inverted_index.query(["w1", "w2"])
+    assert loaded_index.postings_of("w3").tolist() == inverted_index.index["w3"]
+    assert loaded_index.query_batch([]) == []
+
+def test_csr_index_keeps_analyzer(tmp_path):
+    inverted_index = build_inverted_index(load_documents("sample.txt"), analyzer=Analyzer.normalizing(stopwords=ENGLISH_STOPWORDS, stemming=True))
+    CSRInvertedIndex.from_inverted_index(inverted_index).dump(tmp_path / "csr")
+    loaded_index = CSRInvertedIndex.load(tmp_path / "csr", mmap=False)
+    assert loaded_index.analyzer == inverted_index.analyzer
+    assert loaded_index.query(["The", "Networks"]) == inverted_index.query(["The", "Networks"]) == [5, 6]
+
+def test_csr_index_huge_doc_ids():
+    big = 2 ** 62
+    csr_index = CSRInvertedIndex.from_index({"a": [1, big, big + 5], "b": [big, big + 5], "c": [big + 5]})
+    assert csr_index.postings.dtype.itemsize == 8
+    assert [doc_ids.tolist() for doc_ids in csr_index.query_batch([["a", "b"], ["a", "b", "c"], ["c", "d"]])] == [
+        [big, big + 5], [big + 5], []]
+
+def test_csr_cli(tmp_path):
+    index_path = tmp_path / "index.varint"
+    build_inverted_index(load_documents("sample.txt")).dump(index_path, strategy="varint")
+    subprocess.run([
+        "python3", "task_Garifulla_Kenessary_inverted_index_csr.py",
+        "convert", "--index", str(index_path), "--strategy", "varint", "--output", str(tmp_path / "csr")
+    ], check=True)
+    result = subprocess.run([
+        "python3", "task_Garifulla_Kenessary_inverted_index_csr.py",
+        "query", "--index", str(tmp_path / "csr"), "--batch-size", "1"
+    ], input="machine learning\nword_does_not_exist\n", capture_output=True, text=True, check=True)
+    assert result.stdout.splitlines() == ["3,7", ""]
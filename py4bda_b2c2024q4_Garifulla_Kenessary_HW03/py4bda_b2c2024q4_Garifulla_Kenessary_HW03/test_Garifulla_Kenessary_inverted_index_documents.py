@@ -0,0 +1,29 @@
+import pytest
+import random
+from task_Garifulla_Kenessary_inverted_index_analyzer import Analyzer
+from task_Garifulla_Kenessary_inverted_index_documents import DocumentStore, write_document_store, make_snippet
+
+def test_document_store_random_access(tmp_path):
+    rng = random.Random(3)
+    documents = {doc_id: " ".join(f"w{rng.randrange(50)}" for _ in range(rng.randint(5, 40)))
+                 for doc_id in rng.sample(range(1, 100000), 500)}
+    documents[7] = "пример текста"
+    store_path = tmp_path / "index.docs"
+    assert write_document_store(store_path, documents.items(), block_size=1024) == len(documents)
+
+    with DocumentStore(store_path) as store:
+        assert len(store) == len(documents)
+        assert store._block_count > 10
+        for doc_id, content in documents.items():
+            assert store.get(doc_id) == content
+        assert store.get(0) is None
+        wanted = sorted(documents)[:10] + [0]
+        assert store.get_many(wanted) == {doc_id: documents[doc_id] for doc_id in wanted if doc_id in documents}
+
+    with pytest.raises(ValueError):
+        DocumentStore("sample.txt")
+
+def test_make_snippet():
+    text = " ".join(f"w{number}" for number in range(30)) + " Networks w30"
+    assert make_snippet(text, ["network"], Analyzer.normalizing(stemming=True)) == "... w26 w27 w28 w29 Networks w30"
+    assert make_snippet("short text", ["missing"], Analyzer()) == "short text"
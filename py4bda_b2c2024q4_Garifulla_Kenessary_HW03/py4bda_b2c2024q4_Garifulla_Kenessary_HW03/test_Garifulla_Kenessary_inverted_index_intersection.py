@@ -0,0 +1,15 @@
+import pytest
+from task_Garifulla_Kenessary_inverted_index_intersection import intersect_postings
+
+@pytest.mark.parametrize(
+    "postings, etalon_answer",
+    [
+        pytest.param([[1, 3, 5, 7, 9], [2, 3, 4, 9, 10]], [3, 9], id="two lists"),
+        pytest.param([list(range(0, 10000, 2)), list(range(0, 10000, 3)), [6, 7, 9000]], [6, 9000], id="gallop"),
+        pytest.param([[1, 2, 3], []], [], id="empty list"),
+        pytest.param([[5, 1000]], [5, 1000], id="single list"),
+        pytest.param([], [], id="no lists"),
+    ]
+)
+def test_intersect_postings(postings, etalon_answer):
+    assert intersect_postings(postings) == etalon_answer
@@ -0,0 +1,17 @@
+from task_Garifulla_Kenessary_inverted_index_profiler import StageProfiler
+
+def test_stage_profiler():
+    profiler = StageProfiler()
+    for _ in range(2):
+        with profiler.stage("index") as record:
+            record["items"] = sum(range(10000))
+    assert list(profiler.stages) == ["index"]
+    assert profiler.stages["index"]["wall_seconds"] > 0
+    assert profiler.stages["index"]["items"] == sum(range(10000))
+    assert profiler.graphite_lines("cli", timestamp=100)[0].startswith("cli.index.wall_seconds ")
+    assert all(line.endswith(" 100") and len(line.split()) == 3 for line in profiler.graphite_lines("cli", timestamp=100))
+
+    disabled = StageProfiler(enabled=False)
+    with disabled.stage("index") as record:
+        record["items"] = 1
+    assert disabled.stages == {} and disabled.report() == ""
@@ -0,0 +1,86 @@
+import pytest
+import subprocess
+from task_Garifulla_Kenessary_inverted_index import InvertedIndex, MappedInvertedIndex, load_documents, build_inverted_index
+from task_Garifulla_Kenessary_inverted_index_query import CachedQueryEngine, parse_query, search
+from task_Garifulla_Kenessary_inverted_index_shards import build_sharded_index
+
+def test_cached_query_engine_reuses_postings_and_results():
+    documents = load_documents("sample.txt")
+    inverted_index = build_inverted_index(documents)
+    engine = CachedQueryEngine(inverted_index, postings_cache_size=8, result_cache_size=8)
+
+    assert engine.query(["machine", "learning"]) == inverted_index.query(["machine", "learning"])
+    assert engine.query(["learning", "machine", "learning"]) == inverted_index.query(["machine", "learning"])
+    assert engine.query(["learning", "is"]) == inverted_index.query(["learning", "is"])
+    assert engine.postings.cache_info().misses == 3
+    assert engine._results.cache_info().hits == 1
+
+@pytest.mark.parametrize(
+    "text, etalon_node",
+    [
+        pytest.param("a b", ("and", [("term", "a"), ("term", "b")]), id="implicit and"),
+        pytest.param('"a b" OR c', ("or", [("phrase", ["a", "b"]), ("term", "c")]), id="phrase or"),
+        pytest.param("a AND NOT (b OR c)", ("and", [("term", "a"), ("not", ("or", [("term", "b"), ("term", "c")]))]), id="not group"),
+        pytest.param('"single"', ("term", "single"), id="one word phrase"),
+        pytest.param("learn* fun", ("and", [("wildcard", "learn*"), ("term", "fun")]), id="wildcard"),
+    ]
+)
+def test_parse_query(text, etalon_node):
+    assert parse_query(text) == etalon_node
+
+@pytest.mark.parametrize("text", ["(a b", "a OR", "NOT", "a )", '""'])
+def test_parse_query_rejects_malformed(text):
+    with pytest.raises(ValueError):
+        parse_query(text)
+
+DATASET_PHRASES = {
+    1: "to be or not to be",
+    2: "not to mention the bees",
+    3: "to be honest it is not",
+    4: "machine learning is fun",
+    5: "learning machine code",
+}
+
+@pytest.mark.parametrize(
+    "text, etalon_answer",
+    [
+        pytest.param('"to be"', [1, 3], id="phrase"),
+        pytest.param('"not to be"', [1], id="long phrase"),
+        pytest.param('"machine learning"', [4], id="order matters"),
+        pytest.param('machine learning', [4, 5], id="plain and"),
+        pytest.param('"to be" AND NOT honest', [1], id="phrase and not"),
+        pytest.param('(fun OR code) machine', [4, 5], id="parentheses"),
+        pytest.param('"learning machine" OR "to mention"', [2, 5], id="phrase or phrase"),
+        pytest.param('"be or not to be to"', [], id="phrase past end"),
+        pytest.param('b* NOT "to be"', [2], id="prefix and not phrase"),
+        pytest.param('m?chine l*ing', [4, 5], id="wildcards"),
+    ]
+)
+def test_search_positional_index(tmp_path, text, etalon_answer):
+    inverted_index = build_inverted_index(DATASET_PHRASES, positions=True)
+    assert search(inverted_index, text) == etalon_answer
+
+    dump_path = tmp_path / "index.varint"
+    inverted_index.dump(dump_path, strategy="varint")
+    with MappedInvertedIndex(dump_path) as mapped_index:
+        assert search(mapped_index, text) == etalon_answer
+    assert InvertedIndex.load(dump_path, strategy="varint").positions_index == inverted_index.positions_index
+
+@pytest.mark.parametrize("text", ["", "(machine", "machine OR", '""', "NOT machine", "fun OR NOT code"])
+def test_search_rejects_malformed_expressions(text):
+    with pytest.raises(ValueError):
+        search(build_inverted_index(DATASET_PHRASES, positions=True), text)
+
+def test_expression_query_cli_reports_malformed_queries(tmp_path):
+    index_path = tmp_path / "index.varint"
+    build_inverted_index(load_documents("sample.txt"), positions=True).dump(index_path, strategy="varint")
+    build_sharded_index("sample.txt", str(tmp_path / "shards"), 2, positions=True)
+    for index_args in (["--index", str(index_path), "--strategy", "varint"], ["--index", str(tmp_path / "shards"), "--workers", "1"]):
+        command = ["python3", "task_Garifulla_Kenessary_inverted_index.py", "query", *index_args, "--syntax", "expression"]
+        result = subprocess.run(command + ["--query-file", "-"], input='machine learning\n\n(machine\n"vector machines"\n',
+                                capture_output=True, text=True, check=True)
+        assert result.stdout.splitlines() == ["3,7", "", "", "8"]
+        assert [line.split(":")[0] for line in result.stderr.splitlines()] == ["Query 2", "Query 3"]
+
+        result = subprocess.run(command + ["--query", "NOT", "machine"], capture_output=True, text=True)
+        assert result.returncode == 2 and "NOT must be combined" in result.stderr and "Traceback" not in result.stderr
@@ -0,0 +1,34 @@
+from task_Garifulla_Kenessary_inverted_index import load_documents, build_inverted_index
+from task_Garifulla_Kenessary_inverted_index_query import search
+from task_Garifulla_Kenessary_inverted_index_segments import SegmentedIndex, add_segment, merge_segments
+
+def test_segmented_index_add_query_and_merge(tmp_path):
+    documents = load_documents("sample.txt")
+    index_dir = tmp_path / "segments"
+    doc_ids = sorted(documents)
+    for start in range(0, len(doc_ids), 4):
+        add_segment(str(index_dir), {doc_id: documents[doc_id] for doc_id in doc_ids[start:start + 4]})
+    etalon_index = build_inverted_index(documents)
+
+    with SegmentedIndex(str(index_dir)) as segmented_index:
+        assert len(segmented_index.segments) == 5
+        assert segmented_index.query(["machine", "learning"]) == etalon_index.query(["machine", "learning"])
+        assert segmented_index.postings("is") == etalon_index.index["is"]
+
+    assert merge_segments(str(index_dir), merge_factor=2) == 3
+    with SegmentedIndex(str(index_dir)) as segmented_index:
+        assert [segment["documents"] for segment in segmented_index.manifest["segments"]] == [4, 16]
+        assert segmented_index.query(["machine", "learning"]) == etalon_index.query(["machine", "learning"])
+
+    assert merge_segments(str(index_dir), force=True) == 1
+    with SegmentedIndex(str(index_dir)) as segmented_index:
+        assert len(segmented_index.segments) == 1
+        assert dict(segmented_index.segments[0].items()) == etalon_index.index
+    assert sorted(path.name for path in index_dir.iterdir()) == ["manifest.json", "segment-000008.idx"]
+
+def test_segmented_index_wildcards(tmp_path):
+    add_segment(tmp_path, {1: "machine learning", 2: "machinery"})
+    add_segment(tmp_path, {3: "learning machines"})
+    with SegmentedIndex(tmp_path) as segmented_index:
+        assert segmented_index.expand_terms("machin*") == ["machine", "machinery", "machines"]
+        assert search(segmented_index, "machin* learn*") == [1, 3]
@@ -0,0 +1,82 @@
+import pytest
+import random
+import subprocess
+from task_Garifulla_Kenessary_inverted_index import build_inverted_index
+from task_Garifulla_Kenessary_inverted_index_analyzer import Analyzer
+from task_Garifulla_Kenessary_inverted_index_query import search
+from task_Garifulla_Kenessary_inverted_index_shards import ShardedIndex, RemoteShardedIndex, build_sharded_index
+
+@pytest.mark.parametrize("partition, workers", [("hash", 1), ("range", 1), ("hash", 2)])
+def test_sharded_index_matches_single_index(tmp_path, partition, workers):
+    rng = random.Random(21)
+    vocabulary = [f"w{rank}" for rank in range(40)]
+    documents = {doc_id: " ".join(rng.choices(vocabulary, weights=[1 / (rank + 1) for rank in range(40)], k=rng.randint(3, 20)))
+                 for doc_id in range(1, 301)}
+    dataset_path = tmp_path / "dataset.txt"
+    dataset_path.write_text("".join(f"{doc_id}\t{content}\n" for doc_id, content in documents.items()), encoding="utf-8")
+    etalon_index = build_inverted_index(documents, positions=True)
+
+    manifest = build_sharded_index(str(dataset_path), str(tmp_path / "shards"), 3, partition=partition, positions=True)
+    assert sum(shard["documents"] for shard in manifest["shards"]) == len(documents)
+    queries = [["w0", "w1"], ["w5"], ["w3", "w7", "w9"], ["missing"]]
+    with ShardedIndex(str(tmp_path / "shards"), workers=workers) as sharded_index:
+        assert sharded_index.query_batch(queries) == [etalon_index.query(words) for words in queries]
+        assert sharded_index.query_batch(['"w0 w1" OR w30', "w2 NOT w0"], syntax="expression") == [
+            search(etalon_index, '"w0 w1" OR w30'), search(etalon_index, "w2 NOT w0")]
+        for operator in ("or", "and"):
+            ranked = sharded_index.query_ranked(["w2", "w8", "w15"], top_k=5, operator=operator)
+            etalon_ranked = etalon_index.query_ranked(["w2", "w8", "w15"], top_k=5, operator=operator)
+            assert [doc_id for doc_id, _ in ranked] == [doc_id for doc_id, _ in etalon_ranked]
+            assert [score for _, score in ranked] == pytest.approx([score for _, score in etalon_ranked])
+
+def test_sharded_index_cli(tmp_path):
+    index_dir = tmp_path / "shards"
+    subprocess.run([
+        "python3", "task_Garifulla_Kenessary_inverted_index.py",
+        "build", "--dataset", "sample.txt", "--output", str(index_dir), "--strategy", "varint",
+        "--shards", "3", "--partition", "range", "--normalize"
+    ], check=True)
+    assert sorted(path.name for path in index_dir.iterdir()) == ["manifest.json", "shard-0000.idx", "shard-0001.idx", "shard-0002.idx"]
+
+    result = subprocess.run([
+        "python3", "task_Garifulla_Kenessary_inverted_index.py",
+        "query", "--index", str(index_dir), "--workers", "2", "--query-file", "-"
+    ], input="machine learning\nword_does_not_exist\n", capture_output=True, text=True, check=True)
+    assert result.stdout.splitlines() == ["2,3,4,7,8", ""]
+
+def test_parallel_sharded_build_with_frequencies_cli(tmp_path):
+    index_dir = tmp_path / "shards"
+    subprocess.run([
+        "python3", "task_Garifulla_Kenessary_inverted_index.py",
+        "build", "--dataset", "sample.txt", "--output", str(index_dir), "--strategy", "varint",
+        "--shards", "2", "--workers", "2", "--frequencies"
+    ], check=True)
+    result = subprocess.run([
+        "python3", "task_Garifulla_Kenessary_inverted_index.py",
+        "query", "--index", str(index_dir), "--rank", "bm25", "--top-k", "2", "--query", "machine", "learning"
+    ], capture_output=True, text=True, check=True)
+    assert len(result.stdout.strip().split(",")) == 2
+
+    result = subprocess.run([
+        "python3", "task_Garifulla_Kenessary_inverted_index.py",
+        "build", "--dataset", "sample.txt", "--output", str(tmp_path / "index.varint"), "--strategy", "varint",
+        "--workers", "2", "--frequencies"
+    ], capture_output=True, text=True)
+    assert result.returncode == 2 and "serial unless --shards" in result.stderr
+
+def test_remote_sharded_index_reads_shard_metadata(monkeypatch):
+    normalizing = Analyzer.normalizing().to_config()
+    servers = {
+        "http://a": {"analyzer": normalizing, "partition": "range", "shard": 1, "shards": 2},
+        "http://b": {"analyzer": normalizing, "partition": "range", "shard": 0, "shards": 2},
+    }
+    monkeypatch.setattr(RemoteShardedIndex, "_get_metadata", lambda self, url: servers[url])
+    remote_index = RemoteShardedIndex(["http://a/", "http://b"])
+    assert remote_index.urls == ["http://b", "http://a"]
+    assert remote_index.partition == "range" and remote_index.analyzer == Analyzer.normalizing()
+
+    with pytest.raises(ValueError, match="shards"):
+        RemoteShardedIndex(["http://a"])
+    servers["http://b"]["analyzer"] = Analyzer().to_config()
+    with pytest.raises(ValueError, match="analyzers"):
+        RemoteShardedIndex(list(servers))
@@ -0,0 +1,55 @@
+import pytest
+from task_Garifulla_Kenessary_inverted_index import load_documents, build_inverted_index, Analyzer
+from task_Garifulla_Kenessary_inverted_index_shards import build_sharded_index
+from task_Garifulla_Kenessary_inverted_index_web_service import app, setup_index
+
+@pytest.fixture
+def client(tmp_path):
+    index_path = tmp_path / "index.varint"
+    build_inverted_index(load_documents("sample.txt")).dump(index_path, strategy="varint")
+    setup_index(str(index_path), strategy="varint")
+    with app.test_client() as client:
+        yield client
+    app.engine.inverted_index.close()
+    app.engine = app.metadata = None
+
+def test_query(client):
+    response = client.get("/api/query?query=machine learning")
+    assert response.status_code == 200
+    assert response.json == {"query": ["machine", "learning"], "documents": [3, 7]}
+
+def test_query_batch(client):
+    response = client.post("/api/query/batch", json={"queries": ["machine learning", ["word_does_not_exist"], "learning machine"]})
+    assert response.status_code == 200
+    assert response.json == {"results": [[3, 7], [], [3, 7]]}
+
+def test_query_batch_rejects_bad_payload(client):
+    response = client.post("/api/query/batch", json=["machine learning"])
+    assert response.status_code == 400
+
+def test_index_metadata(client):
+    response = client.get("/api/index")
+    assert response.status_code == 200
+    assert response.json == {"analyzer": Analyzer().to_config()}
+
+def test_index_metadata_of_a_shard(tmp_path):
+    analyzer = Analyzer.normalizing(stemming=True)
+    build_sharded_index("sample.txt", str(tmp_path), 2, partition="range", analyzer=analyzer)
+    setup_index(str(tmp_path / "shard-0001.idx"), strategy="varint")
+    try:
+        with app.test_client() as client:
+            response = client.get("/api/index")
+    finally:
+        app.engine.inverted_index.close()
+        app.engine = app.metadata = None
+    assert response.json == {"analyzer": analyzer.to_config(), "partition": "range", "shard": 1, "shards": 2}
+
+def test_query_without_index():
+    with app.test_client() as client:
+        response = client.get("/api/query?query=machine")
+    assert response.status_code == 503
+
+def test_nonexistent_route(client):
+    response = client.get("/nonexistent")
+    assert response.status_code == 404
+    assert response.data.decode() == "This route is not found"
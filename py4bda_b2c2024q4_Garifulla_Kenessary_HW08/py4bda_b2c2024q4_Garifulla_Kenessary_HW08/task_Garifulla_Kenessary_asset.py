@@ -0,0 +1,18 @@
+class Asset:
+    __slots__ = ("char_code", "name", "capital", "interest")
+
+    def __init__(self, char_code, name, capital, interest):
+        self.char_code = char_code
+        self.name = name
+        self.capital = capital
+        self.interest = interest
+
+    def calculate_revenue(self, years: int) -> float:
+        revenue = self.capital * ((1.0 + self.interest) ** years - 1.0)
+        return revenue
+
+    def __repr__(self):
+        return f"Asset({self.name}, {self.capital}, {self.interest})"
+
+    def __eq__(self, rhs):
+        return self.name == rhs.name and self.capital == rhs.capital and self.interest == rhs.interest
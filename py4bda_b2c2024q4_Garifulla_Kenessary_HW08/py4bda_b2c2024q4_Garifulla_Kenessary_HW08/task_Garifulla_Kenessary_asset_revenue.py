@@ -0,0 +1,73 @@
+import argparse
+import json
+import sys
+from typing import Dict, Iterable, List, Optional, Sequence, TextIO
+
+import numpy as np
+
+from task_Garifulla_Kenessary_asset import Asset
+
+
+def revenue_matrix(assets: Sequence[Asset], periods: Iterable[float], rates: Optional[Dict[str, float]] = None) -> np.ndarray:
+    """Revenue of every asset over every period, shape (len(assets), len(periods)).
+
+    Cell (i, j) equals assets[i].calculate_revenue(periods[j]) converted
+    with the rate of the asset char code (1 for codes missing from rates).
+    (1 + interest) ** period - 1 is computed as expm1(period * log1p(interest)),
+    which stays accurate for small rates, in one array the size of the result.
+    log1p is only defined above -1, so assets with interest <= -1 fall back
+    to the plain power.
+    """
+    rates = rates or {}
+    periods = np.asarray(list(periods), dtype=np.float64)
+    capital = np.fromiter((asset.capital for asset in assets), dtype=np.float64, count=len(assets))
+    interest = np.fromiter((asset.interest for asset in assets), dtype=np.float64, count=len(assets))
+    capital *= np.fromiter((rates.get(asset.char_code, 1) for asset in assets), dtype=np.float64, count=len(assets))
+    defined = interest > -1
+    growth = np.log1p(interest, where=defined, out=np.zeros_like(interest))
+    revenue = np.multiply.outer(growth, periods)
+    np.expm1(revenue, out=revenue)
+    if not defined.all():
+        revenue[~defined] = np.power.outer(1 + interest[~defined], periods) - 1
+    revenue *= capital[:, np.newaxis]
+    return revenue
+
+
+def load_assets(file: TextIO) -> List[Asset]:
+    """Read assets from "char_code name capital interest" lines."""
+    assets = []
+    for line in file:
+        if line.strip():
+            char_code, name, capital, interest = line.split()
+            assets.append(Asset(char_code, name, float(capital), float(interest)))
+    return assets
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Portfolio revenue over many periods")
+    parser.add_argument("--assets", default="-", help="File with \"char_code name capital interest\" lines, '-' for stdin (default)")
+    parser.add_argument("--period", type=float, nargs="+", required=True, help="Periods in years")
+    parser.add_argument("--rates", help="JSON file with char code -> rate used to convert revenues (default: no conversion)")
+    parser.add_argument("--output", help="Save the asset x period revenue matrix to this .npy file")
+    args = parser.parse_args(argv)
+
+    if args.assets == "-":
+        assets = load_assets(sys.stdin)
+    else:
+        with open(args.assets, 'r', encoding='utf-8') as file:
+            assets = load_assets(file)
+    rates = None
+    if args.rates:
+        with open(args.rates, 'r', encoding='utf-8') as file:
+            rates = json.load(file)
+
+    revenue = revenue_matrix(assets, args.period, rates)
+    if args.output:
+        np.save(args.output, revenue)
+    for period, total in zip(args.period, revenue.sum(axis=0)):
+        print(f"{period:<5g}:  {total:10.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,98 +1,422 @@
 from flask import Flask, request, jsonify
+import html
+import os
+import re
 import requests
+import sqlite3
+import threading
+import time
+from bisect import insort
+from contextlib import contextmanager
+from operator import attrgetter
 from bs4 import BeautifulSoup
-from typing import Dict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from task_Garifulla_Kenessary_asset import Asset
 
 app = Flask(__name__)
 
+CBR_BASE_URL = "https://www.cbr.ru/eng"
+KEY_INDICATOR_CODES = ["USD", "EUR", "XAU", "XAG", "XPT", "XPD"]  # Currencies and precious metals
+
 # Global portfolio to store assets
-class Asset:
-    def __init__(self, char_code, name, capital, interest):
-        self.char_code = char_code
-        self.name = name
-        self.capital = capital
-        self.interest = interest
+PORTFOLIO_SCHEMA = """
+CREATE TABLE IF NOT EXISTS assets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE,
+    char_code TEXT NOT NULL,
+    capital REAL NOT NULL,
+    interest REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS assets_char_code ON assets (char_code);
+CREATE TABLE IF NOT EXISTS portfolio_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    generation INTEGER NOT NULL,
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO portfolio_version VALUES (1, 0, 0);
+"""
+
+class SQLitePortfolioStorage:
+    """Portfolio assets in a SQLite database shared by all worker processes.
 
-    def calculate_revenue(self, years: int) -> float:
-        revenue = self.capital * ((1.0 + self.interest) ** years - 1.0)
-        return revenue
+    The database runs in WAL mode, so readers never wait for a writer.
+    Every write bumps a version counter in the same transaction and a
+    cleanup also bumps the generation, which lets a cache tell appends
+    (fetch the rows past the last id it has seen) from resets. Every
+    thread gets its own connection.
+    """
 
-    def __repr__(self):
-        return f"Asset({self.name}, {self.capital}, {self.interest})"
+    def __init__(self, path: str, timeout: float = 30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connection().executescript(PORTFOLIO_SCHEMA)
 
-    def __eq__(self, rhs):
-        return self.name == rhs.name and self.capital == rhs.capital and self.interest == rhs.interest
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # Autocommit mode: transactions are opened explicitly below
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    @contextmanager
+    def _write(self):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+            connection.execute("UPDATE portfolio_version SET version = version + 1")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def version(self) -> Tuple[int, int]:
+        """Current (generation, version) of the stored portfolio."""
+        return self._connection().execute("SELECT generation, version FROM portfolio_version").fetchone()
+
+    def snapshot(self, after: int = 0) -> Tuple[int, int, List[Tuple]]:
+        """Return (generation, version, rows) read in one transaction.
+
+        rows are (id, char_code, name, capital, interest) of the assets with
+        an id above after, in the order they were added.
+        """
+        connection = self._connection()
+        connection.execute("BEGIN")
+        try:
+            generation, version = connection.execute("SELECT generation, version FROM portfolio_version").fetchone()
+            rows = connection.execute("SELECT id, char_code, name, capital, interest FROM assets WHERE id > ? ORDER BY id",
+                                      (after,)).fetchall()
+        finally:
+            connection.execute("COMMIT")
+        return generation, version, rows
+
+    def add(self, asset: Asset) -> None:
+        """Store an asset; raises ValueError if one with the same name exists."""
+        with self._write() as connection:
+            try:
+                connection.execute("INSERT INTO assets (name, char_code, capital, interest) VALUES (?, ?, ?, ?)",
+                                   (asset.name, asset.char_code, asset.capital, asset.interest))
+            except sqlite3.IntegrityError:
+                raise ValueError(f"Asset '{asset.name}' already exists") from None
+
+    def clear(self) -> None:
+        with self._write() as connection:
+            connection.execute("DELETE FROM assets")
+            connection.execute("UPDATE portfolio_version SET generation = generation + 1")
 
 class Portfolio:
-    def __init__(self):
-        self.assets = []
+    """Assets with unique names, indexed by name and by char code.
+
+    Lookups by name do not scan. The (char_code, name) ordered view is
+    maintained incrementally: assets added since the last listing are
+    binary-inserted when they are few, or sorted on their own and merged in
+    with one timsort pass over the two runs; listing an unchanged portfolio
+    does not sort at all.
+
+    With a storage, the assets live there and the indexes become a
+    read-through cache: every read first compares the stored version
+    counter with the cached one, then loads only the rows added since, or
+    everything after a cleanup. Writes go to the storage first.
+    """
+
+    _sort_key = attrgetter("char_code", "name")
+
+    def __init__(self, storage: Optional[SQLitePortfolioStorage] = None):
+        self.storage = storage
+        self._by_name: Dict[str, Asset] = {}
+        self._by_char_code: Dict[str, List[Asset]] = {}
+        self._sorted: List[Asset] = []  # ordered by (char_code, name) as of the last listing
+        self._pending: List[Asset] = []  # added since then
+        self._version = None  # (generation, version) of the storage the cache reflects
+        self._last_id = 0
+        self._lock = threading.Lock()
+
+    def _sync(self) -> None:
+        if self.storage is None or self.storage.version() == self._version:
+            return
+        with self._lock:
+            generation, version, rows = self.storage.snapshot(after=self._last_id)
+            if self._version is not None and generation != self._version[0]:
+                self._reset()
+                generation, version, rows = self.storage.snapshot()
+            for row_id, char_code, name, capital, interest in rows:
+                self._index(Asset(char_code, name, capital, interest))
+                self._last_id = row_id
+            self._version = (generation, version)
+
+    def _index(self, asset: Asset) -> None:
+        # Callers hold self._lock
+        self._by_name[asset.name] = asset
+        self._by_char_code.setdefault(asset.char_code, []).append(asset)
+        self._pending.append(asset)
+
+    def _reset(self) -> None:
+        self._by_name.clear()
+        self._by_char_code.clear()
+        self._sorted.clear()
+        self._pending.clear()
+        self._last_id = 0
+
+    @property
+    def assets(self) -> List[Asset]:
+        """Assets in the order they were added."""
+        self._sync()
+        return list(self._by_name.values())
+
+    def __len__(self) -> int:
+        self._sync()
+        return len(self._by_name)
+
+    def __contains__(self, name: str) -> bool:
+        self._sync()
+        return name in self._by_name
 
     def add(self, asset):
-        self.assets.append(asset)
+        """Add an asset; raises ValueError if one with the same name exists."""
+        if self.storage is not None:
+            self.storage.add(asset)
+            self._sync()
+            return
+        with self._lock:
+            if asset.name in self._by_name:
+                raise ValueError(f"Asset '{asset.name}' already exists")
+            self._index(asset)
+
+    def get(self, name: str) -> Optional[Asset]:
+        self._sync()
+        return self._by_name.get(name)
+
+    def get_many(self, names: Iterable[str]) -> List[Asset]:
+        """Assets with the given names, in the order of names, skipping unknown and repeated ones."""
+        self._sync()
+        return [self._by_name[name] for name in dict.fromkeys(names) if name in self._by_name]
+
+    def with_char_code(self, char_code: str) -> List[Asset]:
+        """Assets in the currency or metal char_code, in the order they were added."""
+        self._sync()
+        return list(self._by_char_code.get(char_code, []))
+
+    def char_codes(self) -> List[str]:
+        self._sync()
+        return list(self._by_char_code)
 
     def list(self):
-        return sorted(self.assets, key=lambda x: (x.char_code, x.name))
+        self._sync()
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if len(pending) * len(self._sorted).bit_length() < len(self._sorted):
+                for asset in pending:
+                    insort(self._sorted, asset, key=self._sort_key)
+            elif pending:
+                pending.sort(key=self._sort_key)
+                self._sorted += pending
+                self._sorted.sort(key=self._sort_key)
+            return list(self._sorted)
 
-# Initialize an empty portfolio
-app.bank = Portfolio()
+    def clear(self) -> None:
+        if self.storage is not None:
+            self.storage.clear()
+            self._sync()
+            return
+        with self._lock:
+            self._reset()
 
-# Function to parse the daily currency rates from the CBR website
-def parse_cbr_currency_base_daily(html_data: str) -> Dict[str, float]:
+def setup_portfolio(db_path: Optional[str] = None) -> None:
+    """Keep the portfolio in process memory, or in a SQLite database shared by all worker processes."""
+    app.bank = Portfolio(SQLitePortfolioStorage(db_path) if db_path else None)
+
+# Workers started by Gunicorn share one portfolio when PORTFOLIO_DB names a database file
+setup_portfolio(os.environ.get("PORTFOLIO_DB"))
+
+# Table rows of a CBR page after the header row, as the texts of their <td> cells
+def _table_rows_bs4(html_data: str) -> Iterator[List[str]]:
     soup = BeautifulSoup(html_data, "html.parser")
-    currencies = {}
     for row in soup.find_all('tr')[1:]:  # Skip header row
-        cols = row.find_all('td')
-        char_code = cols[0].text.strip()
+        yield [col.text for col in row.find_all('td')]
+
+def _table_rows_lxml(html_data: str) -> Iterator[List[str]]:
+    # lxml is optional, it is only needed when this backend is selected
+    import lxml.html
+    rows = lxml.html.fromstring(html_data).iter('tr')
+    next(rows, None)  # Skip header row
+    for row in rows:
+        yield [col.text_content() for col in row.iter('td')]
+
+SKIPPED_MARKUP_RE = re.compile(r"<!--.*?-->|<(script|style)\b.*?</\1\s*>", re.S | re.I)
+ROW_RE = re.compile(r"<tr\b[^>]*>(.*?)</tr\s*>", re.S | re.I)
+CELL_RE = re.compile(r"<td\b[^>]*>(.*?)</td\s*>", re.S | re.I)
+TAG_RE = re.compile(r"<[^>]*>")
+
+def _table_rows_stream(html_data: str) -> Iterator[List[str]]:
+    # Scans for <tr>/<td> pairs instead of building a tree; CBR tables are well-formed
+    rows = ROW_RE.finditer(SKIPPED_MARKUP_RE.sub("", html_data))
+    next(rows, None)  # Skip header row
+    for row in rows:
+        yield [html.unescape(TAG_RE.sub("", cell)) for cell in CELL_RE.findall(row.group(1))]
+
+CBR_PARSER_BACKENDS = {"bs4": _table_rows_bs4, "lxml": _table_rows_lxml, "stream": _table_rows_stream}
+
+# Function to parse the daily currency rates from the CBR website
+def parse_cbr_currency_base_daily(html_data: str, backend: str = "bs4") -> Dict[str, float]:
+    currencies = {}
+    for cols in CBR_PARSER_BACKENDS[backend](html_data):
+        char_code = cols[0].strip()
         try:
-            rate = float(cols[1].text.strip().replace(",", "."))
+            rate = float(cols[1].strip().replace(",", "."))
             currencies[char_code] = rate
         except ValueError:
             continue  # Skip rows where the rate cannot be converted to float
     return currencies
 
 # Function to parse the key indicators page from the CBR website
-def parse_cbr_key_indicators(html_data: str) -> Dict[str, float]:
-    soup = BeautifulSoup(html_data, "html.parser")
+def parse_cbr_key_indicators(html_data: str, backend: str = "bs4") -> Dict[str, float]:
     indicators = {}
-    for row in soup.find_all('tr')[1:]:  # Skip header row
-        cols = row.find_all('td')
-        char_code = cols[0].text.strip()
-        if char_code in ["USD", "EUR", "XAU", "XAG", "XPT", "XPD"]:  # Currencies and precious metals
+    for cols in CBR_PARSER_BACKENDS[backend](html_data):
+        char_code = cols[0].strip()
+        if char_code in KEY_INDICATOR_CODES:
             try:
-                rate = float(cols[1].text.strip().replace(",", "."))
+                rate = float(cols[1].strip().replace(",", "."))
                 indicators[char_code] = rate
             except ValueError:
                 continue  # Skip rows where the rate can't be parsed
     return indicators
 
+CBR_PAGES = {
+    "daily": ("/currency_base/daily/", parse_cbr_currency_base_daily),
+    "key_indicators": ("/key-indicators/", parse_cbr_key_indicators),
+}
+
+class CBRRateProvider:
+    """Parsed CBR rate tables shared by all requests of the process.
+
+    Every page is downloaded at most once per ttl seconds. A request made
+    within refresh_ahead seconds of expiry starts a background refresh and
+    is answered from the cache; if the upstream fails, the last parsed
+    rates are served however old they are. Without any rates, a failure
+    is remembered for retry_after seconds so a burst of requests does not
+    turn into a burst of upstream round trips. Pages are parsed with
+    parser_backend, one of CBR_PARSER_BACKENDS.
+    """
+
+    def __init__(self, base_url: str = CBR_BASE_URL, ttl: float = 3600.0, refresh_ahead: float = 300.0,
+                 retry_after: float = 30.0, timeout: float = 10.0, clock: Callable[[], float] = time.monotonic,
+                 parser_backend: str = "stream"):
+        if parser_backend not in CBR_PARSER_BACKENDS:
+            raise ValueError(f"Unknown parser backend: {parser_backend}")
+        self.base_url = base_url.rstrip("/")
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.retry_after = retry_after
+        self.timeout = timeout
+        self.clock = clock
+        self.parser_backend = parser_backend
+        self._cache = {}  # page -> (rates, fetch time)
+        self._failed_at = {}  # page -> time of the last failed fetch while nothing was cached
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._fetch_locks = {page: threading.Lock() for page in CBR_PAGES}
+
+    def _fetch(self, page: str) -> Dict[str, float]:
+        path, parse = CBR_PAGES[page]
+        response = requests.get(self.base_url + path, timeout=self.timeout)
+        response.raise_for_status()
+        rates = parse(response.text, backend=self.parser_backend)
+        with self._lock:
+            self._cache[page] = (rates, self.clock())
+            self._failed_at.pop(page, None)
+        return rates
+
+    def _refresh(self, page: str) -> None:
+        try:
+            with self._fetch_locks[page]:
+                self._fetch(page)
+        except requests.exceptions.RequestException:
+            pass  # The cached rates stay in use until they expire
+        finally:
+            with self._lock:
+                self._refreshing.discard(page)
+
+    def _cached(self, page: str):
+        """Return (rates or None, whether they are fresh), starting a background refresh near expiry."""
+        with self._lock:
+            cached = self._cache.get(page)
+            if cached is None:
+                return None, False
+            age = self.clock() - cached[1]
+            if self.ttl - self.refresh_ahead <= age < self.ttl and page not in self._refreshing:
+                self._refreshing.add(page)
+                threading.Thread(target=self._refresh, args=(page,), daemon=True).start()
+            return cached[0], age < self.ttl
+
+    def get(self, page: str) -> Dict[str, float]:
+        """Return the parsed rates of a page ("daily" or "key_indicators").
+
+        Raises requests.exceptions.RequestException only when the upstream
+        fails and no rates were ever fetched.
+        """
+        rates, fresh = self._cached(page)
+        if fresh:
+            return rates
+        with self._fetch_locks[page]:
+            # Another request may have fetched the page while this one waited
+            rates, fresh = self._cached(page)
+            if fresh:
+                return rates
+            failed_at = self._failed_at.get(page)
+            if rates is None and failed_at is not None and self.clock() - failed_at < self.retry_after:
+                raise requests.exceptions.ConnectionError("CBR service is unavailable")
+            try:
+                return self._fetch(page)
+            except requests.exceptions.RequestException:
+                if rates is None:
+                    with self._lock:
+                        self._failed_at[page] = self.clock()
+                    raise
+                return rates
+
+    def daily(self) -> Dict[str, float]:
+        return self.get("daily")
+
+    def key_indicators(self) -> Dict[str, float]:
+        return self.get("key_indicators")
+
+    def rate(self, char_code: str) -> float:
+        """Rate of a currency or precious metal, 1 if CBR does not quote it."""
+        table = self.key_indicators() if char_code in KEY_INDICATOR_CODES else self.daily()
+        return table.get(char_code, 1)
+
+# Rate tables shared by the CBR endpoints and the revenue calculation
+app.rates = CBRRateProvider()
+
 @app.route("/cbr/daily", methods=["GET"])
 def cbr_currency_base_daily():
     try:
-        response = requests.get("https://www.cbr.ru/eng/currency_base/daily/")
-        response.raise_for_status()
-        data = parse_cbr_currency_base_daily(response.text)
-        return jsonify(data)
+        return jsonify(app.rates.daily())
     except requests.exceptions.RequestException:
         return "CBR service is unavailable", 503
 
 @app.route("/cbr/key_indicators", methods=["GET"])
 def cbr_key_indicators():
     try:
-        response = requests.get("https://www.cbr.ru/eng/key-indicators/")
-        response.raise_for_status()
-        data = parse_cbr_key_indicators(response.text)
-        return jsonify(data)
+        return jsonify(app.rates.key_indicators())
     except requests.exceptions.RequestException:
         return "CBR service is unavailable", 503
 
 @app.route("/api/asset/add/<char_code>/<name>/<float:capital>/<float:interest>", methods=["GET"])
 def add_asset(char_code, name, capital, interest):
-    for asset in app.bank.assets:
-        if asset.name == name:
-            return f"Asset '{name}' already exists", 403
-    
-    asset = Asset(char_code, name, capital, interest)
-    app.bank.add(asset)
+    if name in app.bank:
+        return f"Asset '{name}' already exists", 403
+
+    try:
+        app.bank.add(Asset(char_code, name, capital, interest))
+    except ValueError:
+        # Another worker added the same name in the meantime
+        return f"Asset '{name}' already exists", 403
     return f"Asset '{name}' was successfully added", 200
 
 @app.route("/api/asset/list", methods=["GET"])
@@ -103,32 +427,46 @@ def list_assets():
 @app.route("/api/asset/get", methods=["GET"])
 def get_assets():
     names = request.args.getlist("name")
-    assets = [asset for asset in app.bank.assets if asset.name in names]
+    assets = app.bank.get_many(names)
     return jsonify([[asset.char_code, asset.name, asset.capital, asset.interest] for asset in assets])
 
 @app.route("/api/asset/calculate_revenue", methods=["GET"])
 def calculate_revenue():
+    if "period" in request.args:
+        return calculate_revenue_periods(request.args.getlist("period"))
     period_1 = int(request.args.get("period_1"))
     period_2 = int(request.args.get("period_2"))
     
+    # The legacy mode reports revenue in the asset currency, so it needs no CBR rates
     revenue = {}
     for asset in app.bank.assets:
-        if asset.char_code in ["USD", "EUR", "XAU", "XAG", "XPT", "XPD"]:
-            response = requests.get("https://www.cbr.ru/eng/key-indicators/")
-            data = parse_cbr_key_indicators(response.text)
-            rate = data.get(asset.char_code, 1)
-        else:
-            response = requests.get("https://www.cbr.ru/eng/currency_base/daily/")
-            data = parse_cbr_currency_base_daily(response.text)
-            rate = data.get(asset.char_code, 1)
-        
         revenue[asset.name] = asset.capital * (1 + asset.interest * (period_2 - period_1))
     
     return jsonify({"period_1": revenue})
 
+def calculate_revenue_periods(values: List[str]):
+    """Revenue of every asset for every period, converted with the CBR rate of its char code."""
+    try:
+        periods = [float(value) for value in values]
+    except ValueError:
+        return "Periods must be numbers", 400
+    try:
+        rates = {char_code: app.rates.rate(char_code) for char_code in app.bank.char_codes()}
+    except requests.exceptions.RequestException:
+        return "CBR service is unavailable", 503
+    # NumPy is only needed for this mode, so the revenue engine is imported on demand
+    from task_Garifulla_Kenessary_asset_revenue import revenue_matrix
+    assets = app.bank.assets
+    revenue = revenue_matrix(assets, periods, rates)
+    return jsonify({
+        "periods": periods,
+        "revenue": {asset.name: row for asset, row in zip(assets, revenue.tolist())},
+        "total": revenue.sum(axis=0).tolist(),
+    })
+
 @app.route("/api/asset/cleanup", methods=["GET"])
 def cleanup_assets():
-    app.bank.assets = []
+    app.bank.clear()
     return "There are no more assets", 200
 
 @app.errorhandler(404)
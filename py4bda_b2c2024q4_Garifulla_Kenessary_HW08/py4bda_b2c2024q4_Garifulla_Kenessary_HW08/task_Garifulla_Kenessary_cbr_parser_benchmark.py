@@ -0,0 +1,59 @@
+import argparse
+import json
+import sys
+import timeit
+from typing import Dict, List, Optional
+
+from task_Garifulla_Kenessary_asset_web_service import (
+    CBR_PARSER_BACKENDS, parse_cbr_currency_base_daily, parse_cbr_key_indicators,
+)
+
+
+def run_benchmark(pages: Dict[str, str], backends: List[str], number: int = 100, repeats: int = 5) -> Dict:
+    """Time parser backends on saved pages, mapped to their parse function (best of repeats, per parse).
+
+    bs4, the reference implementation, is always timed; speedups are
+    relative to it. Raises ValueError if a backend produces a different
+    dict than bs4.
+    """
+    results = {}
+    for filepath, parse in pages.items():
+        with open(filepath, 'r', encoding='utf-8') as file:
+            html_data = file.read()
+        etalon = parse(html_data, backend="bs4")
+        page = {"bytes": len(html_data.encode("utf-8")), "rates": len(etalon), "backends": {}}
+        for backend in ["bs4"] + [backend for backend in backends if backend != "bs4"]:
+            if parse(html_data, backend=backend) != etalon:
+                raise ValueError(f"Backend {backend} disagrees with bs4 on {filepath}")
+            seconds = min(timeit.repeat(lambda: parse(html_data, backend=backend), number=number, repeat=repeats)) / number
+            if backend == "bs4":
+                reference = seconds
+            page["backends"][backend] = {"seconds": seconds, "speedup": reference / seconds}
+        results[filepath] = page
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare CBR page parser backends on saved pages")
+    parser.add_argument("--daily", default="cbr_daily.html", help="Saved daily rates page (default: cbr_daily.html)")
+    parser.add_argument("--key-indicators", default="cbr_key_indicators.html", help="Saved key indicators page (default: cbr_key_indicators.html)")
+    parser.add_argument("--backend", action="append", choices=sorted(CBR_PARSER_BACKENDS), help="Backend to time; repeat for several (default: all)")
+    parser.add_argument("--number", type=int, default=100, help="Parses per timed run (default: 100)")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed runs, the best one is kept (default: 5)")
+    parser.add_argument("--output", help="Where to write the JSON results")
+    args = parser.parse_args(argv)
+
+    backends = args.backend or list(CBR_PARSER_BACKENDS)
+    pages = {args.daily: parse_cbr_currency_base_daily, args.key_indicators: parse_cbr_key_indicators}
+    results = run_benchmark(pages, backends, number=args.number, repeats=args.repeats)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+    for filepath, page in results.items():
+        for backend, timing in page["backends"].items():
+            print(f"{filepath:28s} {backend:8s} {timing['seconds'] * 1000:8.3f} ms  {timing['speedup']:6.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+import subprocess
+from task_Garifulla_Kenessary_asset import Asset
+from task_Garifulla_Kenessary_asset_revenue import revenue_matrix, load_assets
+
+def test_revenue_matrix_matches_calculate_revenue():
+    assets = [Asset("USD", "a", 1000.0, 0.05), Asset("EUR", "b", 250.0, 1e-9), Asset("RUB", "c", 10.0, 0.0)]
+    periods = [0, 1, 2.5, 30]
+    revenue = revenue_matrix(assets, periods, {"USD": 90.0, "EUR": 100.0})
+    assert revenue.shape == (3, 4)
+    rates = [90.0, 100.0, 1]
+    expected = [[asset.calculate_revenue(period) * rate for period in periods] for asset, rate in zip(assets, rates)]
+    # expm1 keeps the precision that (1 + 1e-9) ** period - 1 loses to cancellation
+    assert revenue == pytest.approx(np.array(expected), rel=1e-6)
+    assert revenue_matrix([], periods).shape == (0, 4)
+
+def test_revenue_matrix_with_total_loss():
+    assets = [Asset("USD", "lost", 100.0, -1.0), Asset("USD", "worse", 100.0, -3.0), Asset("USD", "a", 100.0, 0.05)]
+    periods = [0, 1, 2]
+    revenue = revenue_matrix(assets, periods)
+    assert revenue == pytest.approx(np.array([[asset.calculate_revenue(period) for period in periods] for asset in assets]))
+    assert revenue[0].tolist() == [0.0, -100.0, -100.0]
+
+def test_revenue_cli(tmp_path):
+    assets_path = tmp_path / "assets.txt"
+    assets_path.write_text("USD property 1000 0.1\nRUB deposit 100 0.1\n\n")
+    with open(assets_path, 'r', encoding='utf-8') as file:
+        assert [asset.name for asset in load_assets(file)] == ["property", "deposit"]
+    rates_path = tmp_path / "rates.json"
+    rates_path.write_text('{"USD": 2}')
+    result = subprocess.run([
+        "python3", "task_Garifulla_Kenessary_asset_revenue.py",
+        "--assets", str(assets_path), "--rates", str(rates_path), "--period", "1", "2", "--output", str(tmp_path / "revenue.npy")
+    ], capture_output=True, text=True, check=True)
+    assert result.stdout.splitlines() == [f"1    :  {210.0:10.3f}", f"2    :  {441.0:10.3f}"]
+    assert np.load(tmp_path / "revenue.npy") == pytest.approx(np.array([[200.0, 420.0], [10.0, 21.0]]))
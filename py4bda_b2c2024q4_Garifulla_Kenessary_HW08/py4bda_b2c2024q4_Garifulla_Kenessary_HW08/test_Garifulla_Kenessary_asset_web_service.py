@@ -1,5 +1,12 @@
 import pytest
-from task_Garifulla_Kenessary_asset_web_service import app
+import sys
+import threading
+from multiprocessing import Pool
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from task_Garifulla_Kenessary_asset_web_service import (
+    app, Asset, Portfolio, SQLitePortfolioStorage, setup_portfolio, CBRRateProvider, CBR_PARSER_BACKENDS, parse_cbr_currency_base_daily, parse_cbr_key_indicators,
+)
 
 @pytest.fixture
 def client():
@@ -55,3 +62,212 @@ def test_cleanup_assets(client):
     assert response.status_code == 200
     assert "There are no more assets" in response.data.decode()
 
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def cbr_stub():
+    """Local HTTP server serving the saved CBR pages; counts hits per path and fails on demand."""
+    pages = {}
+    for path, filename in [("/currency_base/daily/", "cbr_daily.html"), ("/key-indicators/", "cbr_key_indicators.html")]:
+        with open(filename, 'rb') as file:
+            pages[path] = file.read()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            server.hits[self.path] = server.hits.get(self.path, 0) + 1
+            if server.failing or self.path not in pages:
+                self.send_response(500)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.end_headers()
+            self.wfile.write(pages[self.path])
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.hits = {}
+    server.failing = False
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+
+@pytest.fixture
+def stub_client(cbr_stub):
+    clock = FakeClock()
+    rates, app.rates = app.rates, CBRRateProvider(cbr_stub.url, ttl=100, refresh_ahead=10, retry_after=5, clock=clock)
+    with app.test_client() as client:
+        client.get("/api/asset/cleanup")
+        yield client, cbr_stub, clock
+        client.get("/api/asset/cleanup")
+    app.rates = rates
+
+def test_rates_are_fetched_once_per_ttl(stub_client):
+    client, cbr_stub, clock = stub_client
+    for char_code, name in [("USD", "Dollars"), ("AUD", "Aussie"), ("XAU", "Gold"), ("EUR", "Euro")]:
+        client.get(f"/api/asset/add/{char_code}/{name}/1000.0/0.05")
+    assert client.get("/api/asset/calculate_revenue?period=1").status_code == 200
+    assert client.get("/cbr/daily").json["AUD"] == 60.2415
+    assert client.get("/cbr/key_indicators").json == {"USD": 92.5058, "EUR": 101.5374, "XAU": 7450.36, "XAG": 87.46,
+                                                      "XPT": 2973.45, "XPD": 3165.12}
+    assert cbr_stub.hits == {"/currency_base/daily/": 1, "/key-indicators/": 1}
+
+    clock.now = 100
+    client.get("/cbr/daily")
+    assert cbr_stub.hits["/currency_base/daily/"] == 2
+
+def test_rates_refresh_in_background_before_expiry(stub_client):
+    client, cbr_stub, clock = stub_client
+    client.get("/cbr/daily")
+    clock.now = 95
+    assert client.get("/cbr/daily").status_code == 200
+    deadline = time.monotonic() + 5
+    while cbr_stub.hits["/currency_base/daily/"] < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cbr_stub.hits["/currency_base/daily/"] == 2
+    while app.rates._refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    clock.now = 150
+    client.get("/cbr/daily")
+    assert cbr_stub.hits["/currency_base/daily/"] == 2
+
+def test_stale_rates_are_served_on_upstream_failure(stub_client):
+    client, cbr_stub, clock = stub_client
+    assert client.get("/cbr/key_indicators").status_code == 200
+    cbr_stub.failing = True
+    clock.now = 1000
+    response = client.get("/cbr/key_indicators")
+    assert response.status_code == 200
+    assert response.json["USD"] == 92.5058
+
+    assert client.get("/cbr/daily").status_code == 503
+    assert client.get("/cbr/daily").status_code == 503
+    assert cbr_stub.hits["/currency_base/daily/"] == 1
+    cbr_stub.failing = False
+    clock.now = 1010
+    assert client.get("/cbr/daily").status_code == 200
+
+@pytest.mark.parametrize("backend", sorted(CBR_PARSER_BACKENDS))
+def test_parser_backends_agree(backend):
+    for filename in ["cbr_daily.html", "cbr_key_indicators.html"]:
+        with open(filename, 'r', encoding='utf-8') as file:
+            html_data = file.read()
+        assert parse_cbr_currency_base_daily(html_data, backend=backend) == parse_cbr_currency_base_daily(html_data)
+        assert parse_cbr_key_indicators(html_data, backend=backend) == parse_cbr_key_indicators(html_data)
+    html_data = """<table><tr><th>Code</th></tr><!-- <tr><td>XXX</td><td>1</td></tr> -->
+<tr class="row"><td> <b>USD</b> </td><td>&nbsp;92,5</td></tr><tr><td>EUR</td><td>n/a</td></tr></table>"""
+    assert parse_cbr_currency_base_daily(html_data, backend=backend) == {"USD": 92.5}
+
+def test_portfolio_indexes():
+    portfolio = Portfolio()
+    for char_code, name in [("USD", "b"), ("EUR", "c"), ("USD", "a"), ("AUD", "d")]:
+        portfolio.add(Asset(char_code, name, 100.0, 0.1))
+    with pytest.raises(ValueError):
+        portfolio.add(Asset("EUR", "a", 1.0, 0.1))
+    assert len(portfolio) == 4 and "a" in portfolio and "z" not in portfolio
+    assert [asset.name for asset in portfolio.list()] == ["d", "c", "a", "b"]
+    assert [asset.name for asset in portfolio.assets] == ["b", "c", "a", "d"]
+    assert [asset.name for asset in portfolio.get_many(["a", "z", "d", "a"])] == ["a", "d"]
+    assert [asset.name for asset in portfolio.with_char_code("USD")] == ["b", "a"]
+    assert portfolio.get("c").char_code == "EUR" and portfolio.get("z") is None
+    with pytest.raises(AttributeError):
+        portfolio.get("c").extra = 1
+    portfolio.add(Asset("EUR", "e", 100.0, 0.1))
+    assert [asset.name for asset in portfolio.list()] == ["d", "c", "e", "a", "b"]
+    portfolio.clear()
+    assert len(portfolio) == 0 and portfolio.list() == [] and portfolio.with_char_code("USD") == []
+
+def test_portfolio_list_while_adding_from_threads():
+    portfolio = Portfolio()
+
+    def add_assets(thread):
+        for number in range(5000):
+            portfolio.add(Asset("USD", f"{thread}-{number}", 1.0, 0.1))
+
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # switch threads often, between the listing and the adds
+    try:
+        threads = [threading.Thread(target=add_assets, args=(thread,)) for thread in range(4)]
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            portfolio.list()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+    assert len(portfolio.list()) == len(portfolio) == 20000
+
+def test_calculate_revenue_for_many_periods(stub_client):
+    client, cbr_stub, clock = stub_client
+    client.get("/api/asset/add/USD/Dollars/1000.0/0.1")
+    client.get("/api/asset/add/RUB/Rubles/500.0/0.2")
+    response = client.get("/api/asset/calculate_revenue?period=1&period=2&period=0.5")
+    assert response.status_code == 200
+    assert response.json["periods"] == [1, 2, 0.5]
+    assert response.json["revenue"]["Dollars"] == pytest.approx([100 * 92.5058, 210 * 92.5058, (1.1 ** 0.5 - 1) * 1000 * 92.5058])
+    assert response.json["revenue"]["Rubles"] == pytest.approx([100, 220, (1.2 ** 0.5 - 1) * 500])
+    assert response.json["total"] == pytest.approx([100 * 92.5058 + 100, 210 * 92.5058 + 220, (1.1 ** 0.5 - 1) * 92505.8 + (1.2 ** 0.5 - 1) * 500])
+    assert client.get("/api/asset/calculate_revenue?period=soon").status_code == 400
+
+def _add_assets(task):
+    db_path, worker = task
+    portfolio = Portfolio(SQLitePortfolioStorage(db_path))
+    for number in range(50):
+        portfolio.add(Asset("USD", f"w{worker}-{number}", 100.0, 0.1))
+    return len(portfolio)
+
+def test_sqlite_portfolio_is_shared(tmp_path):
+    db_path = str(tmp_path / "portfolio.db")
+    first, second = Portfolio(SQLitePortfolioStorage(db_path)), Portfolio(SQLitePortfolioStorage(db_path))
+    first.add(Asset("USD", "b", 100.0, 0.1))
+    second.add(Asset("EUR", "a", 200.0, 0.2))
+    with pytest.raises(ValueError):
+        second.add(Asset("RUB", "b", 1.0, 0.1))
+    assert [asset.name for asset in first.list()] == [asset.name for asset in second.list()] == ["a", "b"]
+    assert first.get("a") == Asset("EUR", "a", 200.0, 0.2)
+    assert [asset.name for asset in second.with_char_code("USD")] == ["b"]
+
+    snapshots = []
+    snapshot = first.storage.snapshot
+    first.storage.snapshot = lambda after=0: snapshots.append(after) or snapshot(after)
+    first.list()
+    assert snapshots == []
+    second.add(Asset("USD", "c", 300.0, 0.3))
+    assert "c" in first and snapshots == [2]
+
+    second.clear()
+    assert len(first) == 0 and first.list() == [] and snapshots[-1] == 0
+    first.add(Asset("XAU", "d", 1.0, 0.0))
+    assert [asset.name for asset in Portfolio(SQLitePortfolioStorage(db_path)).assets] == ["d"]
+
+def test_sqlite_portfolio_across_processes(tmp_path):
+    db_path = str(tmp_path / "portfolio.db")
+    with Pool(3) as pool:
+        pool.map(_add_assets, [(db_path, worker) for worker in range(3)])
+    portfolio = Portfolio(SQLitePortfolioStorage(db_path))
+    assert len(portfolio) == 150
+    assert len({asset.name for asset in portfolio.list()}) == 150
+
+def test_service_with_sqlite_portfolio(tmp_path):
+    setup_portfolio(str(tmp_path / "portfolio.db"))
+    try:
+        with app.test_client() as client:
+            assert client.get("/api/asset/add/USD/Stored/1000.0/0.05").status_code == 200
+            assert client.get("/api/asset/add/USD/Stored/1000.0/0.05").status_code == 403
+            setup_portfolio(str(tmp_path / "portfolio.db"))  # As seen by another worker, or after a restart
+            assert client.get("/api/asset/get?name=Stored").json == [["USD", "Stored", 1000.0, 0.05]]
+            assert client.get("/api/asset/cleanup").status_code == 200
+            assert client.get("/api/asset/list").json == []
+    finally:
+        setup_portfolio()
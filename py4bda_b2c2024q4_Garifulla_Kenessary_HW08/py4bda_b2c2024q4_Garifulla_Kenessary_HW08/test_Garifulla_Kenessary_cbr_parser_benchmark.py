@@ -0,0 +1,24 @@
+import json
+import pytest
+from task_Garifulla_Kenessary_asset_web_service import CBR_PARSER_BACKENDS, parse_cbr_currency_base_daily
+from task_Garifulla_Kenessary_cbr_parser_benchmark import main, run_benchmark
+
+def test_run_benchmark_times_every_backend():
+    results = run_benchmark({"cbr_daily.html": parse_cbr_currency_base_daily}, ["stream"], number=1, repeats=1)
+    page = results["cbr_daily.html"]
+    assert page["rates"] == 43
+    assert list(page["backends"]) == ["bs4", "stream"]
+    assert page["backends"]["bs4"]["speedup"] == 1.0
+
+def test_run_benchmark_rejects_disagreeing_backend(monkeypatch):
+    monkeypatch.setitem(CBR_PARSER_BACKENDS, "broken", lambda html_data: iter([]))
+    with pytest.raises(ValueError):
+        run_benchmark({"cbr_daily.html": parse_cbr_currency_base_daily}, ["broken"], number=1, repeats=1)
+
+def test_main_writes_results(tmp_path):
+    output_path = tmp_path / "results.json"
+    assert main(["--number", "1", "--repeats", "1", "--output", str(output_path)]) == 0
+    with open(output_path, 'r', encoding='utf-8') as file:
+        results = json.load(file)
+    assert sorted(results) == ["cbr_daily.html", "cbr_key_indicators.html"]
+    assert all(sorted(page["backends"]) == ["bs4", "lxml", "stream"] for page in results.values())
@@ -1,18 +1,37 @@
 import argparse
+import cProfile
+import importlib.util
 import json
+import os
+import sys
 from typing import List, Dict
 
+HW03_DIRECTORY = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir,
+    "py4bda_b2c2024q4_Garifulla_Kenessary_HW03", "py4bda_b2c2024q4_Garifulla_Kenessary_HW03",
+)
+
+
+def _load_hw03_module(name: str):
+    """Import a module of the HW03 inverted index, whose helpers this CLI shares."""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(HW03_DIRECTORY, f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+_profiler = _load_hw03_module("task_Garifulla_Kenessary_inverted_index_profiler")
+GRAPHITE_PREFIX, StageProfiler = _profiler.GRAPHITE_PREFIX, _profiler.StageProfiler
+intersect_postings = _load_hw03_module("task_Garifulla_Kenessary_inverted_index_intersection").intersect_postings
+
 
 class InvertedIndex:
     def __init__(self):
         self.index = {}
 
     def query(self, words: List[str]) -> List[int]:
-        """Find documents containing all given words."""
-        result_sets = [set(self.index.get(word, [])) for word in words]
-        if result_sets:
-            return list(set.intersection(*result_sets))
-        return []
+        """Find documents containing all given words, sorted by doc id."""
+        return intersect_postings([self.index.get(word, []) for word in words])
 
     def dump(self, filepath: str) -> None:
         """Save the inverted index to a file."""
@@ -24,7 +43,7 @@ class InvertedIndex:
         """Load the inverted index from a file."""
         instance = cls()
         with open(filepath, 'r', encoding='utf-8') as file:
-            instance.index = json.load(file)
+            instance.index = {word: sorted(doc_ids) for word, doc_ids in json.load(file).items()}
         return instance
 
 
@@ -39,14 +58,13 @@ def load_documents(filepath: str) -> Dict[int, str]:
 
 
 def build_inverted_index(documents: Dict[int, str]) -> InvertedIndex:
-    """Build an inverted index from the documents."""
+    """Build an inverted index with postings sorted by doc id."""
     inverted_index = InvertedIndex()
-    for doc_id, content in documents.items():
+    for doc_id, content in sorted(documents.items()):
         for word in content.split():
-            if word not in inverted_index.index:
-                inverted_index.index[word] = []
-            if doc_id not in inverted_index.index[word]:
-                inverted_index.index[word].append(doc_id)
+            doc_ids = inverted_index.index.setdefault(word, [])
+            if not doc_ids or doc_ids[-1] != doc_id:
+                doc_ids.append(doc_id)
     return inverted_index
 
 
@@ -54,30 +72,61 @@ def main():
     parser = argparse.ArgumentParser(description="Inverted Index CLI")
     subparsers = parser.add_subparsers(dest="command")
 
+    profile_parser = argparse.ArgumentParser(add_help=False)
+    profile_parser.add_argument("--profile", action="store_true", help="Print wall time, CPU time, items and peak RSS of every stage to stderr")
+    profile_parser.add_argument("--profile-dump", help="Also run under cProfile and save the stats to this file (implies --profile)")
+    profile_parser.add_argument("--profile-graphite", help="Also write the stage metrics in Graphite plaintext format to this file (implies --profile)")
+
     # Subparser for building the index
-    build_parser = subparsers.add_parser("build", help="Build an inverted index")
+    build_parser = subparsers.add_parser("build", help="Build an inverted index", parents=[profile_parser])
     build_parser.add_argument("--dataset", required=True, help="Path to the dataset file")
     build_parser.add_argument("--output", required=True, help="Path to save the inverted index")
     build_parser.add_argument("--strategy", choices=["json"], default="json", help="Storage strategy (default: json)")
 
     # Subparser for querying the index
-    query_parser = subparsers.add_parser("query", help="Query the inverted index")
+    query_parser = subparsers.add_parser("query", help="Query the inverted index", parents=[profile_parser])
     query_parser.add_argument("--json-index", required=True, help="Path to the inverted index file")
     query_parser.add_argument("--query", nargs="+", action="append", required=True, help="Query words")
 
     args = parser.parse_args()
 
-    if args.command == "build":
-        documents = load_documents(args.dataset)
-        inverted_index = build_inverted_index(documents)
-        inverted_index.dump(args.output)
-        print(f"Inverted index built and saved to {args.output}")
-
-    elif args.command == "query":
-        inverted_index = InvertedIndex.load(args.json_index)
-        for query_words in args.query:
-            result = inverted_index.query(query_words)
-            print(",".join(map(str, result)))
+    profile = args.command is not None and (args.profile or args.profile_dump is not None or args.profile_graphite is not None)
+    profiler = StageProfiler(enabled=profile)
+    code_profiler = cProfile.Profile() if profile and args.profile_dump else None
+    if code_profiler is not None:
+        code_profiler.enable()
+
+    try:
+        if args.command == "build":
+            with profiler.stage("read") as record:
+                documents = load_documents(args.dataset)
+                record["items"] = len(documents)
+            with profiler.stage("index") as record:
+                inverted_index = build_inverted_index(documents)
+                record["items"] = len(documents)
+            with profiler.stage("serialize") as record:
+                inverted_index.dump(args.output)
+                record["items"] = len(inverted_index.index)
+            print(f"Inverted index built and saved to {args.output}")
+
+        elif args.command == "query":
+            with profiler.stage("load") as record:
+                inverted_index = InvertedIndex.load(args.json_index)
+                record["items"] = len(inverted_index.index)
+            with profiler.stage("query") as record:
+                for query_words in args.query:
+                    result = inverted_index.query(query_words)
+                    print(",".join(map(str, result)))
+                record["items"] = len(args.query)
+    finally:
+        if code_profiler is not None:
+            code_profiler.disable()
+            code_profiler.dump_stats(args.profile_dump)
+        if profiler.enabled:
+            print(profiler.report(), file=sys.stderr)
+            if args.profile_graphite:
+                with open(args.profile_graphite, 'w', encoding='utf-8') as file:
+                    file.writelines(line + "\n" for line in profiler.graphite_lines(f"{GRAPHITE_PREFIX}.{args.command}"))
 
 
 if __name__ == "__main__":